@@ -1,20 +1,54 @@
 const STATUS_URL = process.env.STATUS || "http://localhost:5005/status/get/";
+const STATUS_STREAM_URL = process.env.STATUS_STREAM || "http://localhost:5005/status/stream/";
 
-export function getStatus(uuid, callback) {
+function toMessage(res) {
+    if ( res.ert == 0 ){
+        return `${ res.logs[res.logs.length-1] }`;
+    }
+    return `${ res.logs[res.logs.length-1] } Time remaining: ${res.ert} seconds`;
+}
+
+function pollStatus(uuid, callback) {
     fetch(STATUS_URL + uuid, {
         method: 'GET',
         headers: { "Content-Type": "application/json" },
     })
         .then(response => response.json())
         .then(res => {
-            var msg;
-            if ( res.ert == 0 ){
-                msg = `${ res.logs[res.logs.length-1] }`;
-            } else {
-                msg = `${ res.logs[res.logs.length-1] } Time remaining: ${res.ert} seconds`;
+            setTimeout(() => pollStatus(uuid, callback) , 3000 );
+            callback(toMessage(res), res.progress ? res.progress : 0);
+        });
+}
+
+export function getStatus(uuid, callback) {
+    // Status changes are pushed by the server, fall back to polling if streaming is not available
+    if (typeof EventSource === "undefined") {
+        pollStatus(uuid, callback);
+        return;
+    }
+
+    const source = new EventSource(STATUS_STREAM_URL + uuid);
+    var receivedStatus = false;
+
+    source.addEventListener("status", event => {
+        const delta = JSON.parse(event.data);
+        const res = delta["overall-status"];
+        receivedStatus = true;
+
+        if (res) {
+            callback(toMessage(res), res.progress ? res.progress : 0);
+
+            if (res.status === "SUCCESSFUL" || res.status === "FAILED") {
+                source.close();
             }
+        }
+    });
 
-            setTimeout(() => getStatus(uuid, callback) , 3000 );
-            callback(msg, res.progress ? res.progress : 0);
-        });
+    source.onerror = () => {
+        // The browser reconnects by itself once the stream was open
+        if (!receivedStatus) {
+            source.close();
+            pollStatus(uuid, callback);
+        }
+    };
 }
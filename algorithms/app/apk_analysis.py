@@ -1,9 +1,11 @@
 from importlib import resources
 from resources.resource import *
 from resources.resource_types import ResourceType
-from models.emulator import Emulator
-from models.screenshot import Screenshot
+from resources.event_log import ResourceEventLog, ResourceEvent
+from models.utg_store import UtgStore
 from typing import Dict, List
+from threading import Lock
+from time import monotonic, sleep
 import os
 from tasks.task import *
 from tasks.xbot import *
@@ -13,11 +15,6 @@ from tasks.droidbot import *
 from tasks.gifdroid import *
 import re
 
-EMULATORS = [
-    Emulator("emulator-5556", "host.docker.internal:5557", (1920, 1080), set(['Droidbot'])),
-    Emulator("emulator-5558", "host.docker.internal:5559", (1920, 1080), set(['Xbot']))
-]
-
 DIFF_NAMES = {'Tappability': 'Tappable', 'UiChecker': 'Venus'}
 
 for name in DIFF_NAMES:
@@ -33,6 +30,7 @@ class ApkAnalysis:
         'Tappable': ResourceType.TAPPABILITY_PREDICTION,
         'Tappability': ResourceType.TAPPABILITY_PREDICTION
     }
+    _provided_origins = ['upload', 'apk_analysis', 'initialization']    # published by the analysis itself, not a task
 
     def __init__(self, output_dir: str, apk_path: str, req_tasks: list[str], additional_files: Dict[str, Dict[str, str]]={}) -> None:
         self.output_dir = output_dir
@@ -42,22 +40,23 @@ class ApkAnalysis:
         self.upload_additional_files = additional_files
         self.req_tasks = req_tasks
         self.resources = {}
+        self.tasks = []
         self._init_resource_groups()
         self._init_results()
         print(f'New APK Analysis.\nAPK file is {apk_path} \Req Results are {self.req_tasks}')
 
 
     def _init_resource_groups(self) -> None:
-        # create apk, screenshot and emulator resources for every instance
+        # create apk and screenshot resources for every instance, emulators are leased from the shared EmulatorPool
+        # screenshots, utg and results are dispatched asynchronously so a slow subscriber does not stall the crawl
         self.resources[ResourceType.APK_FILE] = ResourceGroup(ResourceType.APK_FILE)
-        self.resources[ResourceType.SCREENSHOT] = ResourceGroup(ResourceType.SCREENSHOT)
-        self.resources[ResourceType.UTG] = ResourceGroup(ResourceType.UTG)
-        self.resources[ResourceType.EMULATOR] = ResourceGroup(ResourceType.EMULATOR, usage=ResourceUsage.SEQUENTIAL) #TODO: implement singleton for emulator
+        self.resources[ResourceType.SCREENSHOT] = ResourceGroup(ResourceType.SCREENSHOT, usage=ResourceUsage.ASYNCHRONOUS)
+        self.resources[ResourceType.UTG] = ResourceGroup(ResourceType.UTG, usage=ResourceUsage.ASYNCHRONOUS)
 
         for name in self.req_tasks:
             for resource_type in TaskFactory._tasks[name].get_output_types():
                 if resource_type not in self.resources:
-                    self.resources[resource_type] = ResourceGroup(resource_type)
+                    self.resources[resource_type] = ResourceGroup(resource_type, usage=ResourceUsage.ASYNCHRONOUS)
 
         # create optional resources
         for algorithm, algorithm_additional_files in self.upload_additional_files.items():
@@ -71,14 +70,16 @@ class ApkAnalysis:
     
     def _init_results(self) -> None:
         """Subscribe to results resource events."""
-        # sub to utg
-        self.utg = {'nodes': [], 'edges': []}
-        self.utg_nodes = set()
-        self.utg_edges = set()
+        # sub to utg, the store needs the published screenshots to merge utg nodes
+        self.utg_store = UtgStore(self.output_dir)
+        self.utg = self.utg_store.utg
+        self._utg_lock = Lock()         # screenshots and utg revisions are delivered on different threads
+        self.resources[ResourceType.SCREENSHOT].subscribe(self._new_screenshot_callback)
         self.resources[ResourceType.UTG].subscribe(self._new_utg_callback)
         
         # sub to results
         self.results = {}
+        self._results_lock = Lock()
         for task in self.req_tasks:
             self.results[task] = []
             if task in ApkAnalysis._result_types:
@@ -89,6 +90,13 @@ class ApkAnalysis:
         new_utg = resource.get_metadata()
         self._update_utg(new_utg)
         print("Updated UTG in APK Analysis")
+
+
+    def _new_screenshot_callback(self, resource: ResourceWrapper) -> None:
+        with self._utg_lock:
+            delta = self.utg_store.add_screenshot(resource.get_metadata())
+            if UtgStore.has_changes(delta):
+                self._on_utg_changed(delta)
     
     
     def _new_result_callback(self, resource: ResourceWrapper) -> None:
@@ -100,23 +108,145 @@ class ApkAnalysis:
     
     def start_processing(self, uuid=None) -> None:
         """Creates required tasks and starts them"""
-        self._create_tasks(uuid)
+        self.tasks = self._create_tasks(uuid)
+        self._record_events(ResourceEventLog(self.output_dir, truncate=True))
         # publish provided files to start processing
         self._publish_provided_files()
+
+
+    def resume_processing(self, uuid=None) -> List[str]:
+        """
+        Resumes the analysis from the event log in the output directory after a restart. Recorded resources are
+        replayed into the resource groups and only the tasks which had not completed are run again, skipping
+        the screenshots they already have results for.
+
+        Returns: (List[str]) The tasks, requested or needed by them, which had completed and are not run again.
+        """
+        events = ResourceEventLog.read(self.output_dir)
+        completed_tasks = self._get_completed_tasks(events, TaskFactory.get_task_dependencies(self.req_tasks))
+        print(f'Resuming APK Analysis from {len(events)} events. Completed tasks are {completed_tasks}')
+
+        # outputs of completed tasks are replayed, their producers are not needed again
+        provided_types = [t for name in completed_tasks for t in TaskFactory._tasks[name].get_output_types()]
+        self.tasks = self._create_tasks(uuid, [name for name in self.req_tasks if name not in completed_tasks], provided_types)
+
+        # tasks need to know about their previous outputs before replayed inputs reach them
+        for event in events:
+            for task in self.tasks:
+                if self._is_output_of(task.__class__, event):
+                    task.restore(event.type, event.resource)
+
+        self._record_events(ResourceEventLog(self.output_dir))
+        for event in events:
+            if event.resource.get_origin() not in ApkAnalysis._provided_origins and event.type in self.resources:
+                self.resources[event.type].replay(event.resource, event.completed)
+
+        self._publish_provided_files()
+        return completed_tasks
+
+
+    def is_complete(self) -> bool:
+        """All tasks finished, successfully or not, and every published resource was handled"""
+        for task in self.tasks:
+            if task.get_status() not in [StatusEnum.successful, StatusEnum.failed]:
+                return False
+
+        return all(group.flush(0) for group in self.resources.values())
+
+
+    def wait_until_complete(self, timeout: float = None, poll_interval: float = 5.0) -> bool:
+        """
+        Wait for the analysis to complete.
+
+        Returns: (bool) False if the timeout expired first.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while not self.is_complete():
+            if deadline is not None and monotonic() >= deadline:
+                return False
+            sleep(poll_interval)
+        return True
+
+
+    def stop_tasks(self, resource_class: str = None) -> List[str]:
+        """
+        Mark the tasks which have not finished as stopped, e.g. tasks still waiting for inputs after the analysis
+        timed out. Tasks can not be interrupted, a stopped task is no longer waited for.
+
+        Parameters:
+            resource_class - (str) Only stop the tasks of other resource classes, e.g. 'emulator'.
+
+        Returns: (List[str]) Names of the stopped tasks.
+        """
+        stopped = []
+        for task in self.tasks:
+            if task.resource_class == resource_class or task.get_status() in [StatusEnum.successful, StatusEnum.failed]:
+                continue
+            task.status = StatusEnum.stopped
+            stopped.append(task.__class__.__name__)
+        return stopped
+
+
+    def wait_until_stopped(self, timeout: float = None, poll_interval: float = 5.0) -> bool:
+        """
+        Wait until no task is running and every published resource was handled, e.g. after the analysis timed
+        out. Running tasks can not be interrupted and still hold their emulators until they end.
+
+        Returns: (bool) False if the timeout expired first.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while any(task.get_status() == StatusEnum.running for task in self.tasks) or \
+                not all(group.flush(0) for group in self.resources.values()):
+            if deadline is not None and monotonic() >= deadline:
+                return False
+            sleep(poll_interval)
+        return True
+
+
+    def _get_completed_tasks(self, events: List[ResourceEvent], names: List[str]) -> List[str]:
+        """Tasks in names which published the last resource of every output type"""
+        last_completed = {}
+        for event in events:
+            last_completed[(event.type, event.resource.get_origin())] = event.completed
+
+        completed_tasks = []
+        for name in names:
+            cls = TaskFactory._tasks[name]
+            output_types = cls.get_output_types() or []
+            origins = self._get_task_origins(cls)
+            if output_types and all(any(last_completed.get((t, origin)) for origin in origins) for t in output_types):
+                completed_tasks.append(name)
+        return completed_tasks
+
+
+    def _is_output_of(self, cls: type, event: ResourceEvent) -> bool:
+        return event.type in (cls.get_output_types() or []) and event.resource.get_origin() in self._get_task_origins(cls)
+
+
+    @staticmethod
+    def _get_task_origins(cls: type) -> List[str]:
+        """Names a task may publish its resources under"""
+        return [cls.__name__, DIFF_NAMES.get(cls.__name__, cls.__name__)]
+
+
+    def _record_events(self, event_log: ResourceEventLog) -> None:
+        """Record publishes of every resource group except emulators, which are live devices and not job results"""
+        self.event_log = event_log
+        for resource_type, group in self.resources.items():
+            if resource_type is not ResourceType.EMULATOR:
+                group.set_event_log(event_log)
     
     
-    def _create_tasks(self, uuid) -> None:
+    def _create_tasks(self, uuid, names: List[str]=None, provided_types: List[ResourceType]=None) -> List[Task]:
         # create tasks
-        print(f'Creating tasks {self.req_tasks} with output dir {self.output_dir} and res {self.resources}')
-        TaskFactory.create_tasks(self.req_tasks, self.output_dir, self.resources, uuid)
+        names = self.req_tasks if names is None else names
+        print(f'Creating tasks {names} with output dir {self.output_dir} and res {self.resources}')
+        return TaskFactory.create_tasks(names, self.output_dir, self.resources, uuid, provided_types)
 
 
     def _publish_provided_files(self):
-        # publish apk
+        # publish apk, tasks lease the emulators they run on from the emulator pool
         self.resources[ResourceType.APK_FILE].publish(self.apk_resource, True)
-        # publish emulator
-        for emulator in EMULATORS:
-             self.resources[ResourceType.EMULATOR].publish(ResourceWrapper(emulator.connection_str, 'apk_analysis', emulator), False)
         # publish additional_files
         print(self.upload_additional_files)
         for algorithm in self.upload_additional_files.keys():
@@ -140,45 +270,30 @@ class ApkAnalysis:
                 print(f'Published resource type {resource_type} for {algorithm} with {file}.')
     
     
-    def _update_utg(self, new_utg: dict[str, Screenshot]) -> None:
-        screenshot_map = self._screenshot_map()
-        for node in new_utg['nodes']:
-            node_id = node['id']
-            if node_id not in self.utg_nodes and node['image'] in screenshot_map:
-                self.utg_nodes.add(node_id)
-                new_node = self._repl_filepaths(node)
-                new_node['structure_str'] = screenshot_map[node['image']].structure_id
-                new_node['screenshot_id'] = screenshot_map[node['image']].screenshot_id
-                new_node['activity_name'] = screenshot_map[node['image']].ui_screen
-                self.utg['nodes'].append(new_node)
-                
-        for edge in new_utg['edges']:
-            edge_id = edge['id']
-            if edge_id not in self.utg_edges and edge['to'] in self.utg_nodes and edge['from'] in self.utg_nodes:
-                self.utg_edges.add(edge_id)
-                self.utg['edges'].append(self._repl_filepaths(edge))
-        
-        for key, val in new_utg.items():
-            if key not in ['nodes', 'edges']:
-                self.utg[key] = val
+    def _update_utg(self, new_utg: dict) -> dict:
+        """
+        Merge a new revision of the UTG, only nodes and edges which were not merged before are processed.
+
+        Returns: (dict) The nodes and edges merged.
+        """
+        with self._utg_lock:
+            delta = self.utg_store.update(new_utg)
+            if UtgStore.has_changes(delta):
+                self._on_utg_changed(delta)
+        return delta
+
+
+    def _on_utg_changed(self, delta: dict) -> None:
+        """Called with the merged nodes and edges whenever the UTG changed."""
+        pass
 
-        with open(os.path.join(self.output_dir, 'utg.js'), "w+") as f:
-            f.write(f'var utg = \n{json.dumps(self.utg, indent=2)}')
-            f.truncate()
-    
-    def _screenshot_map(self) -> dict:
-        screenshot_map = {} # map of filepath to structure str
-        for resource in self.resources[ResourceType.SCREENSHOT]._resources:
-            screenshot: Screenshot = resource.get_metadata()
-            if screenshot.image_path not in screenshot_map:
-                screenshot_map[screenshot.image_path] = screenshot
-        return screenshot_map
 
     def _add_result(self, result: dict, origin: str) -> None:
-        self.results[origin].append(result)
-        with open(os.path.join(self.output_dir, 'results.js'), "w+") as f:
-            f.write(f'var results = \n{json.dumps(self.results, indent=2)}')
-            f.truncate()
+        with self._results_lock:
+            self.results[origin].append(result)
+            with open(os.path.join(self.output_dir, 'results.js'), "w+") as f:
+                f.write(f'var results = \n{json.dumps(self.results, indent=2)}')
+                f.truncate()
             
          
     def _repl_filepaths(self, item: dict, _new_path: Callable[[str], str]=None) -> dict:
@@ -3,6 +3,10 @@ from apk_analysis import *
 from models.screenshot import Screenshot
 from resources.resource_types import ResourceType
 from resources.resource import *
+from tasks.concurrency.status_shipper import StatusShipper
+from tasks.concurrency.job_queue import JobQueue, JobRunner, parse_limits
+from resources.emulator_pool import EmulatorPool
+from threading import Lock
 from flask import Flask, request, jsonify
 import requests
 import os
@@ -17,6 +21,7 @@ AWS_PROFILE = 'localstack'
 AWS_REGION = 'us-west-2'
 S3_URL = 'http://host.docker.internal:4566'
 BUCKETNAME = 'apk-bucket'
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', 6 * 3600))      # seconds before a job is failed, it is counted until its running tasks end
 
 boto3.setup_default_session(profile_name=AWS_PROFILE)
 s3_client = boto3.client(
@@ -30,8 +35,10 @@ class ApkAnalysisApi(ApkAnalysis):
 
     _shared_volume = '/home/data'
     _additional_file_types = {'Gifdroid': ResourceType.GIF, 'Uichecker': ResourceType.UI_RULES}
+    _job_file = 'job.json'
 
     def __init__(self, job_info) -> None:
+        self.job_info = job_info
         self.uuid = job_info['uuid']
         output_dir = os.path.join(ApkAnalysisApi._shared_volume, self.uuid)
         req_tasks = [name[0].upper() + name[1:] for name in list(job_info['algorithms'])]
@@ -44,15 +51,81 @@ class ApkAnalysisApi(ApkAnalysis):
 
     def start_processing(self) -> None:
         """To start processing the equation"""
+        self._save_job_info()
         for task in self.req_tasks:
             self._update_status("RUNNING", task.lower())
             self.running.add(task)
         super().start_processing(uuid=self.uuid)
 
 
-    def _update_utg(self, new_utg: dict) -> None:
+    @classmethod
+    def run_job(cls, job_info: dict, resume: bool) -> None:
+        """Runs a job from the job queue until it completes"""
+        job = cls(job_info)
+        if resume:
+            job.resume_processing()
+        else:
+            job.start_processing()
+
+        if not job.wait_until_complete(JOB_TIMEOUT):
+            job._update_status(StatusEnum.failed, logs=f'Job did not complete within {JOB_TIMEOUT:.0f}s')
+            # tasks waiting for inputs would never end, only the emulator tasks are waited for
+            for name in job.stop_tasks(resource_class='emulator'):
+                if name in job.req_tasks:
+                    job._update_status(StatusEnum.stopped, algorithm=name)
+
+            # the job stays counted by the job queue until its emulator tasks give their emulators back, at most
+            # one lease duration, after which a hung task would have lost its emulator without the lease renewals
+            lease_duration = EmulatorPool.instance().lease_duration
+            print(f'Job {job.uuid} timed out, waiting up to {lease_duration:.0f}s for its running tasks to end')
+            if not job.wait_until_stopped(lease_duration):
+                print(f'Job {job.uuid} still has running tasks, giving its slot back')
+            raise TimeoutError(f'Job {job.uuid} timed out')
+
+
+    @classmethod
+    def get_resource_classes(cls, job_info: dict) -> List[str]:
+        """Resource classes of the tasks a job runs, the job queue admits jobs by them"""
+        names = [name[0].upper() + name[1:] for name in list(job_info['algorithms'])]
+        return list(set(TaskFactory._tasks[name].resource_class for name in TaskFactory.get_task_dependencies(names)))
+
+
+    def resume_processing(self) -> None:
+        """Resumes a job after a restart, tasks which had completed are not run again"""
+        for task in self.req_tasks:
+            self.running.add(task)
+        completed_tasks = super().resume_processing(uuid=self.uuid)
+
+        for task in self.req_tasks:
+            if task in completed_tasks:
+                self.running.discard(task)
+                self._update_status(StatusEnum.successful, algorithm=task)
+            else:
+                self._update_status("RUNNING", task.lower(), logs=f'{task.lower()} resumed')
+        if len(list(self.running)) == 0:
+            self._update_status(StatusEnum.successful)
+
+
+    def _save_job_info(self) -> None:
+        """Keep the job request in the output directory so the job can be resumed"""
+        with open(os.path.join(self.output_dir, ApkAnalysisApi._job_file), 'w') as f:
+            json.dump(self.job_info, f)
+
+
+    @classmethod
+    def load_job_info(cls, uuid: str) -> dict:
+        """
+        Returns: (dict) The request of a job started before or None if the job is unknown.
+        """
+        path = os.path.join(cls._shared_volume, uuid, cls._job_file)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+
+    def _on_utg_changed(self, delta: dict) -> None:
         """Updates the UTG to MongoDB"""
-        super()._update_utg(new_utg)
         self._post_utg(self.utg)
 
 
@@ -79,12 +152,20 @@ class ApkAnalysisApi(ApkAnalysis):
 
     def _upload_file(self, path: str) -> str:
         """Uploads file and returns S3 url"""
-        key = os.path.join(self.uuid, path.removeprefix(self.output_dir).lstrip('/'))
+        return ApkAnalysisApi.upload_file(self.uuid, path, self.uploaded_files)
+
+
+    @classmethod
+    def upload_file(cls, uuid: str, path: str, uploaded_files: set = None) -> str:
+        """Uploads a file of a job and returns S3 url, files in uploaded_files are not uploaded again"""
+        output_dir = os.path.join(cls._shared_volume, uuid)
+        key = os.path.join(uuid, path.removeprefix(output_dir).lstrip('/'))
         file_url = f'http://localhost:4566/{BUCKETNAME}/{key}'
         try:
-            if path not in self.uploaded_files:
+            if uploaded_files is None or path not in uploaded_files:
                 s3_client.upload_file(path, BUCKETNAME, key)
-                self.uploaded_files.add(path)
+                if uploaded_files is not None:
+                    uploaded_files.add(path)
                 print(f"Uploaded file {path} to S3 at {file_url}")
             return file_url
 
@@ -125,55 +206,115 @@ class ApkAnalysisApi(ApkAnalysis):
         print(f"POST RESULTS. Response: {response}\n")
     
     def _update_status(self, status: StatusEnum, algorithm: str=None, logs: str=None) -> None:
-        url = f'{STATUS_URL}{self.uuid}'
-        data = {
-            "status": status
-            }
-
         if algorithm is not None:
-            url = url+f'/{algorithm.lower()}'
-            if logs is not None:
-                data["logs"] = f'{logs}'
-            else:
-                data["logs"] = f'{algorithm.lower()} {status}'
-                
-        response = None
-        error = None
+            algorithm = algorithm.lower()
+            if logs is None:
+                logs = f'{algorithm} {status}'
 
-        try:
-            request = requests.Session()
-            response = request.post(url, headers={"Content-Type": "application/json"}, json=data)
-            print(f'UPDATED STATUS: {data.values()} {response}')
+        StatusShipper.instance(STATUS_URL).update_status(self.uuid, algorithm, status, logs)
+        print(f'QUEUED STATUS: {status} {algorithm} {logs}')
 
-        except Exception as e:
-            error = str(e)
-            print("ERROR ON REQUEST: " + error)
 
 
+_job_runner = None
+_job_runner_lock = Lock()
+
+def get_job_runner() -> JobRunner:
+    """
+    The runner of the job queue. Jobs are limited per resource class by JOB_LIMITS (e.g. 'emulator=2,inference=2,io=4'),
+    by default one job per emulator, and JOB_WORKERS jobs run at once.
+    """
+    global _job_runner
+    with _job_runner_lock:
+        if _job_runner is None:
+            limits = {'emulator': len(EmulatorPool.load_config(os.environ.get('EMULATOR_CONFIG'))), 'inference': 2, 'io': 4}
+            limits.update(parse_limits(os.environ.get('JOB_LIMITS', '')))
+            _job_runner = JobRunner(JobQueue(), ApkAnalysisApi.run_job, limits, int(os.environ.get('JOB_WORKERS', 4)))
+        return _job_runner
+
 
 app = Flask(__name__)
 
 @app.route("/begin_apk_analysis", methods=["POST"])
 def begin_apk_analysis():
     """
-    This function begins running algorithms in the backend.
+    This function queues a job to run algorithms in the backend and returns its position in the queue.
 
     POST req input:
     uid - The unique ID for tracking all the current task.
     algorithms - List of algorithms to be run
     apk_file - Path of apk file
     additional_files - Dictionary of additional files and their algorithms
+    priority - Optional, jobs with a higher priority run first
     """
     if request.method == "POST":
+        job_info = request.get_json()
+        position = get_job_runner().submit(
+            job_info['uuid'], job_info, ApkAnalysisApi.get_resource_classes(job_info), int(job_info.get('priority', 0))
+        )
+        StatusShipper.instance(STATUS_URL).log(job_info['uuid'], None, f'Job queued at position {position}')
 
-        job = ApkAnalysisApi(request.get_json())
-        job.start_processing()
+        return jsonify( {"result": "QUEUED", "position": position} ), 200
 
+    return "No HTTP POST method received", 400
 
-        return jsonify( {"result": "SUCCESS"} ), 200
 
-    return "No HTTP POST method received", 400
+@app.route("/queue/<uuid>", methods=["GET"])
+def get_queue_position(uuid: str):
+    """
+    This function returns the state of a job in the queue and its position, 0 once it is running.
+    """
+    queue = get_job_runner().queue
+    state = queue.get_state(uuid)
+    if state is None:
+        return jsonify( {"result": "UNKNOWN JOB"} ), 404
+
+    return jsonify( {"state": state, "position": queue.get_position(uuid)} ), 200
+
+
+@app.route("/results/<uuid>/tappability/<screenshot>/heatmap/<element_id>", methods=["GET"])
+def get_tappability_heatmap(uuid: str, screenshot: str, element_id: str):
+    """
+    This function returns the url of the heatmap of an element rated not tappable. Heatmaps are deferred by
+    tappability, the heatmap is created now if it does not exist yet.
+
+    uuid - The unique ID of the job.
+    screenshot - Name of the screenshot without extension.
+    element_id - Id of the element in the tappability description of the screenshot.
+    """
+    if any(name in ['', '.', '..'] for name in [uuid, screenshot]):
+        return jsonify( {"result": "UNKNOWN RESULT"} ), 404
+
+    result_dir = os.path.join(ApkAnalysisApi._shared_volume, uuid, 'tappability', screenshot)
+    if not os.path.isdir(result_dir):
+        return jsonify( {"result": "UNKNOWN RESULT"} ), 404
+
+    path = Tappability.request_heatmap(result_dir, element_id)
+    if path is None:
+        return jsonify( {"result": "NO HEATMAP"} ), 404
+
+    return jsonify( {"result": "SUCCESS", "heatmap": ApkAnalysisApi.upload_file(uuid, path)} ), 200
+
+
+@app.route("/resume_apk_analysis", methods=["POST"])
+def resume_apk_analysis():
+    """
+    This function queues a job to be resumed after a restart from the resources it recorded.
+
+    POST req input:
+    uuid - The unique ID of the job to resume.
+    """
+    job_info = ApkAnalysisApi.load_job_info(request.get_json()['uuid'])
+    if job_info is None:
+        return jsonify( {"result": "UNKNOWN JOB"} ), 404
+
+    position = get_job_runner().submit(
+        job_info['uuid'], job_info, ApkAnalysisApi.get_resource_classes(job_info), int(job_info.get('priority', 0)), resume=True
+    )
+
+    return jsonify( {"result": "QUEUED", "position": position} ), 200
 
 
 if __name__ == "__main__":
+    get_job_runner()    # resumes the jobs interrupted by the last restart
     app.run(host="0.0.0.0", port=3050)
\ No newline at end of file
@@ -0,0 +1,205 @@
+from threading import Lock
+from time import time
+from uuid import uuid4
+import typing as t
+import hashlib
+import sqlite3
+import shutil
+import json
+import os
+
+from PIL import Image
+
+
+class InferenceCache():
+    """
+    Results of the inference algorithms (Owleye, Tappability) shared by every job, so screens seen by an earlier
+    job are not run through the models again.
+
+    Entries are keyed by the content of the inputs and the model version, see get_key, and hold copies of the
+    result files in a directory named after the key. The entries are indexed in a sqlite file by size and last
+    use, the least recently used entries are evicted once the cache is larger than its max size.
+    """
+
+    _default_path = '/home/data/.inference_cache'
+    _default_max_mb = 2048
+    _index_name = 'index.sqlite'
+    _instances: t.Dict[str, 'InferenceCache'] = {}
+    _instances_lock = Lock()
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        """
+        Parameters:
+            path - (str) Directory of the cache.
+            max_bytes - (int) Size of the result files above which entries are evicted.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        os.makedirs(path, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(path, self._index_name), timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, size INTEGER, last_used REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS entries_by_use ON entries (last_used)')
+        self._connection.commit()
+
+
+    @classmethod
+    def instance(cls, path: str = None) -> t.Optional['InferenceCache']:
+        """
+        Get the cache in **path**, by default the directory in the INFERENCE_CACHE environment variable with a
+        max size of INFERENCE_CACHE_MB.
+
+        Returns: The cache or None if it can not be opened, results are then not cached.
+        """
+        path = path or os.environ.get('INFERENCE_CACHE', cls._default_path)
+        with cls._instances_lock:
+            if path not in cls._instances:
+                try:
+                    cls._instances[path] = cls(path, int(os.environ.get('INFERENCE_CACHE_MB', cls._default_max_mb)) * 1024 * 1024)
+                except (OSError, sqlite3.Error) as e:
+                    print(f'Inference cache {path} unavailable: {e}')
+                    return None
+            return cls._instances[path]
+
+
+    ###############################################################################
+    #                                    Keys                                     #
+    ###############################################################################
+    @staticmethod
+    def get_key(*parts: str) -> str:
+        """
+        Key of an entry from its parts, e.g. the algorithm, model version and digests of the inputs.
+        """
+        return hashlib.sha256('\0'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+    @staticmethod
+    def pixel_digest(image_path: str) -> str:
+        """
+        Digest of the decoded pixels of an image, so the same screen saved to a different file or format matches.
+        """
+        with Image.open(image_path) as image:
+            digest = hashlib.sha256(f'{image.mode}:{image.size}'.encode())
+            digest.update(image.tobytes())
+        return digest.hexdigest()
+
+
+    @staticmethod
+    def layout_digest(layout_path: str) -> str:
+        """
+        Digest of the bounds and clickable flags of the views of a layout, the parts of the layout the models use.
+        Fields which change between crawls of the same screen (e.g. timestamps) are left out.
+        """
+        with open(layout_path, 'rb') as f:
+            content = f.read()
+        try:
+            views = json.loads(content)['views']
+            content = json.dumps([[view.get('bounds'), view.get('clickable')] for view in views]).encode()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+        return hashlib.sha256(content).hexdigest()
+
+
+    ###############################################################################
+    #                                   Entries                                   #
+    ###############################################################################
+    def get(self, key: str) -> t.Optional[t.Dict[str, str]]:
+        """
+        Look up an entry and mark it as used.
+
+        Returns: (Dict[str, str]) Name to path of the cached files or None if the entry is not cached.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT key FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time(), key))
+            self._connection.commit()
+
+        directory = os.path.join(self.path, key)
+        try:
+            return {name: os.path.join(directory, name) for name in os.listdir(directory)}
+        except OSError:
+            return None
+
+
+    def restore(self, key: str, destinations: t.Dict[str, str]) -> t.Optional[t.List[str]]:
+        """
+        Copy the files of an entry to their destination, cached files without a destination are not copied.
+
+        Parameters:
+            key - (str) The key of the entry.
+            destinations - (Dict[str, str]) Name of the cached file to the path to copy it to.
+
+        Returns: (List[str]) Names of the files copied or None if the entry is not cached.
+        """
+        files = self.get(key)
+        if files is None:
+            return None
+
+        restored = []
+        try:
+            for name, path in files.items():
+                if name in destinations:
+                    shutil.copyfile(path, destinations[name])
+                    restored.append(name)
+        except OSError as e:
+            print(f'Failed to restore cached results {key}: {e}')      # evicted meanwhile
+            return None
+        return restored
+
+
+    def put(self, key: str, files: t.Dict[str, str]) -> None:
+        """
+        Cache result files under **key**, replacing the files cached before.
+
+        Parameters:
+            key - (str) The key of the entry.
+            files - (Dict[str, str]) Name in the cache to the path of each file.
+        """
+        directory = os.path.join(self.path, key)
+        temp_directory = os.path.join(self.path, f'.{key}.{uuid4().hex}')
+        size = 0
+        try:
+            os.makedirs(temp_directory)
+            for name, path in files.items():
+                shutil.copyfile(path, os.path.join(temp_directory, name))
+                size += os.path.getsize(path)
+
+            with self._lock:
+                shutil.rmtree(directory, ignore_errors=True)
+                os.replace(temp_directory, directory)
+                self._connection.execute('INSERT OR REPLACE INTO entries (key, size, last_used) VALUES (?, ?, ?)', (key, size, time()))
+                self._connection.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f'Failed to cache results {key}: {e}')
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            return
+
+        self.evict()
+
+
+    def evict(self) -> t.List[str]:
+        """
+        Remove the least recently used entries until the cache is not larger than its max size.
+
+        Returns: (List[str]) Keys of the evicted entries.
+        """
+        evicted = []
+        with self._lock:
+            total = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                return evicted
+
+            for key, size in self._connection.execute('SELECT key, size FROM entries ORDER BY last_used').fetchall():
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+                self._connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= size
+                evicted.append(key)
+            self._connection.commit()
+
+        print(f'Evicted {len(evicted)} inference cache entries')
+        return evicted
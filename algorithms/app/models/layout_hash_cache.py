@@ -0,0 +1,94 @@
+from threading import Lock
+import typing as t
+import hashlib
+import sqlite3
+import os
+
+
+class LayoutHashCache():
+    """
+    On-disk cache of the ids computed by LayoutHash, keyed by the digest of the layout file content and activity name.
+
+    The cache is a sqlite file in the parent of the layout directory, the task output directory, unless the
+    LAYOUT_HASH_CACHE environment variable points to a shared file. It is kept out of the layout directory as that
+    directory is watched for new layouts (e.g. droidbot states/) and every cache write would wake the watcher.
+    """
+
+    _file_name = '.layout_hash_cache.sqlite'
+    _instances: t.Dict[str, 'LayoutHashCache'] = {}
+    _instances_lock = Lock()
+
+    def __init__(self, path: str) -> None:
+        """
+        Parameters:
+            path - (str) The sqlite file of the cache.
+        """
+        self.path = path
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS layout_ids ('
+            'key TEXT PRIMARY KEY, screenshot_id TEXT, structure_id TEXT, state_id TEXT)'
+        )
+        self._connection.commit()
+
+
+    @classmethod
+    def for_layout(cls, layout_path: str) -> t.Optional['LayoutHashCache']:
+        """
+        Get the cache used for a layout file.
+
+        Returns: The cache or None if it can not be opened, ids are then computed without caching.
+        """
+        output_dir = os.path.dirname(os.path.dirname(os.path.abspath(layout_path)))
+        path = os.environ.get('LAYOUT_HASH_CACHE') or os.path.join(output_dir, cls._file_name)
+
+        with cls._instances_lock:
+            if path not in cls._instances:
+                try:
+                    cls._instances[path] = cls(path)
+                except sqlite3.Error as e:
+                    print(f'Layout hash cache {path} unavailable: {e}')
+                    return None
+            return cls._instances[path]
+
+
+    @staticmethod
+    def get_key(content: bytes, activity_name: str) -> str:
+        """
+        Key of a layout. The activity name is part of every id so it is part of the key.
+        """
+        digest = hashlib.sha256(content)
+        digest.update(b'\0' + activity_name.encode('utf-8'))
+        return digest.hexdigest()
+
+
+    def get(self, key: str) -> t.Optional[t.Dict[str, str]]:
+        """
+        Returns: (Dict) The screenshot_id, structure_id and state_id or None if the layout is not cached.
+        """
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    'SELECT screenshot_id, structure_id, state_id FROM layout_ids WHERE key = ?', (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f'Failed to read layout hash cache {self.path}: {e}')
+            return None
+
+        if row is None:
+            return None
+        return {'screenshot_id': row[0], 'structure_id': row[1], 'state_id': row[2]}
+
+
+    def put(self, key: str, ids: t.Dict[str, str]) -> None:
+        try:
+            with self._lock:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO layout_ids (key, screenshot_id, structure_id, state_id) VALUES (?, ?, ?, ?)',
+                    (key, ids['screenshot_id'], ids['structure_id'], ids['state_id'])
+                )
+                self._connection.commit()
+        except sqlite3.Error as e:
+            print(f'Failed to write layout hash cache {self.path}: {e}')
@@ -5,6 +5,7 @@ import xmltodict
 import json
 import hashlib
 import re
+from models.layout_hash_cache import LayoutHashCache
 
 
 @dataclass
@@ -25,10 +26,10 @@ class Screenshot:
         self.layout_path = layout_path
         self.metadata = metadata
         if layout_path:
-            _hash = LayoutHash(self.get_layout_path(file_type='json'), ui_screen)
-            self.screenshot_id = _hash.get_screenshot_id()
-            self.structure_id = _hash.get_structure_id()
-            self.state_id = _hash.get_state_id()
+            ids = LayoutHash.get_ids(self.get_layout_path(file_type='json'), ui_screen)
+            self.screenshot_id = ids['screenshot_id']
+            self.structure_id = ids['structure_id']
+            self.state_id = ids['state_id']
         
     
     def get_image_path(self, file_type: str=None) -> str:
@@ -86,6 +87,26 @@ class Screenshot:
             converter(output_path=json_path)
             return json_path    
 
+    def to_dict(self) -> dict:
+        """Fields of the screenshot, including the computed ids."""
+        return {
+            'ui_screen': self.ui_screen,
+            'image_path': self.image_path,
+            'layout_path': self.layout_path,
+            'screenshot_id': self.screenshot_id,
+            'structure_id': self.structure_id,
+            'state_id': self.state_id,
+            'metadata': self.metadata
+        }
+
+    @classmethod
+    def from_dict(cls, fields: dict) -> 'Screenshot':
+        """Screenshot from the fields returned by to_dict, the ids are not computed again."""
+        screenshot = cls.__new__(cls)
+        for key, val in fields.items():
+            setattr(screenshot, key, val)
+        return screenshot
+
     
 
 class LayoutConverter():
@@ -206,90 +227,112 @@ class LayoutHash():
             ('resource_id', 'android:id/statusBarBackground')
         ]
     
-    def __init__(self, json_path: str, activity_name: str):
+    def __init__(self, json_path: str, activity_name: str, content: bytes = None):
         self.json_path = json_path
         self.activity_name = activity_name
         self.state_id = None
         self.views = None
+        self._content = content
+        self._ids = None
         self._get_views()
+
+    @classmethod
+    def get_ids(cls, json_path: str, activity_name: str) -> dict:
+        """
+        Get the screenshot, structure and state id of a layout, cached on disk by the layout content.
+
+        Returns: (dict) With keys screenshot_id, structure_id and state_id
+        """
+        with open(json_path, 'rb') as f:
+            content = f.read()
+
+        cache = LayoutHashCache.for_layout(json_path)
+        key = LayoutHashCache.get_key(content, activity_name)
+        ids = cache.get(key) if cache else None
+
+        if ids is None:
+            ids = cls(json_path, activity_name, content)._compute_ids()
+            if cache:
+                cache.put(key, ids)
+        return ids
         
     def get_screenshot_id(self):
-        view_signatures = set()
-        for view in self.views:
-            view_signature = self._get_view_signature(view, filter_views=True)
-            if view_signature:
-                view_signatures.add(view_signature)
-        state_str = "%s{%s}" % (self.activity_name, ",".join(sorted(view_signatures)))
-        return hashlib.md5(state_str.encode('utf-8')).hexdigest()
+        return self._compute_ids()['screenshot_id']
     
     def get_state_id(self) -> str:
-        if self.state_id:
-            return self.state_id
-        view_signatures = set()
-        for view in self.views:
-            view_signature = self._get_view_signature(view)
-            if view_signature:
-                view_signatures.add(view_signature)
-        state_str = "%s{%s}" % (self.activity_name, ",".join(sorted(view_signatures)))
-        return hashlib.md5(state_str.encode('utf-8')).hexdigest()
+        return self._compute_ids()['state_id']
     
     def get_structure_id(self) -> str:
         """
         Converts json to hash
         """
-        view_signatures = set()
+        return self._compute_ids()['structure_id']
+
+    def _compute_ids(self) -> dict:
+        """
+        Compute all ids in a single pass over the views.
+        """
+        if self._ids:
+            return self._ids
+
+        screenshot_signatures = set()
+        state_signatures = set()
+        structure_signatures = set()
         for view in self.views:
-            view_signature = self._get_content_free_view_signature_json(view)
-            if view_signature:
-                view_signatures.add(view_signature)
-        structure_str = "%s{%s}" % (self.activity_name, ",".join(sorted(view_signatures)))
-        return hashlib.md5(structure_str.encode('utf-8')).hexdigest()
+            view_signature = self._get_view_signature(view)
+            state_signatures.add(view_signature)
+            if not self._is_filtered(view):
+                screenshot_signatures.add(view_signature)
+                structure_signatures.add(self._get_content_free_view_signature_json(view))
+
+        self._ids = {
+            'screenshot_id': self._hash(screenshot_signatures),
+            'structure_id': self._hash(structure_signatures),
+            'state_id': self.state_id or self._hash(state_signatures),
+        }
+        return self._ids
+
+    def _hash(self, view_signatures: set) -> str:
+        state_str = "%s{%s}" % (self.activity_name, ",".join(sorted(view_signatures)))
+        return hashlib.md5(state_str.encode('utf-8')).hexdigest()
     
     def _get_views(self) -> list:
         """Reads json from path"""
         if not self.views:
-            with open(self.json_path) as f:
-                layout = json.loads(f.read())
+            if self._content is None:
+                with open(self.json_path, 'rb') as f:
+                    self._content = f.read()
+            layout = json.loads(self._content)
             self.views = layout['views']
             if 'state_str' in layout:
                 self.state_id = layout['state_str']
         return self.views
+
+    def _is_filtered(self, view_dict: dict) -> bool:
+        """Navigation and status bar and invisible views are not part of the screenshot and structure id"""
+        for item in LayoutHash._view_filters:
+            if item[0] in view_dict and view_dict[item[0]] == item[1]:
+                return True
+        return False
          
-    def _get_view_signature(self, view_dict: dict, filter_views=False) -> str:
-        
-        if filter_views:
-            for item in LayoutHash._view_filters:
-                if item[0] in view_dict and view_dict[item[0]] == item[1]:
-                    return
-        
-        for key in ('class', 'resource_id', 'text'):
-            view_dict[key] = self._safe_dict_get(view_dict, key, 'None')
-        if view_dict['text'] is None or len(view_dict['text']) > 50:
-            view_dict['text'] = 'None'
-        for key in ('enabled', 'checked', 'selected'):
-            view_dict[key] = self._key_if_true(view_dict, key)
+    def _get_view_signature(self, view_dict: dict) -> str:
+        text = self._safe_dict_get(view_dict, 'text', 'None')
+        if text is None or len(text) > 50:
+            text = 'None'
         
         view_signature = "[class]%s[resource_id]%s[text]%s[%s,%s,%s]" % \
             (
-                view_dict['class'],
-                view_dict['resource_id'],
-                view_dict['text'],
-                view_dict['enabled'],
-                view_dict['checked'],
-                view_dict['selected']
+                self._safe_dict_get(view_dict, 'class', 'None'),
+                self._safe_dict_get(view_dict, 'resource_id', 'None'),
+                text,
+                self._key_if_true(view_dict, 'enabled'),
+                self._key_if_true(view_dict, 'checked'),
+                self._key_if_true(view_dict, 'selected')
             )
         return view_signature
         
     def _get_content_free_view_signature_json(self, view_dict: list):
         """Returns class and resource id signature"""
-        filter_dict = [
-            ('visible', False),
-            ('resource_id', 'android:id/navigationBarBackground'),
-            ('resource_id', 'android:id/statusBarBackground')
-        ]
-        for item in filter_dict:
-            if item[0] in view_dict and view_dict[item[0]] == item[1]:
-                return
         content_free_signature = "[class]%s[resource_id]%s" % \
                                     (self._safe_dict_get(view_dict, 'class', "None"),
                                     self._safe_dict_get(view_dict, 'resource_id', "None"))
@@ -304,4 +347,4 @@ class LayoutHash():
     
     def compare_hash(self, hash):
         """Compares two hashes"""
-        return self.get_state_id() == hash
\ No newline at end of file
+        return self.get_state_id() == hash
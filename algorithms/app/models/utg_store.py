@@ -0,0 +1,214 @@
+from models.screenshot import Screenshot
+from threading import Lock
+import typing as t
+import json
+import os
+
+
+class UtgStore:
+    """
+    Incrementally merged UTG of a job.
+
+    Node, edge and screenshot indexes are kept live so merging a new revision of the UTG only costs the nodes and
+    edges that were not merged before. Every change is appended to **utg.js.log** and the log is periodically
+    compacted into **utg.js**, so the whole graph is only written every **_compact_every** changes.
+
+    Nodes are only merged once the screenshot of their image has been published and edges once both of their nodes
+    are merged. Nodes and edges which are not ready yet are kept and merged as soon as they are.
+    """
+
+    _utg_file = 'utg.js'
+    _log_file = 'utg.js.log'
+    _utg_prefix = 'var utg = \n'
+    _compact_every = 500
+
+    def __init__(self, output_dir: str) -> None:
+        """
+        Parameters:
+            output_dir - (str) The job output directory. Paths inside it are stored relative to it.
+        """
+        self.output_dir = output_dir.rstrip('/') + '/'
+        self.utg = {'nodes': [], 'edges': []}
+        self.revision = 0
+
+        self._node_ids = set()
+        self._edge_ids = set()
+        self._screenshots: t.Dict[str, Screenshot] = {}
+        self._pending_nodes: t.Dict[str, t.Dict[str, t.Dict]] = {}     # image -> node id -> node waiting for the screenshot
+        self._pending_edges: t.Dict[str, t.Dict] = {}      # edge id -> edge waiting for its nodes
+        self._log_length = 0
+        self._lock = Lock()
+
+
+    ###############################################################################
+    #                                   Merging                                   #
+    ###############################################################################
+    def add_screenshot(self, screenshot: Screenshot) -> t.Dict[str, t.List]:
+        """
+        Index a published screenshot and merge the nodes that were waiting for it.
+
+        Returns: (Dict) The nodes and edges merged by this call.
+        """
+        with self._lock:
+            if screenshot.image_path in self._screenshots:
+                return self._empty_delta()
+            self._screenshots[screenshot.image_path] = screenshot
+
+            waiting = self._pending_nodes.pop(screenshot.image_path, {})
+            return self._merge(list(waiting.values()), [], {})
+
+
+    def update(self, new_utg: t.Dict) -> t.Dict[str, t.List]:
+        """
+        Merge a revision of the UTG. Nodes and edges which were merged before are skipped.
+
+        Parameters:
+            new_utg - (Dict) A full UTG or only the new nodes and edges, with absolute file paths.
+
+        Returns: (Dict) The nodes and edges merged by this call and the other changed UTG attributes.
+        """
+        with self._lock:
+            nodes = [node for node in new_utg.get('nodes', []) if node['id'] not in self._node_ids]
+            edges = [edge for edge in new_utg.get('edges', []) if edge['id'] not in self._edge_ids]
+            attributes = {key: val for key, val in new_utg.items() if key not in ['nodes', 'edges'] and self.utg.get(key) != val}
+
+            return self._merge(nodes, edges, attributes)
+
+
+    def _merge(self, nodes: t.List[t.Dict], edges: t.List[t.Dict], attributes: t.Dict) -> t.Dict[str, t.List]:
+        delta = self._empty_delta()
+
+        for node in nodes:
+            screenshot = self._screenshots.get(node.get('image'))
+            if screenshot is None:
+                self._pending_nodes.setdefault(node.get('image'), {})[node['id']] = node
+                continue
+
+            new_node = self._relative_paths(node)
+            new_node['structure_str'] = screenshot.structure_id
+            new_node['screenshot_id'] = screenshot.screenshot_id
+            new_node['activity_name'] = screenshot.ui_screen
+
+            self._node_ids.add(node['id'])
+            self.utg['nodes'].append(new_node)
+            delta['nodes'].append(new_node)
+
+        # Edges can become ready because of new nodes
+        if delta['nodes']:
+            edges = list(self._pending_edges.values()) + edges
+
+        for edge in edges:
+            if edge['id'] in self._edge_ids:
+                continue
+            if edge['from'] not in self._node_ids or edge['to'] not in self._node_ids:
+                self._pending_edges[edge['id']] = edge
+                continue
+
+            self._pending_edges.pop(edge['id'], None)
+            new_edge = self._relative_paths(edge)
+
+            self._edge_ids.add(edge['id'])
+            self.utg['edges'].append(new_edge)
+            delta['edges'].append(new_edge)
+
+        for key, val in attributes.items():
+            self.utg[key] = val
+        delta.update(attributes)
+
+        if self.has_changes(delta):
+            self.revision += 1
+            self._append_to_log(delta)
+
+        return delta
+
+
+    def _relative_paths(self, item: t.Any) -> t.Any:
+        """
+        Copy of item with every path inside the output directory made relative to it.
+        """
+        if isinstance(item, str):
+            return item.removeprefix(self.output_dir) if item.startswith(self.output_dir) else item
+        if isinstance(item, dict):
+            return {key: self._relative_paths(val) for key, val in item.items()}
+        if isinstance(item, list):
+            return [self._relative_paths(val) for val in item]
+        return item
+
+
+    @staticmethod
+    def _empty_delta() -> t.Dict[str, t.List]:
+        return {'nodes': [], 'edges': []}
+
+
+    @staticmethod
+    def has_changes(delta: t.Dict[str, t.List]) -> bool:
+        return any(val for key, val in delta.items() if key in ['nodes', 'edges']) or len(delta) > 2
+
+
+    ###############################################################################
+    #                                 Persistence                                 #
+    ###############################################################################
+    def _append_to_log(self, delta: t.Dict[str, t.List]) -> None:
+        """
+        Append the delta to the log and compact the log into utg.js when it grew large enough.
+        """
+        with open(os.path.join(self.output_dir, self._log_file), 'a') as f:
+            f.write(json.dumps({'revision': self.revision, **delta}) + '\n')
+
+        self._log_length += 1
+        if self._log_length >= self._compact_every or self.revision == 1:
+            self._compact()
+
+
+    def compact(self) -> None:
+        """
+        Write the whole UTG into utg.js and empty the log.
+        """
+        with self._lock:
+            self._compact()
+
+
+    def _compact(self) -> None:
+        utg_path = os.path.join(self.output_dir, self._utg_file)
+        temp_path = utg_path + '.tmp'
+
+        with open(temp_path, 'w') as f:
+            f.write(self._utg_prefix + json.dumps(self.utg))
+        os.replace(temp_path, utg_path)
+
+        # The log only holds changes made after the last compaction
+        open(os.path.join(self.output_dir, self._log_file), 'w').close()
+        self._log_length = 0
+
+
+    @classmethod
+    def load(cls, output_dir: str) -> t.Dict:
+        """
+        Read the UTG stored in **output_dir**, the compacted utg.js with the changes of the log applied.
+
+        Returns: (Dict) The UTG
+        """
+        output_dir = output_dir.rstrip('/') + '/'
+        utg = {'nodes': [], 'edges': []}
+
+        utg_path = os.path.join(output_dir, cls._utg_file)
+        if os.path.exists(utg_path):
+            with open(utg_path) as f:
+                utg = json.loads(f.read().removeprefix(cls._utg_prefix))
+
+        log_path = os.path.join(output_dir, cls._log_file)
+        if os.path.exists(log_path):
+            with open(log_path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        delta = json.loads(line)
+                    except json.JSONDecodeError:
+                        break   # Partially written last line
+                    utg['nodes'] += delta.pop('nodes', [])
+                    utg['edges'] += delta.pop('edges', [])
+                    delta.pop('revision', None)
+                    utg.update(delta)
+
+        return utg
@@ -0,0 +1,165 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock, current_thread
+from collections import deque
+from time import monotonic
+import traceback
+import typing as t
+import os
+
+
+_executor: t.Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+_thread_name_prefix = 'resource-dispatch'
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    The thread pool shared by every asynchronous resource group. Its size is set by the
+    RESOURCE_DISPATCH_WORKERS environment variable.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('RESOURCE_DISPATCH_WORKERS', 8)),
+                thread_name_prefix=_thread_name_prefix
+            )
+        return _executor
+
+
+class SubscriberQueue():
+    """
+    Bounded queue of the items waiting to be delivered to one subscriber.
+
+    The queue is drained by at most one task of the shared thread pool at a time so the subscriber gets the
+    items one after the other in the order they were put. A task delivers at most **_drain_batch** items before
+    giving its worker back to the pool, so a busy subscriber does not starve the others.
+
+    When the queue is full new items are handled according to the back-pressure policy:
+        block - wait until the subscriber made space.
+        drop_newest - drop the incoming item.
+        drop_oldest - drop the oldest queued item to make space.
+
+    A subscriber may publish to other groups. Items put from a thread of the shared pool never wait, as a blocked
+    worker may be the one the full queue needs to drain. Under block they are queued past max_size instead, so
+    block never loses an item.
+    """
+
+    _policies = ['block', 'drop_newest', 'drop_oldest']
+    _drain_batch = 32
+
+    def __init__(self, callback: t.Callable[[t.Any], None], max_size: int, policy: str,
+                 deliver: t.Callable[[t.Callable[[t.Any], None], t.Any], None] = None) -> None:
+        """
+        Parameters:
+            callback - (Callable) The subscriber.
+            max_size - (int) Max number of queued items before the back-pressure policy applies.
+            policy - (str) One of 'block', 'drop_newest' or 'drop_oldest'.
+            deliver - (Callable) Called with the callback and an item to deliver it, defaults to callback(item).
+        """
+        assert policy in self._policies, f'Unknown back-pressure policy {policy}'
+        self.callback = callback
+        self.max_size = max_size
+        self.policy = policy
+        self.name = getattr(callback, '__qualname__', repr(callback))
+
+        self._deliver = deliver or (lambda callback, item: callback(item))
+        self._queue = deque()
+        self._condition = Condition()
+        self._scheduled = False         # a pool task is draining the queue
+        self._dropped = 0
+        self._overflowed = 0            # items queued past max_size by pool threads
+
+
+    def put(self, item: t.Any) -> bool:
+        """
+        Queue an item for the subscriber.
+
+        Returns: (bool) False if the item was dropped.
+        """
+        with self._condition:
+            if len(self._queue) >= self.max_size:
+                if self.policy == 'block' and not is_dispatch_thread():
+                    self._condition.wait_for(lambda: len(self._queue) < self.max_size)
+                elif self.policy == 'block':
+                    if self._overflowed == 0:
+                        print(f'Subscriber {self.name} queue is full, queueing past {self.max_size} items published by subscribers')
+                    self._overflowed += 1
+                elif self.policy == 'drop_newest':
+                    self._dropped += 1
+                    print(f'Subscriber {self.name} queue is full, dropped {item}')
+                    return False
+                else:
+                    dropped = self._queue.popleft()
+                    self._dropped += 1
+                    print(f'Subscriber {self.name} queue is full, dropped {dropped}')
+
+            self._queue.append(item)
+            if not self._scheduled:
+                self._scheduled = True
+                get_executor().submit(self._drain)
+        return True
+
+
+    def _drain(self) -> None:
+        for _ in range(self._drain_batch):
+            with self._condition:
+                if not self._queue:
+                    self._scheduled = False
+                    self._condition.notify_all()
+                    return
+                item = self._queue.popleft()
+                self._condition.notify_all()
+
+            try:
+                self._deliver(self.callback, item)
+            except Exception:
+                print(f'Subscriber {self.name} failed to handle {item}:\n{traceback.format_exc()}')
+
+        # Leave the worker to other subscribers, the next task continues with the remaining items
+        get_executor().submit(self._drain)
+
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every queued item was delivered. Must not be called from the subscriber itself.
+
+        Returns: (bool) False if the timeout expired first.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and not self._scheduled, timeout)
+
+
+    def is_idle(self) -> bool:
+        with self._condition:
+            return not self._queue and not self._scheduled
+
+
+    def get_depth(self) -> int:
+        """Number of items waiting for the subscriber."""
+        with self._condition:
+            return len(self._queue)
+
+
+    def get_dropped(self) -> int:
+        with self._condition:
+            return self._dropped
+
+
+def is_dispatch_thread() -> bool:
+    """If the current thread is a worker of the shared thread pool, i.e. a subscriber is running on it."""
+    return current_thread().name.startswith(_thread_name_prefix)
+
+
+def wait_for_all(queues: t.Iterable[SubscriberQueue], timeout: float = None) -> bool:
+    """
+    Flush every queue within one overall timeout.
+
+    Returns: (bool) False if the timeout expired before every queue was flushed.
+    """
+    deadline = None if timeout is None else monotonic() + timeout
+    for queue in queues:
+        remaining = None if deadline is None else max(0, deadline - monotonic())
+        if not queue.flush(remaining):
+            return False
+    return True
@@ -0,0 +1,334 @@
+from threading import Thread, Condition, Lock, current_thread
+from time import monotonic, sleep
+from typing import Dict, List, Optional
+from models.emulator import Emulator
+from uuid import uuid4
+import subprocess
+import json
+import os
+
+
+DEFAULT_EMULATORS = [
+    Emulator("emulator-5556", "host.docker.internal:5557", (1920, 1080)),
+    Emulator("emulator-5558", "host.docker.internal:5559", (1920, 1080))
+]
+
+# Seconds tasks wait for a free emulator before they fail
+LEASE_TIMEOUT = float(os.environ.get('EMULATOR_LEASE_TIMEOUT', 1800))
+
+
+class Adb():
+    """
+    Runs adb commands against the emulators. The command defaults to the ADB_PATH environment variable so tests
+    can swap in a fake adb.
+
+    If adb can not be run at all the health of the emulators is unknown rather than bad, see **is_ready**.
+    """
+
+    def __init__(self, command: List[str] = None, timeout: float = 10) -> None:
+        """
+        Parameters:
+            command - (List[str]) The adb command e.g. ['adb'] or ['python3', 'fake_adb.py'].
+            timeout - (float) Seconds before an adb command is given up on.
+        """
+        self.command = command or os.environ.get('ADB_PATH', 'adb').split()
+        self.timeout = timeout
+        self.available = True       # False once adb failed to start
+
+
+    def _run(self, *args: str) -> Optional[str]:
+        """
+        Returns: (str) Output of the command or None if it failed.
+        """
+        try:
+            result = subprocess.run(self.command + list(args), capture_output=True, text=True, timeout=self.timeout)
+        except OSError as e:
+            if self.available:
+                print(f'adb is not available ({e}), emulators are not health checked')
+            self.available = False
+            return None
+        except subprocess.TimeoutExpired as e:
+            print(f'adb {" ".join(args)} failed: {e}')
+            return None
+
+        self.available = True
+        return result.stdout if result.returncode == 0 else None
+
+
+    def is_ready(self, connection_str: str) -> Optional[bool]:
+        """
+        Check the emulator is connected and finished booting.
+
+        Returns: (bool) If the emulator is ready or None if it is unknown because adb is not available.
+        """
+        if ':' in connection_str:       # emulators on other hosts are reached over tcp
+            self._run('connect', connection_str)
+
+        output = self._run('-s', connection_str, 'shell', 'getprop', 'sys.boot_completed')
+        if not self.available:
+            return None
+        return output is not None and output.strip() == '1'
+
+
+
+class EmulatorLease():
+    """
+    Exclusive use of an emulator by a task, given by EmulatorPool.lease.
+
+    The pool renews the lease as long as the thread which took it is alive. A lease which is neither released nor
+    renewed for its duration, e.g. because its thread died, is reclaimed by the pool. It can be used as a context
+    manager which releases the lease on exit.
+    """
+
+    def __init__(self, pool: 'EmulatorPool', emulator: Emulator, task_name: str, duration: float) -> None:
+        self.lease_id = uuid4().hex
+        self.emulator = emulator
+        self.task_name = task_name
+        self.duration = duration
+        self.expires_at = monotonic() + duration
+        self.owner = current_thread()
+        self._pool = pool
+
+
+    def __repr__(self):
+        return f'<<Emulator Lease emulator={self.emulator.name}, task={self.task_name}, id={self.lease_id}>>'
+
+
+    def __enter__(self) -> Emulator:
+        return self.emulator
+
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+
+    def renew(self) -> bool:
+        return self._pool.renew(self)
+
+
+    def release(self) -> None:
+        self._pool.release(self)
+
+
+    def is_expired(self) -> bool:
+        return monotonic() > self.expires_at
+
+
+
+class EmulatorPool():
+    """
+    Shares the emulators between every task of every job.
+
+    Tasks lease a free emulator they can use and give it back when done, so several tasks and jobs run at the
+    same time on different emulators and no emulator is pinned to one task. Emulators are health checked with
+    adb before they are leased and while they are idle, emulators which failed are not leased until they pass a
+    check again. Emulators whose health is unknown, because adb is not available, are leased. Expired leases are
+    reclaimed by a background thread.
+
+    The emulators are read from the JSON file in the EMULATOR_CONFIG environment variable, a list of
+    {"name", "connection_str", "resolution", "tasks"} objects, and default to DEFAULT_EMULATORS.
+    """
+
+    _instance: 'EmulatorPool' = None
+    _instance_lock = Lock()
+
+    _default_lease_duration = float(os.environ.get('EMULATOR_LEASE_DURATION', 300))
+    _check_interval = float(os.environ.get('EMULATOR_CHECK_INTERVAL', 30))
+
+    def __init__(self, emulators: List[Emulator], adb: Adb = None, lease_duration: float = None, check_interval: float = None) -> None:
+        """
+        Parameters:
+            emulators - (List[Emulator]) The emulators of the pool.
+            adb - (Adb) Used for health checks.
+            lease_duration - (float) Seconds a lease lasts without being renewed.
+            check_interval - (float) Seconds between reclaiming leases and health checking idle emulators.
+        """
+        self.adb = adb or Adb()
+        self.lease_duration = lease_duration or self._default_lease_duration
+        self.check_interval = check_interval or self._check_interval
+
+        self._emulators: Dict[str, Emulator] = {emulator.connection_str: emulator for emulator in emulators}
+        self._leases: Dict[str, EmulatorLease] = {}         # connection_str -> lease
+        self._healthy: Dict[str, Optional[bool]] = {connection_str: True for connection_str in self._emulators}     # None if unknown
+        self._condition = Condition()
+        self._closed = False
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    @classmethod
+    def instance(cls) -> 'EmulatorPool':
+        """
+        Get the pool shared by every job.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(cls.load_config(os.environ.get('EMULATOR_CONFIG')))
+            return cls._instance
+
+
+    @staticmethod
+    def load_config(path: str = None) -> List[Emulator]:
+        """
+        Returns: (List[Emulator]) The emulators in the config file at **path** or the default emulators.
+        """
+        if not path or not os.path.exists(path):
+            return list(DEFAULT_EMULATORS)
+
+        with open(path) as f:
+            config = json.load(f)
+
+        return [Emulator(
+            item['name'],
+            item['connection_str'],
+            tuple(item.get('resolution', (1920, 1080))),
+            set(item['tasks']) if item.get('tasks') else None
+        ) for item in config]
+
+
+    ###############################################################################
+    #                                   Leasing                                   #
+    ###############################################################################
+    def lease(self, task_name: str, timeout: float = None, duration: float = None) -> Optional[EmulatorLease]:
+        """
+        Lease a healthy emulator the task can use, waiting for one to be free.
+
+        Parameters:
+            task_name - (str) The task which will use the emulator.
+            timeout - (float) Seconds to wait for an emulator, waits forever if None.
+            duration - (float) Seconds the lease lasts without being renewed.
+
+        Returns: (EmulatorLease) The lease or None if no emulator was free in time.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while True:
+            with self._condition:
+                emulator = None
+                while emulator is None:
+                    emulator = self._get_free_emulator(task_name)
+                    if emulator is not None:
+                        break
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if self._closed or (remaining is not None and remaining <= 0):
+                        return None
+                    self._condition.wait(remaining)
+
+                lease = EmulatorLease(self, emulator, task_name, duration or self.lease_duration)
+                self._leases[emulator.connection_str] = lease
+
+            # Check outside of the lock, adb can take a while
+            ready = self.adb.is_ready(emulator.connection_str)
+            if ready is not False:
+                with self._condition:
+                    self._healthy[emulator.connection_str] = ready
+                print(f'Leased {emulator.name} to {task_name}')
+                return lease
+
+            print(f'Emulator {emulator.name} failed its health check')
+            with self._condition:
+                self._healthy[emulator.connection_str] = False
+                self._leases.pop(emulator.connection_str, None)
+
+
+    def _get_free_emulator(self, task_name: str) -> Optional[Emulator]:
+        """
+        Free emulator for the task. Emulators reserved for fewer tasks are preferred to keep the others free.
+        """
+        free = [emulator for connection_str, emulator in self._emulators.items()
+                if connection_str not in self._leases and self._healthy[connection_str] is not False and emulator.can_use(task_name)]
+        if not free:
+            return None
+        return min(free, key=lambda emulator: len(emulator.tasks) if emulator.tasks else float('inf'))
+
+
+    def renew(self, lease: EmulatorLease) -> bool:
+        """
+        Extend a lease by its duration.
+
+        Returns: (bool) False if the lease was already reclaimed.
+        """
+        with self._condition:
+            if self._leases.get(lease.emulator.connection_str) is not lease:
+                return False
+            lease.expires_at = monotonic() + lease.duration
+            return True
+
+
+    def release(self, lease: EmulatorLease) -> None:
+        """
+        Give the emulator of a lease back to the pool. Releasing a reclaimed lease does nothing.
+        """
+        with self._condition:
+            if self._leases.get(lease.emulator.connection_str) is lease:
+                del self._leases[lease.emulator.connection_str]
+                print(f'{lease.task_name} released {lease.emulator.name}')
+                self._condition.notify_all()
+
+
+    ###############################################################################
+    #                                 Maintenance                                 #
+    ###############################################################################
+    def reclaim_expired(self) -> List[EmulatorLease]:
+        """
+        Renew the leases whose thread is still alive and reclaim the expired ones.
+
+        Returns: (List[EmulatorLease]) The reclaimed leases.
+        """
+        reclaimed = []
+        with self._condition:
+            for connection_str, lease in list(self._leases.items()):
+                if lease.owner.is_alive():
+                    lease.expires_at = max(lease.expires_at, monotonic() + lease.duration)
+                elif lease.is_expired():
+                    del self._leases[connection_str]
+                    reclaimed.append(lease)
+
+            if reclaimed:
+                self._condition.notify_all()
+
+        for lease in reclaimed:
+            print(f'Reclaimed {lease.emulator.name} from {lease.task_name}, the lease expired')
+        return reclaimed
+
+
+    def check_health(self) -> None:
+        """
+        Health check the idle emulators, emulators which recovered can be leased again. The health is None if it is unknown.
+        """
+        with self._condition:
+            idle = [connection_str for connection_str in self._emulators if connection_str not in self._leases]
+
+        for connection_str in idle:
+            healthy = self.adb.is_ready(connection_str)
+            with self._condition:
+                if self._healthy[connection_str] != healthy and healthy is not None:
+                    print(f'Emulator {self._emulators[connection_str].name} is {"healthy" if healthy else "unhealthy"}')
+                self._healthy[connection_str] = healthy
+                if healthy is not False:
+                    self._condition.notify_all()
+
+
+    def get_status(self) -> Dict[str, Dict]:
+        """
+        Returns: (Dict) For each emulator name whether it is healthy, None if unknown, and the task leasing it.
+        """
+        with self._condition:
+            return {emulator.name: {
+                'healthy': self._healthy[connection_str],
+                'leased_by': self._leases[connection_str].task_name if connection_str in self._leases else None
+            } for connection_str, emulator in self._emulators.items()}
+
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+    def _run(self) -> None:
+        while not self._closed:
+            sleep(self.check_interval)
+            self.reclaim_expired()
+            self.check_health()
@@ -0,0 +1,155 @@
+from threading import Thread, Condition
+from typing import Any, List, NamedTuple
+from resources.resource import ResourceWrapper
+from resources.resource_types import ResourceType
+from models.screenshot import Screenshot
+import atexit
+import json
+import os
+
+
+class ResourceEvent(NamedTuple):
+    """A publish read back from the event log"""
+    type: ResourceType
+    resource: ResourceWrapper
+    completed: bool
+
+
+class ResourceEventLog():
+    """
+    Append-only log of the resources published during a job, stored in the job output directory.
+
+    Every publish is written as one JSON line holding the resource type, origin, path, metadata and completed
+    flag. Lines are written straight away but only fsynced by a background thread every **_sync_interval**
+    seconds or **_sync_every** lines, so publishing never waits on the disk. A crash loses at most the last
+    interval and a partially written last line is ignored when the log is read.
+    """
+
+    _file_name = 'resource_events.log'
+    _sync_interval = 0.5
+    _sync_every = 64
+
+    def __init__(self, output_dir: str, truncate: bool = False) -> None:
+        """
+        Parameters:
+            output_dir - (str) The job output directory.
+            truncate - (bool) Start a new log instead of appending to the existing one.
+        """
+        self.path = os.path.join(output_dir, self._file_name)
+        self._file = open(self.path, 'w' if truncate else 'a', encoding='utf-8')
+        self._condition = Condition()
+        self._unsynced = 0
+        self._closed = False
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+
+    def append(self, resource_type: ResourceType, resource: ResourceWrapper, completed: bool) -> None:
+        """
+        Record a publish. Resources with metadata that can not be stored as JSON are skipped.
+        """
+        try:
+            line = json.dumps({
+                'type': resource_type.name,
+                'origin': resource.get_origin(),
+                'path': resource.get_path(),
+                'metadata': resource.get_metadata(),
+                'completed': completed
+            }, default=self._encode) + '\n'
+        except TypeError as e:
+            print(f'Resource {resource} not recorded in event log: {e}')
+            return
+
+        with self._condition:
+            if self._closed:
+                return
+            self._file.write(line)
+            self._unsynced += 1
+            if self._unsynced >= self._sync_every:
+                self._condition.notify_all()
+
+
+    def sync(self) -> None:
+        """
+        Write every recorded publish to disk now.
+        """
+        with self._condition:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+
+    def close(self) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+
+        self._thread.join()
+        self.sync()
+        with self._condition:
+            self._file.close()
+
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._unsynced >= self._sync_every or self._closed, self._sync_interval)
+                if self._closed:
+                    return
+                if self._unsynced == 0:
+                    continue
+                self._file.flush()
+                self._unsynced = 0
+                fd = self._file.fileno()
+
+            # fsync outside of the lock so publishers can keep appending meanwhile
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                print(f'Failed to sync event log {self.path}: {e}')
+
+
+    @staticmethod
+    def _encode(item: Any) -> Any:
+        if isinstance(item, Screenshot):
+            return {'__screenshot__': item.to_dict()}
+        raise TypeError(f'Object of type {item.__class__.__name__} is not JSON serializable')
+
+
+    @staticmethod
+    def _decode(item: dict) -> Any:
+        if '__screenshot__' in item:
+            return Screenshot.from_dict(item['__screenshot__'])
+        return item
+
+
+    @classmethod
+    def read(cls, output_dir: str) -> List[ResourceEvent]:
+        """
+        Read the publishes recorded in **output_dir** in the order they were made.
+
+        Returns: (List[ResourceEvent]) The recorded publishes, empty if there is no log.
+        """
+        path = os.path.join(output_dir, cls._file_name)
+        events = []
+        if not os.path.exists(path):
+            return events
+
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line, object_hook=cls._decode)
+                except json.JSONDecodeError:
+                    break   # Partially written last line
+                resource = ResourceWrapper(record['path'], record['origin'], record['metadata'])
+                events.append(ResourceEvent(ResourceType[record['type']], resource, record['completed']))
+
+        return events
@@ -1,8 +1,11 @@
 from numbers import Number
-from threading import Thread
+from threading import Thread, Condition, local
+from time import monotonic
 from typing import TypeVar, Generic, List, Callable, Dict
 from wsgiref.validate import validator
 from resources.resource_types import ResourceType, ResourceUsage
+from resources.dispatcher import SubscriberQueue, wait_for_all
+import os
 
 T = TypeVar('T')    ## Metadata type
 
@@ -60,19 +63,61 @@ class ResourceGroup(Generic[T]):
     """
     Keeps track of a specific type of resource, containing all the singular resources of that
     type within itself. Manages the publishing and subscribing to a resource type
+
+    ASYNCHRONOUS groups give every subscriber its own bounded queue drained by the shared dispatch
+    thread pool (see resources/dispatcher.py). A subscriber gets the resources in the order they were
+    published and while it handles one, is_active() reflects the group as it was when that resource
+    was published, like it does for CONCURRENT groups.
     """
 
-    def __init__(self, type: ResourceType, usage: ResourceUsage = ResourceUsage.CONCURRENT):
+    _default_queue_size = int(os.environ.get('RESOURCE_QUEUE_SIZE', 1000))
+    _default_policy = os.environ.get('RESOURCE_QUEUE_POLICY', 'block')
+
+    def __init__(self, type: ResourceType, usage: ResourceUsage = ResourceUsage.CONCURRENT, max_queue_size: int = None, policy: str = None):
+        """
+        Parameters:
+            type - (ResourceType) The type of the resources in the group.
+            usage - (ResourceUsage) How the group dispatches resources to its subscribers.
+            max_queue_size - (int) ASYNCHRONOUS only, max number of resources queued for a subscriber.
+            policy - (str) ASYNCHRONOUS only, what to do when a queue is full: 'block', 'drop_newest' or 'drop_oldest'.
+        """
         self._type = type
         self._resources = []
         self._subscribers = []
         self._providers = {}
         self._usage = usage
 
+        self._queues: List[SubscriberQueue] = []
+        self._max_queue_size = max_queue_size or self._default_queue_size
+        self._policy = policy or self._default_policy
+        self._condition = Condition()
+        self._delivery = local()        # providers of the resource being delivered on this thread
+        self._event_log = None
+
+
+    def get_type(self) -> ResourceType:
+        return self._type
+
+
+    def set_event_log(self, event_log) -> None:
+        """
+        Record every resource published from now on in **event_log** (ResourceEventLog) so it can be replayed
+        """
+        self._event_log = event_log
+
 
     def is_active(self) -> bool:
         ## TODO rework active status of resource group
-        for completed in self._providers.values():
+        providers = getattr(self._delivery, 'providers', None)
+        if providers is None:
+            providers = self._providers
+
+            # Resources still queued for a subscriber are not finished with
+            for queue in list(self._queues):
+                if not queue.is_idle():
+                    return True
+
+        for completed in providers.values():
             if not completed:
                 return True
 
@@ -85,12 +130,38 @@ class ResourceGroup(Generic[T]):
         """
         self._subscribers.append(callback)
 
+        if self._usage is ResourceUsage.ASYNCHRONOUS:
+            self._queues.append(SubscriberQueue(callback, self._max_queue_size, self._policy, self._deliver))
+
 
     def publish(self, resource : ResourceWrapper[T], completed : bool) -> None:
         """
         Add a resource to the group and notify all subscribers
         """
-        self._providers[resource.get_origin()] = completed
+        if self._event_log is not None:
+            self._event_log.append(self._type, resource, completed)
+        self._dispatch(resource, completed)
+
+
+    def replay(self, resource : ResourceWrapper[T], completed : bool) -> None:
+        """
+        Publish a resource read back from an event log without recording it again
+        """
+        self._dispatch(resource, completed)
+
+
+    def _dispatch(self, resource : ResourceWrapper[T], completed : bool) -> None:
+        """
+        INTERNAL USE ONLY
+        Add a resource to the group and hand it to the subscribers according to the usage of the group
+        """
+        if self._usage is ResourceUsage.ASYNCHRONOUS:
+            self._publish_async(resource, completed)
+            return
+
+        with self._condition:
+            self._providers[resource.get_origin()] = completed
+            self._condition.notify_all()
         print(f'{resource} added to group {self._type}.\nNum Resources: {len(self._resources)}.\nGroup Status: {self.is_active()}\n')
         self._resources.append(resource)
 
@@ -100,7 +171,6 @@ class ResourceGroup(Generic[T]):
 
         # TODO if the resource being published is utg, run trigger run to utg.
 
-        ## TODO store dispatched resources in JSON or something and not just memory
         if self._usage is ResourceUsage.CONCURRENT:
             for sub in self._subscribers:
                 sub(resource)
@@ -109,6 +179,74 @@ class ResourceGroup(Generic[T]):
             self._lock_resource(resource, 0)
 
 
+    def _publish_async(self, resource : ResourceWrapper[T], completed : bool) -> None:
+        """
+        INTERNAL USE ONLY
+        Queue the resource for every subscriber without waiting for them
+        """
+        providers = dict(self._providers)
+        providers[resource.get_origin()] = completed
+        self._resources.append(resource)
+
+        for queue in list(self._queues):
+            queue.put((resource, providers))
+
+        # Only marked completed once queued so the group never looks inactive with resources left to deliver
+        with self._condition:
+            self._providers[resource.get_origin()] = completed
+            self._condition.notify_all()
+
+        print(f'{resource} queued in group {self._type}.\nNum Resources: {len(self._resources)}.\nQueue Depths: {self.get_queue_depths()}\n')
+
+
+    def _deliver(self, callback : Callable[[ResourceWrapper[T]], None], item) -> None:
+        """
+        INTERNAL USE ONLY
+        Give a queued resource to a subscriber on a dispatch thread
+        """
+        resource, providers = item
+        self._delivery.providers = providers
+        try:
+            callback(resource)
+        finally:
+            self._delivery.providers = None
+
+
+    def flush(self, timeout : float = None) -> bool:
+        """
+        Wait until every resource published so far was handled by the subscribers. Does not wait for
+        CONCURRENT and SEQUENTIAL groups, they hand resources over before publish returns.
+
+        Returns: (bool) False if the timeout expired first.
+        """
+        return wait_for_all(list(self._queues), timeout)
+
+
+    def join(self, timeout : float = None) -> bool:
+        """
+        Wait until every provider published its last resource and it was handled by the subscribers.
+
+        Returns: (bool) False if the timeout expired first.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            if not self._condition.wait_for(lambda: all(self._providers.values()), timeout):
+                return False
+
+        return self.flush(None if deadline is None else max(0, deadline - monotonic()))
+
+
+    def get_queue_depths(self) -> Dict[str, int]:
+        """
+        Returns: (Dict) Number of resources waiting for each subscriber of an ASYNCHRONOUS group.
+        """
+        depths = {}
+        for i, queue in enumerate(list(self._queues)):
+            name = queue.name if queue.name not in depths else f'{queue.name}#{i}'
+            depths[name] = queue.get_depth()
+        return depths
+
+
     def _lock_resource(self, resource : ResourceWrapper[T], index : Number) -> None:
         """
         INTERNAL USE ONLY
@@ -31,6 +31,10 @@ class ResourceUsage(Enum):
 
     SEQUENTIAL means the resource group will give the resource to one subscriber at a time, waiting
         for it to finish using it before moving onto the next subscriber (i.e. Emulator resource)
+
+    ASYNCHRONOUS means the resource group will give the resource to all subscribers from a thread pool, every
+        subscriber has its own queue so the publisher does not wait for the subscribers (i.e. Screenshot resource)
     """
     CONCURRENT = 0,
     SEQUENTIAL = 1,
+    ASYNCHRONOUS = 2,
@@ -1,24 +1,39 @@
 from tasks.enums.status_enum import StatusEnum
+from tasks.concurrency.inotify import *
+from tasks.concurrency.status_shipper import StatusShipper
 from resources.resource import *
 from threading import Thread
-from time import sleep
+from time import sleep, monotonic
 from tasks.task import Task
 import typing as t
-import requests
 import os
 import json
 from models.screenshot import Screenshot
 
 class FileWatcher():
     """
-    This class is responsible for checking an **output directory** every 3 seconds for new file of **file_type**
+    This class is responsible for watching an **output directory** for new files of **file_type**.
+
+    Two modes are available:
+        inotify - (default on linux) kernel events are received as soon as a new file is closed or moved into the directory.
+        poll - the directory is scanned every 5 seconds. Used as fallback when inotify is not available.
     """
 
     _status_controller = os.environ['STATUS_CONTROLLER']
+    _default_mode = os.environ.get('FILE_WATCHER_MODE', 'auto')
+    _modes = ['auto', 'inotify', 'poll']
+
+    _poll_interval = 5              # seconds between directory scans in poll mode
+    _idle_timeout = 1.0             # seconds to wait for events before checking the task status again
+    _coalesce_window = 0.25         # seconds without new events before a burst is emitted
+    _max_batch_delay = 1.0          # max seconds a detected file waits before it is emitted
+    _max_batch_size = 50            # max number of files per callback
+
+    _inotify_mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
 
-    def __init__(self, uuid: str, file_type: str, output_directory: str, task: Task, callback: t.Callable[[list[str]], None]) -> None:
+    def __init__(self, uuid: str, file_type: str, output_directory: str, task: Task, callback: t.Callable[[list[str]], None], mode: str = None) -> None:
         """
-        This class is responsible for checking an **output directory** every 3 seconds for new file of **file_type**.
+        This class is responsible for watching an **output directory** for new files of **file_type**.
 
         It then publishes the new files as new **resource_type**.
 
@@ -27,10 +42,11 @@ class FileWatcher():
         Parameters:
             uuid - (str) The job uuid.
             file_type - ( str ) The suffix of the file (e.g. jpg, png, dl and apk)
-            output_directory - (str) The path to check for new files every 3 seconds
+            output_directory - (str) The path to watch for new files
             resource_type - (ResourceType) The type of resource the file corresponds to
             task - (Task) The parent task that uses this.
             callback - (Callable) Callback with list of each filename detected in check directory.
+            mode - (str) 'inotify', 'poll' or 'auto'. Defaults to the FILE_WATCHER_MODE environment variable or 'auto'.
         """
         self.source_task = task
         self.callback = callback
@@ -39,14 +55,25 @@ class FileWatcher():
         self.task_output_directory = output_directory
         self.uuid = uuid
         self.file_type = file_type
-        self.files = ()
+        self.files = set()
+        self.mode = self._resolve_mode(mode or self._default_mode)
+
+
+    def _resolve_mode(self, mode: str) -> str:
+        """
+        Pick the watching mode, 'auto' uses inotify when the platform supports it.
+        """
+        assert mode in self._modes, f'Unknown file watcher mode {mode}'
+        if mode == 'auto':
+            return 'inotify' if Inotify.is_supported() else 'poll'
+        return mode
 
 
     def start(self):
         """
         Signal start to the file watcher.
 
-        Checking an **output directory** every 3 seconds for new file of **file_type**.
+        Watching an **output directory** for new file of **file_type** using inotify or polling.
         """
         self._thread.start()
 
@@ -55,16 +82,10 @@ class FileWatcher():
         """
         Log the new files onto **mongodb** as status to display to **front-end** and inside the **console** as well.
         """
-        if len(new_files) > 0:
-
-            update_status_url = os.path.join(self._status_controller, self.uuid, self.algorithm_name)
-
-            for file in new_files:
-                logs = f'{self.algorithm_name}: New file {file} generated.'
-                data = {
-                    "logs": logs
-                }
-                requests.post(update_status_url, headers={"Content-Type": "application/json"}, json=data)
+        shipper = StatusShipper.instance(self._status_controller)
+        for file in new_files:
+            logs = f'{self.algorithm_name}: New file {file} generated.'
+            shipper.log(self.uuid, self.algorithm_name, logs)
 
 
     def _lower_first_char_of_str(self, string: str):
@@ -75,18 +96,34 @@ class FileWatcher():
 
 
     def watch_for_new_files(self):
+        """
+        Watch for new files until the task is finished, then log and publish those files.
+
+        Falls back to polling if the inotify watcher fails to start.
+        """
+        if self.mode == 'inotify':
+            try:
+                self._watch_with_inotify()
+                print("Exiting file watcher.")
+                return
+            except OSError as e:
+                print(f'Inotify file watcher unavailable ({e}). Falling back to polling {self.task_output_directory}.')
+                self.mode = 'poll'
+
+        self._watch_with_polling()
+        print("Exiting file watcher.")
+
+
+    def _watch_with_polling(self) -> None:
         """
         Every 5 seconds check for new files then it log and publishes those files
         """
         check_path = self.task_output_directory
         task_complete = False
         while not task_complete:
-            task_complete = self.source_task.get_status() not in [StatusEnum.running, StatusEnum.none]
+            task_complete = self._is_task_complete()
             if os.path.exists(check_path):
-                new_files = []
-                old = self.files
-                self.files += self._list_image_files_in_dir(check_path)
-                new_files = list( set( self.files ).difference( set( old ) ) )
+                new_files = self._scan_for_new_files(check_path)
                 self._log_new_files(new_files)
 
                 ###############################################################################
@@ -95,9 +132,119 @@ class FileWatcher():
                 self.callback(new_files)
             else:
                 print(f'{check_path} does not exist yet.')
-            sleep(5)
+            sleep(self._poll_interval)
+
+
+    def _watch_with_inotify(self) -> None:
+        """
+        Wait for kernel events on the watched directory and emit newly closed files in batches.
+
+        Bursts of events are coalesced until no event arrived for **_coalesce_window** seconds,
+        the batch is full or the oldest file waited **_max_batch_delay** seconds.
+        """
+        check_path = self.task_output_directory
+        notifier = Inotify()
+        watching = False
+        reported_missing = False
+        pending = []
+        pending_since = 0.0
+        other_activity = False  # files of another type changed, e.g. screenshots of already detected states
+
+        try:
+            while True:
+                task_complete = self._is_task_complete()
+
+                if not watching:
+                    watching = self._add_directory_watch(notifier, check_path)
+                    if watching:
+                        # Files closed before the watch was added would be missed otherwise
+                        pending += self._scan_for_new_files(check_path)
+                        pending_since = monotonic()
+                    elif not reported_missing:
+                        print(f'{check_path} does not exist yet.')
+                        reported_missing = True
+
+                if task_complete:
+                    break
+
+                timeout = self._coalesce_window if pending else self._idle_timeout
+                events = notifier.read(timeout)
+
+                for event in events:
+                    if event.mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                        watching = False
+                    elif event.mask & IN_Q_OVERFLOW and watching:
+                        pending += self._scan_for_new_files(check_path)
+                    elif not event.mask & IN_ISDIR and self._is_new_file(event.name):
+                        self.files.add(event.name)
+                        pending.append(event.name)
+                    elif not event.mask & IN_ISDIR:
+                        other_activity = True
+
+                if other_activity and not pending and not events:
+                    # Let the callback retry work which was waiting on those files
+                    self.callback([])
+                    other_activity = False
+
+                if pending and not pending_since:
+                    pending_since = monotonic()
+
+                if pending and (not events or len(pending) >= self._max_batch_size or monotonic() - pending_since >= self._max_batch_delay):
+                    self._emit(pending)
+                    pending = []
+                    pending_since = 0.0
+                    other_activity = False
+
+            # Final pass so nothing written right before the task finished is lost
+            if watching:
+                for event in notifier.read(0):
+                    if not event.mask & IN_ISDIR and self._is_new_file(event.name):
+                        self.files.add(event.name)
+                        pending.append(event.name)
+            if os.path.exists(check_path):
+                pending += self._scan_for_new_files(check_path)
+            if pending:
+                self._emit(pending)
+            else:
+                # Last chance for the callback to retry work which was waiting on files
+                self.callback([])
+
+        finally:
+            notifier.close()
+
+
+    def _add_directory_watch(self, notifier: Inotify, check_path: str) -> bool:
+        """
+        Start watching **check_path** if it exists.
+
+        Returns: (bool) If the directory is being watched.
+        """
+        if not os.path.isdir(check_path):
+            return False
+        try:
+            notifier.add_watch(check_path, self._inotify_mask)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+    def _emit(self, new_files: t.List[str]) -> None:
+        """
+        Log and publish a batch of new files.
+        """
+        for i in range(0, len(new_files), self._max_batch_size):
+            batch = new_files[i:i + self._max_batch_size]
+            self._log_new_files(batch)
+            self.callback(batch)
+
+
+    def _is_task_complete(self) -> bool:
+        return self.source_task.get_status() not in [StatusEnum.running, StatusEnum.none]
+
+
+    def _is_new_file(self, file: str) -> bool:
+        return file not in self.files and self._check_file_is_correct_type(file, self.file_type)
 
-        print("Exiting file watcher.")
 
     # def _callback_on_new_files(self, new_files: t.List[str]) -> bool:
     #     """
@@ -153,22 +300,23 @@ class FileWatcher():
     #     return True
 
 
-    def _list_image_files_in_dir(self, check_path: str) -> t.Tuple:
+    def _scan_for_new_files(self, check_path: str) -> t.List[str]:
         """
-        Show all current files in directory
+        Find files in directory which have not been seen before.
 
         Parameters:
             check_path - (str) The path to check from
 
-        Returns: (Tuple) Set of all files
+        Returns: (List) New files, they are remembered so they are only returned once
         """
-        files = ()
-        for file in os.listdir(check_path):
-            fullpath=os.path.join(check_path, file)
-            if os.path.isfile(fullpath) and self._check_file_is_correct_type(file, self.file_type):
-                files += (file,)
-
-        return files
+        new_files = []
+        with os.scandir(check_path) as entries:
+            for entry in entries:
+                if self._is_new_file(entry.name) and entry.is_file():
+                    new_files.append(entry.name)
+
+        self.files.update(new_files)
+        return new_files
 
 
     # def get_json(self, path: str) -> str:
@@ -0,0 +1,131 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import typing as t
+
+
+# Event masks from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT_HEADER = struct.Struct('iIII')   # wd, mask, cookie, len
+
+
+class InotifyEvent(t.NamedTuple):
+    """A single inotify event. **name** is relative to the watched directory."""
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+
+class Inotify():
+    """
+    Minimal ctypes binding around the linux inotify api so no extra dependency is needed in the container.
+
+    Raises OSError on construction if inotify is not available (e.g. not running on linux).
+    """
+
+    _libc = None
+
+    def __init__(self) -> None:
+        libc = Inotify._load_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        self._watches: t.Dict[int, str] = {}
+
+
+    @classmethod
+    def _load_libc(cls):
+        if cls._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            if not hasattr(libc, 'inotify_init1'):
+                raise OSError(errno.ENOSYS, 'inotify is not supported on this platform')
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            cls._libc = libc
+        return cls._libc
+
+
+    @staticmethod
+    def is_supported() -> bool:
+        """Check if inotify can be used on this host."""
+        try:
+            Inotify._load_libc()
+        except OSError:
+            return False
+        return True
+
+
+    def fileno(self) -> int:
+        return self._fd
+
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """
+        Watch **path** for events in **mask**.
+
+        Returns: (int) The watch descriptor.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self._watches[wd] = path
+        return wd
+
+
+    def read(self, timeout: float = None) -> t.List[InotifyEvent]:
+        """
+        Wait up to **timeout** seconds for events and return all that are queued.
+
+        Returns: (List[InotifyEvent]) Empty list if no event arrived before the timeout.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+            events.append(InotifyEvent(wd, mask, cookie, name))
+
+        return events
+
+
+    def get_path(self, wd: int) -> t.Optional[str]:
+        """Directory the watch descriptor belongs to."""
+        return self._watches.get(wd)
+
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+            self._watches = {}
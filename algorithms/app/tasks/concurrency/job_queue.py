@@ -0,0 +1,225 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Condition, Lock
+from time import time
+import typing as t
+import traceback
+import sqlite3
+import json
+import os
+
+
+class JobQueue():
+    """
+    Persistent queue of analysis jobs in a sqlite file.
+
+    Jobs are taken by priority, then in the order they were queued. A job is only admitted when every resource
+    class it needs (e.g. emulator, inference, io) has fewer running jobs than its limit, a job that does not fit
+    lets the jobs after it go first. Jobs that were running when the process stopped are queued again on recover
+    to be resumed.
+    """
+
+    _default_path = '/home/data/.job_queue.sqlite'
+
+    def __init__(self, path: str = None) -> None:
+        """
+        Parameters:
+            path - (str) The sqlite file of the queue, defaults to the JOB_QUEUE environment variable.
+        """
+        self.path = path or os.environ.get('JOB_QUEUE', self._default_path)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'uuid TEXT PRIMARY KEY, priority INTEGER, state TEXT, resume INTEGER, resource_classes TEXT, job_info TEXT, '
+            'enqueued_at REAL, started_at REAL, finished_at REAL)'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, priority DESC, enqueued_at)')
+        self._connection.commit()
+
+
+    def enqueue(self, uuid: str, job_info: t.Dict, resource_classes: t.List[str], priority: int = 0, resume: bool = False) -> int:
+        """
+        Queue a job. A job that is already queued or running is not queued again.
+
+        Parameters:
+            uuid - (str) The job uuid.
+            job_info - (Dict) The job request.
+            resource_classes - (List[str]) The resource classes the job uses.
+            priority - (int) Jobs with a higher priority are taken first.
+            resume - (bool) Resume the job from what it recorded instead of starting it over.
+
+        Returns: (int) Position of the job in the queue, 0 if it is running.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT state FROM jobs WHERE uuid = ?', (uuid,)).fetchone()
+            if row is None or row['state'] not in ['queued', 'running']:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO jobs (uuid, priority, state, resume, resource_classes, job_info, enqueued_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (uuid, priority, 'queued', int(resume), json.dumps(sorted(set(resource_classes))), json.dumps(job_info), time())
+                )
+                self._connection.commit()
+
+        return self.get_position(uuid)
+
+
+    def get_position(self, uuid: str) -> t.Optional[int]:
+        """
+        Returns: (int) Position of a queued job (1 is next), 0 if it is running or None if it is not in the queue.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT state, priority, enqueued_at FROM jobs WHERE uuid = ?', (uuid,)).fetchone()
+            if row is None or row['state'] not in ['queued', 'running']:
+                return None
+            if row['state'] == 'running':
+                return 0
+
+            ahead = self._connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = 'queued' AND (priority > ? OR (priority = ? AND enqueued_at < ?))",
+                (row['priority'], row['priority'], row['enqueued_at'])
+            ).fetchone()[0]
+        return ahead + 1
+
+
+    def get_state(self, uuid: str) -> t.Optional[str]:
+        """
+        Returns: (str) 'queued', 'running', 'done' or 'failed', None for an unknown job.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT state FROM jobs WHERE uuid = ?', (uuid,)).fetchone()
+        return row['state'] if row else None
+
+
+    def claim(self, limits: t.Dict[str, int]) -> t.Optional[t.Dict]:
+        """
+        Take the next queued job that fits in the limits and mark it as running.
+
+        Parameters:
+            limits - (Dict[str, int]) Max number of running jobs per resource class, classes without a limit are unbounded.
+
+        Returns: (Dict) The uuid, job_info and resume flag of the job or None if no job can be admitted.
+        """
+        with self._lock:
+            running = {}
+            for row in self._connection.execute("SELECT resource_classes FROM jobs WHERE state = 'running'"):
+                for resource_class in json.loads(row['resource_classes']):
+                    running[resource_class] = running.get(resource_class, 0) + 1
+
+            rows = self._connection.execute(
+                "SELECT uuid, resume, resource_classes, job_info FROM jobs WHERE state = 'queued' ORDER BY priority DESC, enqueued_at"
+            ).fetchall()
+            for row in rows:
+                resource_classes = json.loads(row['resource_classes'])
+                if all(running.get(c, 0) < limits.get(c, float('inf')) for c in resource_classes):
+                    self._connection.execute("UPDATE jobs SET state = 'running', started_at = ? WHERE uuid = ?", (time(), row['uuid']))
+                    self._connection.commit()
+                    return {'uuid': row['uuid'], 'job_info': json.loads(row['job_info']), 'resume': bool(row['resume'])}
+
+        return None
+
+
+    def finish(self, uuid: str, failed: bool = False) -> None:
+        with self._lock:
+            self._connection.execute(
+                'UPDATE jobs SET state = ?, finished_at = ? WHERE uuid = ?', ('failed' if failed else 'done', time(), uuid)
+            )
+            self._connection.commit()
+
+
+    def recover(self) -> int:
+        """
+        Queue the jobs that were running when the process stopped again, flagged to be resumed.
+
+        Returns: (int) Number of recovered jobs.
+        """
+        with self._lock:
+            cursor = self._connection.execute("UPDATE jobs SET state = 'queued', resume = 1 WHERE state = 'running'")
+            self._connection.commit()
+        return cursor.rowcount
+
+
+
+class JobRunner():
+    """
+    Runs the jobs of a JobQueue on a bounded pool of worker threads, each job runs on one worker until it completes.
+    """
+
+    _poll_interval = 5.0
+
+    def __init__(self, queue: JobQueue, run_job: t.Callable[[t.Dict, bool], None], limits: t.Dict[str, int], workers: int) -> None:
+        """
+        Parameters:
+            queue - (JobQueue) The queue to take jobs from.
+            run_job - (Callable) Runs a job until it completes, called with the job request and the resume flag.
+            limits - (Dict[str, int]) Max number of running jobs per resource class.
+            workers - (int) Max number of jobs running at once.
+        """
+        self.queue = queue
+        self.limits = limits
+        self._run_job = run_job
+        self._free_workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._condition = Condition()
+
+        recovered = self.queue.recover()
+        if recovered:
+            print(f'Recovered {recovered} interrupted jobs')
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def submit(self, uuid: str, job_info: t.Dict, resource_classes: t.List[str], priority: int = 0, resume: bool = False) -> int:
+        """
+        Queue a job to be run, see JobQueue.enqueue.
+
+        Returns: (int) Position of the job in the queue, 0 if it is running.
+        """
+        position = self.queue.enqueue(uuid, job_info, resource_classes, priority, resume)
+        with self._condition:
+            self._condition.notify_all()
+        return position
+
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._free_workers > 0)
+                job = self.queue.claim(self.limits)
+                if job is None:
+                    self._condition.wait(self._poll_interval)
+                    continue
+                self._free_workers -= 1
+
+            print(f'Starting job {job["uuid"]}{" (resumed)" if job["resume"] else ""}')
+            self._executor.submit(self._work, job)
+
+
+    def _work(self, job: t.Dict) -> None:
+        failed = False
+        try:
+            self._run_job(job['job_info'], job['resume'])
+        except Exception:
+            failed = True
+            print(f'Job {job["uuid"]} failed:\n{traceback.format_exc()}')
+        finally:
+            self.queue.finish(job['uuid'], failed)
+            with self._condition:
+                self._free_workers += 1
+                self._condition.notify_all()
+            print(f'Finished job {job["uuid"]}')
+
+
+
+def parse_limits(limits: str) -> t.Dict[str, int]:
+    """
+    Parse limits like 'emulator=2,inference=2,io=4'.
+    """
+    parsed = {}
+    for item in limits.split(','):
+        if '=' in item:
+            resource_class, limit = item.split('=', 1)
+            parsed[resource_class.strip()] = int(limit)
+    return parsed
@@ -0,0 +1,239 @@
+from requests.adapters import HTTPAdapter
+from threading import Thread, Condition, Lock
+from collections import deque
+from time import monotonic, sleep
+import typing as t
+import requests
+import atexit
+import os
+
+
+class StatusShipper():
+    """
+    Ships status and log updates to the **status controller** from a background thread.
+
+    Updates are put on a bounded in-memory queue so the crawling threads never wait on the backend.
+    Queued updates are sent together to the batch endpoint of the status controller, log lines for the same uuid
+    and algorithm are coalesced into one event and a single keep-alive session is shared by every task.
+
+    Status changes are never dropped or merged with each other. When the queue is full log lines are handled
+    according to the drop policy:
+        block - wait up to **block_timeout** seconds for space then drop the log line.
+        drop_newest - drop the incoming log line.
+        drop_oldest - drop the oldest queued log line to make space.
+    """
+
+    _instances: t.Dict[str, 'StatusShipper'] = {}
+    _instances_lock = Lock()
+
+    _policies = ['block', 'drop_newest', 'drop_oldest']
+    _default_queue_size = int(os.environ.get('STATUS_SHIPPER_QUEUE_SIZE', 10000))
+    _default_policy = os.environ.get('STATUS_SHIPPER_POLICY', 'drop_oldest')
+
+    _flush_interval = 0.5           # seconds to collect updates before sending them
+    _block_timeout = 1.0
+    _request_timeout = 10
+    _max_events_per_request = 500
+
+    def __init__(self, status_url: str, max_queue_size: int = None, policy: str = None) -> None:
+        """
+        Parameters:
+            status_url - (str) The base url of the status controller e.g. http://host:5005/status/update/
+            max_queue_size - (int) Max number of queued log lines before the drop policy applies.
+            policy - (str) One of 'block', 'drop_newest' or 'drop_oldest'.
+        """
+        self.status_url = status_url
+        self.max_queue_size = max_queue_size or self._default_queue_size
+        self.policy = policy or self._default_policy
+        assert self.policy in self._policies, f'Unknown drop policy {self.policy}'
+
+        self._queue = deque()
+        self._queued_logs = 0
+        self._in_flight = 0
+        self._condition = Condition()
+        self._dropped = 0
+        self._sent_requests = 0
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=3)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    @classmethod
+    def instance(cls, status_url: str = None) -> 'StatusShipper':
+        """
+        Get the shared shipper for **status_url**. Defaults to the STATUS_CONTROLLER environment variable.
+        """
+        status_url = status_url or os.environ['STATUS_CONTROLLER']
+        with cls._instances_lock:
+            if status_url not in cls._instances:
+                cls._instances[status_url] = cls(status_url)
+                atexit.register(cls._instances[status_url].flush)
+            return cls._instances[status_url]
+
+
+    ###############################################################################
+    #                               Producer methods                              #
+    ###############################################################################
+    def log(self, uuid: str, algorithm: t.Optional[str], logs: str) -> bool:
+        """
+        Queue a log line.
+
+        Parameters:
+            uuid - (str) The job uuid.
+            algorithm - (str) The algorithm name or None for the job itself.
+            logs - (str) The log message.
+
+        Returns: (bool) False if the log line was dropped.
+        """
+        return self._put({"uuid": uuid, "algorithm": algorithm, "logs": logs})
+
+
+    def update_status(self, uuid: str, algorithm: t.Optional[str], status: str, logs: str = None) -> bool:
+        """
+        Queue a status change. Status changes are never dropped.
+
+        Parameters:
+            uuid - (str) The job uuid.
+            algorithm - (str) The algorithm name or None for the job itself.
+            status - (str) The new status.
+            logs - (str) Optional log message to go with the status.
+        """
+        event = {"uuid": uuid, "algorithm": algorithm, "status": status}
+        if logs is not None:
+            event["logs"] = logs
+        return self._put(event)
+
+
+    def _put(self, event: t.Dict[str, str]) -> bool:
+        is_log = "status" not in event
+
+        with self._condition:
+            if is_log and self._queued_logs >= self.max_queue_size:
+                if self.policy == 'block':
+                    deadline = monotonic() + self._block_timeout
+                    while self._queued_logs >= self.max_queue_size and monotonic() < deadline:
+                        self._condition.wait(deadline - monotonic())
+
+                if self._queued_logs >= self.max_queue_size:
+                    if self.policy == 'drop_oldest':
+                        self._drop_oldest_log()
+                    else:
+                        self._dropped += 1
+                        return False
+
+            self._queue.append(event)
+            self._queued_logs += is_log
+            self._condition.notify_all()
+
+        return True
+
+
+    def _drop_oldest_log(self) -> None:
+        for i, queued in enumerate(self._queue):
+            if "status" not in queued:
+                del self._queue[i]
+                self._queued_logs -= 1
+                self._dropped += 1
+                return
+
+
+    ###############################################################################
+    #                                Sender thread                                #
+    ###############################################################################
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+
+            # Give bursts a moment to build up so they are sent together
+            sleep(self._flush_interval)
+
+            with self._condition:
+                events = list(self._queue)
+                self._queue.clear()
+                self._queued_logs = 0
+                self._in_flight = len(events)
+                self._condition.notify_all()
+
+            try:
+                self._send(events)
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
+
+
+    def _send(self, events: t.List[t.Dict[str, str]]) -> None:
+        """
+        Post the coalesced events to the batch endpoint of the status controller.
+        """
+        url = os.path.join(self.status_url, 'batch')
+        batch = self._coalesce(events)
+
+        for i in range(0, len(batch), self._max_events_per_request):
+            data = {"events": batch[i:i + self._max_events_per_request]}
+            try:
+                self._session.post(url, headers={"Content-Type": "application/json"}, json=data, timeout=self._request_timeout)
+                with self._condition:
+                    self._sent_requests += 1
+            except Exception as e:
+                print(f'ERROR ON STATUS REQUEST {url}: {e}')
+
+
+    def _coalesce(self, events: t.List[t.Dict[str, str]]) -> t.List[t.Dict[str, t.Any]]:
+        """
+        Merge the log lines for each uuid and algorithm into one event.
+
+        A status change closes the pending event of its group so updates keep their order.
+
+        Returns: (List) Events in the order they should be applied, logs are lists of log lines.
+        """
+        output = []
+        pending = {}
+
+        for event in events:
+            key = (event["uuid"], event["algorithm"])
+            if key not in pending:
+                pending[key] = {"uuid": event["uuid"], "algorithm": event["algorithm"], "logs": []}
+                output.append(pending[key])
+
+            if "logs" in event:
+                pending[key]["logs"].append(event["logs"])
+
+            if "status" in event:
+                pending[key]["status"] = event["status"]
+                del pending[key]
+
+        for event in output:
+            if not event["logs"]:
+                del event["logs"]
+
+        return output
+
+
+    ###############################################################################
+    #                                   Helpers                                   #
+    ###############################################################################
+    def flush(self, timeout: float = 5) -> bool:
+        """
+        Wait until every queued update has been sent.
+
+        Returns: (bool) False if updates were still queued after **timeout** seconds.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and self._in_flight == 0, timeout=timeout)
+
+
+    def get_dropped(self) -> int:
+        """Number of log lines dropped because the queue was full."""
+        return self._dropped
+
+
+    def get_queue_size(self) -> int:
+        return len(self._queue)
@@ -1,7 +1,8 @@
 from tasks.concurrency.file_watcher import FileWatcher
+from tasks.concurrency.status_shipper import StatusShipper
 from tasks.enums.status_enum import StatusEnum
 from resources.resource import *
-from threading import Thread
+from threading import Thread, Lock
 from tasks.task import Task
 from typing import List
 from time import sleep
@@ -12,16 +13,20 @@ import os
 import json
 from models.screenshot import Screenshot
 from models.emulator import Emulator
+from resources.emulator_pool import EmulatorPool, LEASE_TIMEOUT
 
 
 class Droidbot(Task, Thread):
     """Class for managing droidbot algorithm"""
 
-    _input_types = [ResourceType.APK_FILE, ResourceType.EMULATOR]
+    _input_types = [ResourceType.APK_FILE]
     _output_types = [ResourceType.UTG, ResourceType.SCREENSHOT]
     # _output_types = [ResourceType.UTG]
     _execute_url = os.environ['DROIDBOT']
+    _emulator_lease_timeout = LEASE_TIMEOUT     # fail when no emulator is free for this many seconds
+    resource_class = 'emulator'
     name = "Droidbot"
+    publish_utg_deltas = True       # publish only the utg changes instead of the whole utg
 
     def __init__(self, output_dir: str, resource_dict: Dict[ResourceType, ResourceGroup], uuid: str) -> None:
         """
@@ -38,13 +43,21 @@ class Droidbot(Task, Thread):
         """
         super().__init__(output_dir, resource_dict, uuid)
         self._sub_to_apks()
-        self._sub_to_emulators()
         self._apk_queue = []
+        self._processing = False
+        self._apk_lock = Lock()     # guards the apk queue and the processing flag
         self._states = []    # unpublished states
         self.check_new_state_directory = os.path.join(output_dir, 'states')
         self.resource_type = ResourceType.SCREENSHOT
         self._image_file_watcher = FileWatcher(uuid, 'json', self.check_new_state_directory, self, self._publish_all_new_files)
 
+        # What was published of utg.js so only its changes are published
+        self._utg_signature = None
+        self._utg_complete_published = False
+        self._published_utg_nodes = set()
+        self._published_utg_edges = set()
+        self._published_utg_attributes = {}
+
 
     def _publish_all_new_files(self, files: t.List[str]) -> None:
         """ Publish new detected/created files from the path being checked.
@@ -103,27 +116,88 @@ class Droidbot(Task, Thread):
             self._states.remove(item)
     
     def _publish_utg(self) -> None:
+        """
+        Publish the changes of droidbot's utg.js since it was last published.
+
+        utg.js is only parsed again when its size or modification time changed. In delta mode the published UTG
+        only contains the nodes and edges which were not published before and the other attributes that changed,
+        otherwise it contains the whole graph.
+        """
         utg_path = os.path.join(self.output_dir, 'utg.js')
         if not os.path.exists(utg_path):
             return
-        
+
+        complete = self.status not in [StatusEnum.running, StatusEnum.none]
+        stat = os.stat(utg_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+
+        if signature == self._utg_signature:
+            if complete and not self._utg_complete_published:
+                # Nothing changed but subscribers still need to know the utg is complete
+                self._publish_utg_resource(utg_path, {'nodes': [], 'edges': []}, complete)
+            return
+
         with open(utg_path) as utg_file:
-            new_utg = json.loads(utg_file.read().removeprefix('var utg = \n'))
+            try:
+                new_utg = json.loads(utg_file.read().removeprefix('var utg = \n'))
+            except json.JSONDecodeError:
+                # Droidbot is still writing the file, it is parsed again on the next tick
+                return
+
+        self._utg_signature = signature
+        if self.publish_utg_deltas:
+            new_utg = self._utg_delta(new_utg)
+            if not self._has_utg_changes(new_utg) and not complete:
+                return
 
         for node in new_utg['nodes']:
             if 'image' in node:
                 node['image'] = os.path.join(self.output_dir, node['image'])
-        
+
         for edge in new_utg['edges']:
             if 'events' in edge:
                 for event in edge['events']:
                     if 'view_images' in event:
                         for i in range(len(event['view_images'])):
                             event['view_images'][i] = os.path.join(self.output_dir, event['view_images'][i])
-        
-        complete = self.status not in [StatusEnum.running, StatusEnum.none]
-        rw = ResourceWrapper(utg_path, 'Droidbot', new_utg)
+
+        self._publish_utg_resource(utg_path, new_utg, complete)
+
+
+    def _utg_delta(self, new_utg: t.Dict) -> t.Dict:
+        """
+        Keep only the nodes and edges which were not published yet and the attributes which changed.
+        """
+        delta = {'nodes': [], 'edges': []}
+
+        for node in new_utg.get('nodes', []):
+            if node['id'] not in self._published_utg_nodes:
+                self._published_utg_nodes.add(node['id'])
+                delta['nodes'].append(node)
+
+        for edge in new_utg.get('edges', []):
+            if edge['id'] not in self._published_utg_edges:
+                self._published_utg_edges.add(edge['id'])
+                delta['edges'].append(edge)
+
+        for key, val in new_utg.items():
+            if key not in ['nodes', 'edges'] and self._published_utg_attributes.get(key) != val:
+                self._published_utg_attributes[key] = val
+                delta[key] = val
+
+        return delta
+
+
+    @staticmethod
+    def _has_utg_changes(utg_delta: t.Dict) -> bool:
+        return bool(utg_delta['nodes'] or utg_delta['edges'] or len(utg_delta) > 2)
+
+
+    def _publish_utg_resource(self, utg_path: str, utg: t.Dict, complete: bool) -> None:
+        rw = ResourceWrapper(utg_path, 'Droidbot', utg)
         self.resource_dict[ResourceType.UTG].publish(rw, complete)
+        self._utg_complete_published = complete
+
 
     def _create_new_resource_group(self) -> bool:
         """
@@ -157,21 +231,16 @@ class Droidbot(Task, Thread):
         return flag
 
 
-    def update_algorithm_status(self, status: StatusEnum):
+    def update_algorithm_status(self, status: StatusEnum, logs: str = None):
+        self.status = status
         if not self.uuid:
             return
-        
-        self.status = status
 
-        data = {
-            "status": self.status,
-            "logs": f'{ self.name } is {self.status.value.lower()}.'
-        }
+        logs = logs or f'{ self.name } is {self.status.value.lower()}.'
 
         algorithm_name = self.name[0].lower() + self.name[1:]
-        url = os.path.join(self._status_controller, self.uuid, algorithm_name)
-        response = requests.post(url, headers={"Content-Type": "application/json"}, json=data)
-        print(f'Updated {algorithm_name} status on url {url} to {self.status}. {response}.')
+        StatusShipper.instance(self._status_controller).update_status(self.uuid, algorithm_name, self.status.value, logs)
+        print(f'Queued {algorithm_name} status update to {self.status}.')
 
 
     # def _publish_utg(self) -> bool:
@@ -188,19 +257,20 @@ class Droidbot(Task, Thread):
         self._thread.start()
 
 
-    def run(self, apk_path: str) -> t.Dict[str, str]:
+    def run(self, apk_path: str, emulator: Emulator = None) -> t.Dict[str, str]:
         """
         Execute gifdroid algorithm by http request and passing in necessary data for gifdroid to figure out stuff.
 
         Parameters:
             apk_path - (str) The string path for the apk for to run droidbot.
+            emulator - (Emulator) The emulator to run droidbot on, the droidbot service default if None.
 
         # TODO make this a staticmethod
         """
         self.update_algorithm_status(StatusEnum.running)
         self._image_file_watcher.start()
         print(self._execute_url)
-        response = requests.post(str( self._execute_url ), data=json.dumps(self._get_execution_data(apk_path)), headers={"Content-Type": "application/json"})
+        response = requests.post(str( self._execute_url ), data=json.dumps(self._get_execution_data(apk_path, emulator)), headers={"Content-Type": "application/json"})
         
         if response.status_code == 200:
             self.update_algorithm_status(StatusEnum.successful)
@@ -213,18 +283,21 @@ class Droidbot(Task, Thread):
         return { "message": "Execute started." }
 
 
-    def _get_execution_data(self, apk_path: str):
+    def _get_execution_data(self, apk_path: str, emulator: Emulator = None):
 
         """
         Get the execution data necessary to execute droidbot
 
         Parameters:
             apk_path - (str) The string path for the apk for to run droibot.
+            emulator - (Emulator) The emulator to run droidbot on.
         """
         data = {
             "apk_path": apk_path,
             "output_dir": self.output_dir,
         }
+        if emulator is not None:
+            data["emulator"] = emulator.connection_str
         print(data)
 
         return data
@@ -238,30 +311,44 @@ class Droidbot(Task, Thread):
 
     def apk_callback(self, new_apk : ResourceWrapper) -> None:
         """callback method to add apk and run algorithm"""
-        if new_apk not in self._apk_queue:
-            self._apk_queue.append(new_apk)
-
+        with self._apk_lock:
+            if new_apk not in self._apk_queue:
+                self._apk_queue.append(new_apk)
 
-    def emulator_callback(self, emulator : ResourceWrapper) -> None:
-        """callback method for using emulator"""
-        device: Emulator = emulator.get_metadata()
-        if device.can_use('Droidbot'):
-            self._process_apks()
-        emulator.release()
+            if self._processing:
+                return
+            self._processing = True
+        Thread(target=self._process_apks).start()
 
 
     def _process_apks(self) -> None:
-        while len(self._apk_queue) > 0:
-            apk = self._apk_queue.pop(0)
-            apk_path = apk.get_path()
-            self.run(apk_path)
-            apk.release()
-
-
-    def _sub_to_emulators(self) -> None:
-        """Get notified when an emulator is available"""
-        if ResourceType.EMULATOR in self.resource_dict:
-            self.resource_dict[ResourceType.EMULATOR].subscribe(self.emulator_callback)
+        """Runs droidbot for the queued apks on emulators leased from the emulator pool"""
+        stopped = False     # the processing flag was cleared with the queue empty
+        try:
+            while True:
+                with self._apk_lock:
+                    # checked with the flag so an apk queued meanwhile is processed by this thread or a new one
+                    if not self._apk_queue:
+                        self._processing = False
+                        stopped = True
+                        return
+
+                lease = EmulatorPool.instance().lease(self.name, self._emulator_lease_timeout)
+                if lease is None:
+                    message = f'{self.name} failed, no emulator was available within {self._emulator_lease_timeout:g} seconds.'
+                    print(message)
+                    self.update_algorithm_status(StatusEnum.failed, message)
+                    return
+
+                with lease as emulator:
+                    with self._apk_lock:
+                        apk = self._apk_queue.pop(0)
+                    self.run(apk.get_path(), emulator)
+                    apk.release()
+        finally:
+            if not stopped:
+                with self._apk_lock:
+                    self._processing = False
 
 
     @classmethod
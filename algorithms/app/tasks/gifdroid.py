@@ -1,4 +1,5 @@
 from tasks.enums.status_enum import StatusEnum
+from tasks.concurrency.status_shipper import StatusShipper
 from resources.resource import *
 from threading import Thread
 from tasks.task import Task
@@ -70,16 +71,12 @@ class Gifdroid(Task):
     def update_algorithm_status(self, status: StatusEnum):
         self.status = status.value
 
-        data = {
-            "status": self.status,
-            "logs": f'{ self.name } is {self.status.lower()}.'
-        }
+        logs = f'{ self.name } is {self.status.lower()}.'
 
         assert self.uuid != None, "No job UUID detected."
         algorithm_name = self.name[0].lower() + self.name[1:]
-        url = os.path.join(self._status_controller, self.uuid, algorithm_name)
-        res = requests.post(url, headers={"Content-Type": "application/json"}, json=data)
-        print(f'Updated {algorithm_name} status on url {url} to {self.status}. {res}.')
+        StatusShipper.instance(self._status_controller).update_status(self.uuid, algorithm_name, self.status, logs)
+        print(f'Queued {algorithm_name} status update to {self.status}.')
 
 
     def _check_resources_available(self):
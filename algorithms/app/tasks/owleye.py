@@ -1,6 +1,7 @@
 from tasks.task import Task
 from resources.resource import *
 from models.screenshot import Screenshot
+from models.inference_cache import InferenceCache
 from typing import List, Dict, Tuple
 import os
 import requests
@@ -17,12 +18,19 @@ class Owleye(Task):
     # _url = 'http://host.docker.internal:3004/execute'
     _url = os.environ['OWLEYE']
     _name = "Owleye"
+    resource_class = 'inference'
+    _batch_size = int(os.environ.get('OWLEYE_BATCH_SIZE', 16))                # screenshots sent in one request
+    _batch_wait = float(os.environ.get('OWLEYE_BATCH_WAIT_MS', 2000)) / 1000  # seconds to wait for a batch to fill
+    _model_url = os.environ.get('OWLEYE_MODEL_URL', _url.rsplit('/', 1)[0] + '/model')     # reports the model digest
+    _triage = os.environ.get('OWLEYE_TRIAGE', 'false').lower() in ['1', 'true']      # only localize screenshots classified as buggy
+    _threshold = float(os.environ.get('OWLEYE_THRESHOLD', 0.5))                     # min bug score for a screenshot to be localized
 
     def __init__(self, output_dir, resource_groups : Dict[ResourceType, ResourceGroup], uuid: str) -> None:
         super().__init__(output_dir, resource_groups, uuid)
         self.queue: list[Screenshot] = []         # list of unprocessed screenshots
         self.completed_states: set[str] = set()   # set of screenshot structure_ids that have been completed
         self.input_dir = os.path.join(self.output_dir, 'temp')
+        self._model_version = None                # digest of the model of the service, cached results of other models are not used
         self._sub_to_screenshots()
 
     @classmethod
@@ -42,12 +50,15 @@ class Owleye(Task):
 
 
     @classmethod
-    def run(cls, image_dir: str, output_dir: str) -> StatusEnum:
-        """Runs owleye algorithm for images in image_dir and outputs to output_dir"""
+    def run(cls, image_dir: str, output_dir: str, triage: bool = None, threshold: float = None) -> StatusEnum:
+        """Runs owleye algorithm for images in image_dir and outputs to output_dir, triage defaults to the service setting"""
         data = {
             "image_dir" : image_dir,
             "output_dir" : output_dir
         }
+        if triage is not None:
+            data["triage"] = triage
+            data["threshold"] = threshold
 
         print(f'Starting {Owleye._name} with url {Owleye._url}')
         response = requests.post(Owleye._url, json=data, headers={"Content-Type": "application/json"})
@@ -84,15 +95,19 @@ class Owleye(Task):
                 sleep(5.0)
                 continue
             
-            # run next image in queue
+            # run next batch of images in queue
             try:
-                next_img = self.queue.pop(0)
-                self._prepare_inputs([next_img])
-                print(f'Running Owleye for {next_img}')
-                response = Owleye.run(self.input_dir, self.output_dir)
-                result = self._get_display_issues([next_img])
-                if response == StatusEnum.successful and len(result) > 0:
-                    print(f'Owleye successfully proccessed image: {next_img}. Output: {result[0]}\n')
+                batch = self._take_batch(self.queue, self._batch_size, self._batch_wait, self.resource_dict[ResourceType.SCREENSHOT].is_active)
+                uncached = [screenshot for screenshot in batch if not self._restore_cached(screenshot)]
+                if uncached:
+                    self._prepare_inputs(uncached)
+                    print(f'Running Owleye for {len(uncached)} images, {len(batch) - len(uncached)} cached')
+                    if Owleye.run(self.input_dir, self.output_dir, self._triage, self._threshold) == StatusEnum.successful:
+                        self._cache_results(uncached)
+                result = self._get_display_issues(batch)
+                if len(result) > 0:
+                    heatmap_count = len([issue for issue in result if issue["image"] is not None])
+                    print(f'Owleye successfully proccessed {len(batch)} images. Output: {heatmap_count} heatmaps\n')
                     self._publish_issues(result)
             except Exception as err:
                 print(f"Error {err} in Owleye while trying to process image.\nOwleye continuing")
@@ -115,6 +130,43 @@ class Owleye(Task):
             temp_path = os.path.join(self.input_dir, os.path.basename(img_path))
             shutil.copyfile(img_path, temp_path)
 
+    def _get_cache_key(self, screenshot: Screenshot) -> str:
+        """Key of the results of a screenshot in the inference cache, None if there is no cache or model version"""
+        if InferenceCache.instance() is None:
+            return None
+        if self._model_version is None:
+            self._model_version = Owleye.request_model_version(Owleye._model_url)
+            if self._model_version is None:
+                return None
+        try:
+            # triaged results have no heatmap for clean screenshots, they can not be reused without triage
+            return InferenceCache.get_key(Owleye._name, self._model_version, self._triage, self._threshold if self._triage else None,
+                                          InferenceCache.pixel_digest(screenshot.get_image_path(file_type='jpg')))
+        except OSError as e:
+            print(f'Owleye can not cache {screenshot.image_path}: {e}')
+            return None
+
+    def _get_output_files(self, screenshot: Screenshot) -> Dict[str, str]:
+        """Names in the cache of the heatmap and score files owleye writes for a screenshot"""
+        name = os.path.splitext(os.path.basename(screenshot.get_image_path(file_type='jpg')))[0]
+        return {'heatmap.jpg': os.path.join(self.output_dir, name + '.jpg'), 'score.json': os.path.join(self.output_dir, name + '.json')}
+
+    def _restore_cached(self, screenshot: Screenshot) -> bool:
+        """Copy the results of a screenshot seen by any job to the output directory, returns False if not cached"""
+        key = self._get_cache_key(screenshot)
+        if key is None:
+            return False
+        os.makedirs(self.output_dir, exist_ok=True)
+        return InferenceCache.instance().restore(key, self._get_output_files(screenshot)) is not None
+
+    def _cache_results(self, screenshots: list[Screenshot]) -> None:
+        """Add the results owleye wrote for the screenshots to the inference cache"""
+        for screenshot in screenshots:
+            key = self._get_cache_key(screenshot)
+            files = {name: path for name, path in self._get_output_files(screenshot).items() if os.path.exists(path)}
+            if key is not None and files:
+                InferenceCache.instance().put(key, files)
+
     def _sub_to_screenshots(self) -> None:
         """Subscribe to screenshot resource group"""
         if ResourceType.SCREENSHOT in self.resource_dict:
@@ -129,6 +181,12 @@ class Owleye(Task):
             if not self.status == StatusEnum.running:
                 self.start()
 
+    def restore(self, resource_type: ResourceType, resource: ResourceWrapper) -> None:
+        """Screenshots with a similar structure to one already processed are skipped after resuming"""
+        structure_id = resource.get_metadata().get('structure_id')
+        if structure_id is not None:
+            self.completed_states.add(structure_id)
+
     def _publish_issues(self, issues: list[dict]) -> None:
         """Publish issues to resource group"""
         if not ResourceType.DISPLAY_ISSUE in self.resource_dict:
@@ -136,23 +194,36 @@ class Owleye(Task):
 
         for issue in issues:
             rw = ResourceWrapper(issue["image"], 'Owleye', issue)
-            self.resource_dict[ResourceType.DISPLAY_ISSUE].publish(rw, self.is_complete())
+            self.resource_dict[ResourceType.DISPLAY_ISSUE].publish(rw, issue is issues[-1] and self.is_complete())
 
     def _get_display_issues(self, screenshots: list[Screenshot]) -> List[dict]:
-        """Returns a list of heatmap images produced by owleye screenshots in params list
+        """Returns the owleye results of every screenshot in params list, so the last one completes the output
 
         Returns:
-            list[tuple(Screenshot, str)]: Pair of origial screenshot and heatmap image path
+            list[dict]: Screenshot ids with the heatmap image path, None if the screenshot was not localized,
+            e.g. clean screenshots with triage, and the bug score, None if owleye failed
         """
         heatmaps = []
         for screenshot in screenshots:
             filename = os.path.basename(screenshot.get_image_path(file_type='jpg'))
-            if os.path.exists(os.path.join(self.output_dir, filename)):
-                heatmaps.append({
-                    "activity_name": screenshot.ui_screen,
-                    "screenshot_id": screenshot.screenshot_id,              # screenshot_id of input
-                    "state_id": screenshot.state_id,
-                    "structure_id": screenshot.structure_id,
-                    "image": os.path.join(self.output_dir, filename)
-                    })
+            heatmap_path = os.path.join(self.output_dir, filename)
+            heatmaps.append({
+                "activity_name": screenshot.ui_screen,
+                "screenshot_id": screenshot.screenshot_id,              # screenshot_id of input
+                "state_id": screenshot.state_id,
+                "structure_id": screenshot.structure_id,
+                "image": heatmap_path if os.path.exists(heatmap_path) else None,
+                "score": self._get_score(filename)                      # probability of a display issue
+                })
         return heatmaps
+
+    def _get_score(self, filename: str) -> float:
+        """Classification score owleye wrote next to the heatmap, None if there is none"""
+        score_path = os.path.join(self.output_dir, os.path.splitext(filename)[0] + '.json')
+        if not os.path.exists(score_path):
+            return None
+        try:
+            with open(score_path) as f:
+                return json.load(f).get('score')
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,286 @@
+from dataclasses import dataclass, field
+from resources.resource_types import ResourceType
+from threading import Lock, Timer
+from typing import Dict, List, Set
+import atexit
+import json
+import os
+
+
+class TaskDurations():
+    """
+    Historical run time of every task, used to plan jobs.
+
+    Durations are kept as an exponential moving average per task class name and saved as JSON to the file in the
+    TASK_DURATIONS environment variable. If the file can not be read or written durations are only kept in memory.
+    Saves are debounced, the durations recorded within TASK_DURATIONS_SAVE_DELAY seconds are written at once by a
+    background timer instead of by the thread finishing the task.
+    """
+
+    _instance: 'TaskDurations' = None
+    _instance_lock = Lock()
+
+    _default_path = '/home/data/.task_durations.json'
+    _default_duration = 600.0       # seconds expected from a task which never ran
+    _smoothing = 0.3                # weight of the latest run in the average
+    _default_save_delay = float(os.environ.get('TASK_DURATIONS_SAVE_DELAY', 10))
+
+    def __init__(self, path: str = None, save_delay: float = None) -> None:
+        """
+        Parameters:
+            path - (str) The JSON file of the durations, None to keep them in memory only.
+            save_delay - (float) Seconds from a recorded duration to the save of the file.
+        """
+        self.path = path
+        self.save_delay = self._default_save_delay if save_delay is None else save_delay
+        self._lock = Lock()
+        self._durations: Dict[str, Dict[str, float]] = {}
+        self._save_timer: Timer = None      # pending save, None if the file is up to date
+
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._durations = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f'Failed to read task durations {path}: {e}')
+
+        if path:
+            atexit.register(self.flush)
+
+
+    @classmethod
+    def instance(cls, path: str = None) -> 'TaskDurations':
+        """
+        Get the durations shared by every job, saved to **path** or by default the TASK_DURATIONS environment variable.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(path or os.environ.get('TASK_DURATIONS', cls._default_path))
+            return cls._instance
+
+
+    def get(self, task_name: str) -> float:
+        """
+        Returns: (float) Expected seconds the task takes.
+        """
+        with self._lock:
+            if task_name in self._durations:
+                return self._durations[task_name]['average']
+        return self._default_duration
+
+
+    def record(self, task_name: str, seconds: float) -> None:
+        """
+        Add the duration of a successful run of the task.
+        """
+        with self._lock:
+            if task_name in self._durations:
+                entry = self._durations[task_name]
+                entry['average'] += self._smoothing * (seconds - entry['average'])
+                entry['runs'] += 1
+            else:
+                self._durations[task_name] = {'average': seconds, 'runs': 1}
+
+            if self.path and self._save_timer is None:
+                self._save_timer = Timer(self.save_delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+        print(f'{task_name} took {seconds:.1f}s, expected {self.get(task_name):.1f}s for the next run')
+
+
+    def flush(self) -> None:
+        """
+        Save the durations recorded since the last save now.
+        """
+        with self._lock:
+            if self._save_timer is None:
+                return
+            self._save_timer.cancel()
+            self._save_timer = None
+            self._save()
+
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        try:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self._durations, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f'Failed to save task durations {self.path}: {e}')
+
+
+
+@dataclass
+class TaskPlan:
+    """
+    Tasks a job needs and the order to launch them.
+
+    Attributes:
+        order:              Task names, the task with the longest remaining path through the graph first.
+        dependencies:       Task name to the names of the tasks producing its inputs.
+        critical_path:      Longest chain of dependent tasks by expected duration.
+        expected_duration:  Expected seconds of the critical path.
+    """
+
+    order: List[str]
+    dependencies: Dict[str, Set[str]] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)
+    expected_duration: float = 0
+
+
+
+class TaskPlanner():
+    """
+    Builds the graph of the tasks a job needs from their input and output resource types.
+
+    Inputs no registered task produces (the apk, uploaded files) are expected to be provided by the job. Every
+    other input of a requested task is produced by a task already in the plan, or by the default producer of the
+    resource type, so only the producers actually needed are started. Producers are not picked by duration, a
+    producer failing fast would otherwise look fastest. Durations only set the launch order: tasks are launched
+    longest path first, so the long pole of the job (e.g. Droidbot -> Owleye) gets its resources before
+    everything else.
+    """
+
+    # Producer of a resource type when several tasks produce it, the first registered producer otherwise
+    _default_producers = {
+        ResourceType.SCREENSHOT: 'Droidbot',
+    }
+
+    def __init__(self, tasks: Dict[str, type], durations: TaskDurations = None) -> None:
+        """
+        Parameters:
+            tasks - (Dict[str, type]) Registered task classes by name, i.e. TaskFactory._tasks.
+            durations - (TaskDurations) Historical durations, the shared ones by default.
+        """
+        self.tasks = tasks
+        self.durations = durations or TaskDurations.instance()
+
+
+    def resolve(self, name: str) -> str:
+        """
+        Registered name of a task given its registered name, class name or either with a lowercase first letter.
+        """
+        name = name[0].upper() + name[1:]
+        if name in self.tasks:
+            return name
+        for key, cls in self.tasks.items():
+            if cls.__name__ == name:
+                return key
+        raise KeyError(f'Unknown task {name}')
+
+
+    def get_duration(self, name: str) -> float:
+        return self.durations.get(self.tasks[name].__name__)
+
+
+    def plan(self, names: List[str], provided_types: List[ResourceType] = None) -> TaskPlan:
+        """
+        Plan the tasks needed to run the requested tasks.
+
+        Parameters:
+            names - (List[str]) The requested tasks.
+            provided_types - (List[ResourceType]) Resource types the job already has, their producers are not
+                started, e.g. outputs of tasks which completed before a job was resumed.
+
+        Returns: (TaskPlan) The plan.
+        """
+        provided = set(provided_types or [])
+        planned = []
+        for name in names:
+            name = self.resolve(name)
+            if name not in planned:
+                planned.append(name)
+
+        # Add producers until every input is produced by a planned task or provided
+        while True:
+            missing = self._get_missing_types(planned, provided)
+            if not missing:
+                break
+
+            # Inputs only one task produces first, the task may also produce the other missing inputs
+            candidates = {resource_type: self._get_producers(resource_type) for resource_type in missing}
+            resource_type = min(missing, key=lambda t: (len(candidates[t]), t.value))
+            producer = self._get_default_producer(resource_type, candidates[resource_type])
+            print(f'Planning {producer} to produce {resource_type}')
+            planned.append(producer)
+
+        dependencies = {name: self._get_dependencies(name, planned, provided) for name in planned}
+        remaining = self._get_remaining_durations(planned, dependencies)
+        order = sorted(planned, key=lambda name: (-remaining[name], planned.index(name)))
+        critical_path = self._get_critical_path(order, dependencies, remaining)
+
+        plan = TaskPlan(order, dependencies, critical_path, remaining[critical_path[0]] if critical_path else 0)
+        print(f'Planned tasks {plan.order} with critical path {plan.critical_path} ({plan.expected_duration:.0f}s)')
+        return plan
+
+
+    def _get_producers(self, resource_type: ResourceType) -> List[str]:
+        return [name for name, cls in self.tasks.items() if resource_type in (cls.get_output_types() or [])]
+
+
+    def _get_default_producer(self, resource_type: ResourceType, producers: List[str]) -> str:
+        default = self._default_producers.get(resource_type)
+        for name in producers:
+            if default in (name, self.tasks[name].__name__):
+                return name
+        return producers[0]
+
+
+    def _get_missing_types(self, planned: List[str], provided: Set[ResourceType]) -> List[ResourceType]:
+        """Inputs of planned tasks which a registered task produces but no planned task does"""
+        produced = set(provided)
+        for name in planned:
+            produced.update(self.tasks[name].get_output_types() or [])
+
+        missing = []
+        for name in planned:
+            for resource_type in self.tasks[name].get_input_types() or []:
+                if resource_type not in produced and resource_type not in missing and self._get_producers(resource_type):
+                    missing.append(resource_type)
+        return missing
+
+
+    def _get_dependencies(self, name: str, planned: List[str], provided: Set[ResourceType]) -> Set[str]:
+        inputs = set(self.tasks[name].get_input_types() or []) - provided
+        return set(
+            producer for producer in planned
+            if producer != name and inputs.intersection(self.tasks[producer].get_output_types() or [])
+        )
+
+
+    def _get_remaining_durations(self, planned: List[str], dependencies: Dict[str, Set[str]]) -> Dict[str, float]:
+        """
+        Expected seconds from the start of each task to the end of the longest chain of tasks depending on it.
+        """
+        consumers = {name: [other for other in planned if name in dependencies[other]] for name in planned}
+        remaining = {}
+        visiting = set()
+
+        def visit(name: str) -> float:
+            if name in remaining:
+                return remaining[name]
+            if name in visiting:
+                raise ValueError(f'Task {name} depends on itself')
+            visiting.add(name)
+            remaining[name] = self.get_duration(name) + max([visit(consumer) for consumer in consumers[name]], default=0)
+            visiting.remove(name)
+            return remaining[name]
+
+        for name in planned:
+            visit(name)
+        return remaining
+
+
+    def _get_critical_path(self, order: List[str], dependencies: Dict[str, Set[str]], remaining: Dict[str, float]) -> List[str]:
+        if not order:
+            return []
+
+        path = [order[0]]
+        while True:
+            consumers = [name for name in order if path[-1] in dependencies[name]]
+            if not consumers:
+                return path
+            path.append(max(consumers, key=lambda name: remaining[name]))
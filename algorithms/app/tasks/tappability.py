@@ -2,7 +2,8 @@ import os
 from resources.resource import *
 from models.screenshot import *
 from tasks.task import Task
-from typing import List, Callable, Tuple
+from models.inference_cache import InferenceCache
+from typing import List, Callable, Tuple, Optional
 import shutil
 import subprocess
 import json
@@ -15,6 +16,12 @@ class Tappability(Task):
     _input_types = [ResourceType.SCREENSHOT]
     _output_types = [ResourceType.TAPPABILITY_PREDICTION]
     _url = "http://host.docker.internal:3007/execute"
+    _heatmap_url = "http://host.docker.internal:3007/heatmap"
+    _defer_heatmaps = os.environ.get('TAPPABILITY_DEFER_HEATMAPS', 'false').lower() in ['1', 'true']   # heatmaps are created later or on request
+    _model_url = "http://host.docker.internal:3007/model"     # reports the model digest
+    resource_class = 'inference'
+    _batch_size = int(os.environ.get('TAPPABILITY_BATCH_SIZE', 16))                # screenshots sent in one request
+    _batch_wait = float(os.environ.get('TAPPABILITY_BATCH_WAIT_MS', 2000)) / 1000  # seconds to wait for a batch to fill
     
     def __init__(self, output_dir: str, resource_dict: dict[ResourceType, ResourceGroup], uuid: str) -> None:
         super().__init__(output_dir, resource_dict, uuid)
@@ -22,6 +29,7 @@ class Tappability(Task):
         self.queue: list[Screenshot] = []         # list of unprocessed screenshots
         self.completed_states: set[str] = set()   # set of screenshot structure_ids that have been completed
         self.threshold = 50
+        self._model_version = None                # digest of the model of the service, cached results of other models are not used
         self._sub_to_new_screenshots()
             
     @classmethod
@@ -51,7 +59,8 @@ class Tappability(Task):
             "image_dir" : image_dir,
             "json_dir" : json_dir,
             "output_dir" : output_dir,
-            "threshold" : str(threshold)
+            "threshold" : str(threshold),
+            "defer_heatmaps" : Tappability._defer_heatmaps
         }
         
         response = Tappability.http_request(Tappability._url, data)
@@ -60,6 +69,21 @@ class Tappability(Task):
         print("STATUS " + str(status))
         return status
     
+    @classmethod
+    def request_heatmap(cls, result_dir: str, element_id: str) -> Optional[str]:
+        """Get the heatmap of an element rated not tappable, it is created now if it was deferred.
+
+        Attributes:
+            result_dir: Output dir of the screenshot.
+            element_id: Id of the element in the description of the screenshot.
+
+        Returns: Path of the heatmap or None if it could not be created.
+        """
+        response = Tappability.http_request(Tappability._heatmap_url, {"output_dir": result_dir, "id": element_id})
+        if response is None or response.status_code != 200:
+            return None
+        return response.json().get('heatmap')
+
     def is_complete(self) -> bool:
         return (len(self.queue) == 0 and not self.resource_dict[ResourceType.SCREENSHOT].is_active())
         
@@ -101,14 +125,17 @@ class Tappability(Task):
                 continue
             
             try:
-                # get next screenshot from queue
-                next_img = self.queue.pop(0)
-                self._prepare_inputs([next_img])
-                print(f'Running Tappability for {next_img}')
-                response = Tappability.run(self.input_dir, self.input_dir, self.output_dir, self.threshold)
-                result = self._get_results([next_img])
-                if response == StatusEnum.successful and len(result) > 0:
-                    print(f'Tappability successfully proccessed image: {next_img}. Output: {result[0]}\n')
+                # get next batch of screenshots from queue
+                batch = self._take_batch(self.queue, self._batch_size, self._batch_wait, self.resource_dict[ResourceType.SCREENSHOT].is_active)
+                uncached = [screenshot for screenshot in batch if not self._restore_cached(screenshot)]
+                if uncached:
+                    self._prepare_inputs(uncached)
+                    print(f'Running Tappability for {len(uncached)} images, {len(batch) - len(uncached)} cached')
+                    if Tappability.run(self.input_dir, self.input_dir, self.output_dir, self.threshold) == StatusEnum.successful:
+                        self._cache_results(uncached)
+                result = self._get_results(batch)
+                if len(result) > 0:
+                    print(f'Tappability successfully proccessed {len(batch)} images. Output: {len(result)} results\n')
                     self._publish(result)
             except Exception as err:
                 print(f"Error {err.__traceback__} in Tappability while trying to process image.\nTappability continuing")
@@ -128,6 +155,61 @@ class Tappability(Task):
             shutil.copy(json_path, os.path.join(self.input_dir, f'{img_filename}.json'))
 
     
+    def _get_result_dir(self, screenshot: Screenshot) -> str:
+        return os.path.join(self.output_dir, os.path.splitext(os.path.basename(screenshot.image_path))[0])
+
+    def _get_cache_key(self, screenshot: Screenshot) -> str:
+        """Key of the results of a screenshot in the inference cache, None if there is no cache or model version"""
+        if InferenceCache.instance() is None:
+            return None
+        if self._model_version is None:
+            self._model_version = Tappability.request_model_version(Tappability._model_url)
+            if self._model_version is None:
+                return None
+        try:
+            return InferenceCache.get_key(
+                Tappability.__name__, self._model_version, self.threshold, Tappability._defer_heatmaps,
+                InferenceCache.pixel_digest(screenshot.get_image_path(file_type='jpg')),
+                InferenceCache.layout_digest(screenshot.get_layout_path(file_type='json'))
+            )
+        except OSError as e:
+            print(f'Tappability can not cache {screenshot.image_path}: {e}')
+            return None
+
+    def _restore_cached(self, screenshot: Screenshot) -> bool:
+        """Copy the results of a screenshot seen by any job to its result directory, returns False if not cached"""
+        key = self._get_cache_key(screenshot)
+        files = InferenceCache.instance().get(key) if key else None
+        if files is None:
+            return False
+
+        result_dir = self._get_result_dir(screenshot)
+        os.makedirs(result_dir, exist_ok=True)
+        if InferenceCache.instance().restore(key, {name: os.path.join(result_dir, name) for name in files}) is None:
+            return False
+
+        # heatmap paths of the description point to the result directory of the job which cached it
+        desc_path = os.path.join(result_dir, 'description.json')
+        if os.path.exists(desc_path):
+            with open(desc_path) as f:
+                desc_file = json.load(f)
+            for item in desc_file.values():
+                if item.get('heatmap'):
+                    item['heatmap'] = os.path.join(result_dir, os.path.basename(item['heatmap']))
+            with open(desc_path, 'w') as f:
+                json.dump(desc_file, f)
+        return True
+
+    def _cache_results(self, screenshots: List[Screenshot]) -> None:
+        """Add the result directories tappability wrote for the screenshots to the inference cache"""
+        for screenshot in screenshots:
+            key = self._get_cache_key(screenshot)
+            result_dir = self._get_result_dir(screenshot)
+            if key is None or not os.path.exists(os.path.join(result_dir, 'description.json')):
+                continue
+            files = {name: os.path.join(result_dir, name) for name in os.listdir(result_dir)}
+            InferenceCache.instance().put(key, {name: path for name, path in files.items() if os.path.isfile(path)})
+
     def _get_results(self, screenshots: List[Screenshot]) -> List[dict]:
         """Get Tapability results for a list of screenshots. 
         
@@ -172,6 +254,12 @@ class Tappability(Task):
         return results       
         
     
+    def restore(self, resource_type: ResourceType, resource: ResourceWrapper) -> None:
+        """Screenshots with a similar structure to one already processed are skipped after resuming"""
+        structure_id = resource.get_metadata().get('structure_id')
+        if structure_id is not None:
+            self.completed_states.add(structure_id)
+    
     def _publish(self, item_lst: List[dict]) -> None:
         """publishes and updates item"""
         if not ResourceType.TAPPABILITY_PREDICTION in self.resource_dict:
@@ -180,7 +268,7 @@ class Tappability(Task):
         for item in item_lst:
             print('tappable publishing ' + str(item))
             rw = ResourceWrapper(os.path.join(self.output_dir), 'Tappable', item)
-            self.resource_dict[ResourceType.TAPPABILITY_PREDICTION].publish(rw, self.is_complete())
+            self.resource_dict[ResourceType.TAPPABILITY_PREDICTION].publish(rw, item is item_lst[-1] and self.is_complete())
         
     
 
@@ -4,6 +4,8 @@ from abc import ABC, ABCMeta, abstractmethod
 from atexit import register
 from venv import create
 from threading import Thread
+from time import monotonic, sleep
+from tasks.scheduler import TaskPlanner, TaskDurations
 import requests
 import stat
 import os
@@ -21,15 +23,24 @@ class TaskFactory:
     _tasks = {}
 
     @staticmethod
-    def create_tasks(names : List[str], base_dir : str, resource_groups : Dict[ResourceType, ResourceGroup], uuid: str) -> None:
-        unique_names = TaskFactory.get_task_dependencies(names)
-        unique_names = list(set(names))
+    def create_tasks(names : List[str], base_dir : str, resource_groups : Dict[ResourceType, ResourceGroup], uuid: str, provided_types : List[ResourceType] = None) -> List['Task']:
+        """
+        Create the requested tasks and the tasks producing their inputs.
+
+        Tasks are created in the order of the plan, so the tasks on the critical path subscribe to the apk and
+        lease emulators first.
+
+        Parameters:
+            names - (List[str]) The requested tasks.
+            provided_types - (List[ResourceType]) Resource types whose producers should not be created.
+
+        Returns: (List[Task]) The created tasks.
+        """
+        plan = TaskPlanner(TaskFactory._tasks).plan(names, provided_types)
+        tasks = []
 
-        for name in unique_names:
-            # Capitalize first character of string
-            name = name[0].upper() + name[1:]
+        for name in plan.order:
             cls = TaskFactory._tasks[name]
-            assert cls is not None
             output_dir = os.path.join(base_dir, cls.__name__.lower())
 
             # Create resource groups for algorithm
@@ -40,28 +51,15 @@ class TaskFactory:
 
             print(f'Inside task factory creating { cls.__name__ } {output_dir} and {resource_groups}')
 
-            cls(output_dir, resource_groups, uuid) #TODO pass in output_dir
+            tasks.append(cls(output_dir, resource_groups, uuid)) #TODO pass in output_dir
+
+        return tasks
 
 
     @staticmethod
     def get_task_dependencies(names: List[str]) -> List[str]:
-        all_names = names
-
-        for i in range(len(names)):
-            name = names[i]
-            # Capitalize first character of string
-            name = name[0].upper() + name[1:]
-            cls = TaskFactory._tasks[name]
-            assert cls is not None
-            req_inputs = cls.get_input_types()
-            print(f'{cls.__name__} has inputs {req_inputs}')
-            depends = TaskFactory.get_tasks_with_outputs(req_inputs)
-
-            all_names += depends
-
-        unique_names = list(set(all_names))
-
-        return unique_names
+        """Names of the requested tasks and the tasks producing their inputs, in launch order"""
+        return TaskPlanner(TaskFactory._tasks).plan(names).order
 
     @staticmethod
     def get_tasks_with_outputs(resource_types : List[ResourceType]) -> List[str]:
@@ -75,11 +73,11 @@ class TaskFactory:
                     if cls.get_output_types() is None:
                         continue
 
-                    if type in cls.get_output_types():
+                    if type in cls.get_output_types() and task not in output:
                         print(f'{cls.__name__} has outputs {type}')
-                        output.append(cls.get_name())
+                        output.append(task)
 
-        return list(set(output))
+        return output
 
 
 class Task(ABC, metaclass=TaskMetaclass):
@@ -88,18 +86,33 @@ class Task(ABC, metaclass=TaskMetaclass):
 
     _status_controller = os.environ['STATUS_CONTROLLER']
     _shared_volume = "/home/tasks"
+    resource_class = 'io'           # what the task mostly uses, jobs are admitted per resource class
 
     def __init__(self, output_dir : str, resource_dict : Dict[ResourceType, ResourceGroup], uuid: str) -> None:
         super().__init__()
         self._thread = Thread(target = self.run)
         self.uuid = uuid
         self.output_dir = output_dir
+        self._started_at = None
         self.status = StatusEnum.none
         self.resource_dict = resource_dict
 
         # if not os.path.exists(self.output_dir):
         #     os.makedirs(self.output_dir)
 
+    @property
+    def status(self) -> StatusEnum:
+        return self._status
+
+    @status.setter
+    def status(self, status: StatusEnum) -> None:
+        """Time from the first start of the task to each success is recorded to plan later jobs"""
+        self._status = status
+        if status == StatusEnum.running and self._started_at is None:
+            self._started_at = monotonic()
+        elif status == StatusEnum.successful and self._started_at is not None:
+            TaskDurations.instance().record(self.__class__.__name__, monotonic() - self._started_at)
+
     @abstractmethod
     def start(self):
         pass
@@ -143,6 +156,30 @@ class Task(ABC, metaclass=TaskMetaclass):
         return self.status
 
 
+    def _take_batch(self, queue: list, batch_size: int, batch_wait: float, more_expected: Callable[[], bool]) -> list:
+        """
+        Take up to batch_size items from the front of a queue filled by another thread. Waits up to batch_wait
+        seconds for the batch to fill, unless more_expected says no more items will come.
+
+        Returns: (list) The batch, empty if the queue is empty.
+        """
+        deadline = monotonic() + batch_wait
+        while 0 < len(queue) < batch_size and monotonic() < deadline and more_expected():
+            sleep(min(0.05, max(0, deadline - monotonic())))
+
+        batch = queue[:batch_size]
+        del queue[:len(batch)]      # items are only appended meanwhile, so these are the items taken
+        return batch
+
+
+    def restore(self, resource_type: ResourceType, resource: ResourceWrapper) -> None:
+        """
+        Called when a job is resumed with every resource the task published before the restart,
+        before any resource is replayed. Tasks override it to skip work they already did.
+        """
+        pass
+
+
     @classmethod
     def http_request(cls, url, body):
         """Makes a http request with url and body
@@ -162,3 +199,19 @@ class Task(ABC, metaclass=TaskMetaclass):
             print("ERROR ON REQUEST: " + error)
 
         return response
+
+
+    @classmethod
+    def request_model_version(cls, url: str) -> str:
+        """Digest of the model served by an inference service, its results cached by the tasks are keyed by it
+
+        returns the digest, None if the service did not report it
+        """
+        try:
+            response = requests.get(url, timeout=10)
+            if response.status_code == 200:
+                return response.json().get('model_version')
+            print(f'Model version request to {url} failed with status {response.status_code}')
+        except (requests.RequestException, ValueError) as e:
+            print(f'Model version request to {url} failed: {e}')
+        return None
@@ -1,6 +1,8 @@
 from models.screenshot import Screenshot
-from models.emulator import Emulator
+from resources.emulator_pool import EmulatorPool, LEASE_TIMEOUT
+from tasks.concurrency.status_shipper import StatusShipper
 from tasks.task import *
+from threading import Thread, Lock
 from resources.resource import *
 from typing import List, Dict, Tuple
 import os
@@ -9,16 +11,19 @@ import os
 class Xbot(Task):
     """Class for managing Xbot algorithm"""
 
-    _input_types = [ResourceType.APK_FILE, ResourceType.EMULATOR]
+    _input_types = [ResourceType.APK_FILE]
     # _output_types = [ResourceType.ACCESSIBILITY_ISSUE]
     _output_types = [ResourceType.SCREENSHOT, ResourceType.ACCESSIBILITY_ISSUE]
     _url = 'http://host.docker.internal:3003/execute'
+    _emulator_lease_timeout = LEASE_TIMEOUT     # fail when no emulator is free for this many seconds
+    resource_class = 'emulator'
 
     def __init__(self, output_dir, resource_dict : Dict[ResourceType, ResourceGroup], uuid: str) -> None:
         super().__init__(output_dir, resource_dict, uuid)
         self.apk_queue = []
-        self._sub_to_apks()
         self.running = False
+        self._apk_lock = Lock()     # guards the apk queue and the running flag
+        self._sub_to_apks()
 
     @classmethod
     def get_name(cls) -> str:
@@ -47,15 +52,23 @@ class Xbot(Task):
         task.start()
 
     @classmethod
-    def run(cls, apk_path: str, output_dir: str, emulator: str) -> None:
-        """Runs Xbot"""
+    def run(cls, apk_path: str, output_dir: str, emulator: str) -> bool:
+        """
+        Runs Xbot
+
+        Returns: (bool) Whether the xbot service completed the run.
+        """
         data = {
             "apk_path": apk_path,
             "output_dir": output_dir,
             "emulator": emulator
         }
 
-        Xbot.http_request(Xbot._url, data)
+        response = Xbot.http_request(Xbot._url, data)
+        if response is None or response.status_code != 200:
+            print(f'Xbot failed on {apk_path}: ' + (f'status {response.status_code}' if response is not None else 'no response'))
+            return False
+        return True
 
 
     def _sub_to_apks(self) -> None:
@@ -64,45 +77,55 @@ class Xbot(Task):
             self.resource_dict[ResourceType.APK_FILE].subscribe(self.apk_callback) # calls add_apk() when new apk is available
 
 
-    def _sub_to_emulators(self) -> None:
-        """Get notified when an emulator is available"""
-        if ResourceType.EMULATOR in self.resource_dict:
-            self.resource_dict[ResourceType.EMULATOR].subscribe(self.emulator_callback)
-
-
-    def _process_apks(self, emulator: Emulator) -> None:
-        """Process apks"""
-        if self.running:
-            return
-        
-        self.running = True
-        print("XBOT RUNNING, EMULATOR= " + str(emulator))
-        
-
-        if len(self.apk_queue) > 0:                              # get next apk
-            apk = self.apk_queue.pop(0)
-
-            apk_path = apk.get_path()
-            Xbot.run(apk_path, self.output_dir, emulator.connection_str)      # run algorithm
-            self._publish_outputs()                                # dispatch results
-
-        print("XBOT COMPLETED")
-        self.running = False
+    def _process_apks(self) -> None:
+        """Process apks on emulators leased from the emulator pool"""
+        self.status = StatusEnum.running
+        stopped = False     # the running flag was cleared with the queue empty
+        failed = False      # an apk was not processed, the task is not successful and its duration not recorded
+        try:
+            while True:
+                with self._apk_lock:                                 # get next apk
+                    if not self.apk_queue:
+                        print("XBOT FAILED" if failed else "XBOT COMPLETED")
+                        self.status = StatusEnum.failed if failed else StatusEnum.successful
+                        self.running = False
+                        stopped = True
+                        return
+
+                lease = EmulatorPool.instance().lease(Xbot.__name__, self._emulator_lease_timeout)
+                if lease is None:
+                    message = f'Xbot failed, no emulator was available within {self._emulator_lease_timeout:g} seconds.'
+                    print("XBOT HAS NO EMULATOR AVAILABLE")
+                    self.status = StatusEnum.failed
+                    if self.uuid:
+                        StatusShipper.instance(self._status_controller).update_status(self.uuid, 'xbot', self.status.value, message)
+                    return
+
+                with lease as emulator:
+                    print("XBOT RUNNING, EMULATOR= " + str(emulator))
+                    with self._apk_lock:
+                        apk = self.apk_queue.pop(0)
+
+                    apk_path = apk.get_path()
+                    if not Xbot.run(apk_path, self.output_dir, emulator.connection_str):      # run algorithm
+                        failed = True
+                self._publish_outputs()                                # dispatch results
+        finally:
+            if not stopped:
+                with self._apk_lock:
+                    self.running = False
 
 
     def apk_callback(self, new_apk : ResourceWrapper) -> None:
         """callback method to add apk and run algorithm"""
-        if new_apk not in self.apk_queue:
-            self.apk_queue.append(new_apk)
-            self._sub_to_emulators()
-
-
-    def emulator_callback(self, emulator : ResourceWrapper) -> None:
-        """callback method for using emulator"""
-        device: Emulator = emulator.get_metadata()
-        if device.can_use('Xbot') and len(self.apk_queue) > 0:
-            self._process_apks(emulator.get_metadata())
-        emulator.release()
+        with self._apk_lock:
+            if new_apk not in self.apk_queue:
+                self.apk_queue.append(new_apk)
+
+            if self.running:
+                return
+            self.running = True
+        Thread(target=self._process_apks).start()
 
 
     def is_complete(self) -> bool:
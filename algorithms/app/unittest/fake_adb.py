@@ -0,0 +1,36 @@
+"""
+Stand-in for adb used by the emulator pool tests.
+
+Emulators listed in the comma separated FAKE_ADB_DEVICES environment variable are connected and booted,
+every other emulator is offline.
+"""
+import os
+import sys
+
+
+def main(args):
+    booted = [serial for serial in os.environ.get('FAKE_ADB_DEVICES', '').split(',') if serial]
+
+    if args[:1] == ['connect']:
+        print(f'connected to {args[1]}' if args[1] in booted else f'failed to connect to {args[1]}')
+        return 0
+
+    if args[:1] == ['devices']:
+        print('List of devices attached')
+        for serial in booted:
+            print(f'{serial}\tdevice')
+        return 0
+
+    if args[:1] == ['-s'] and args[2:] == ['shell', 'getprop', 'sys.boot_completed']:
+        if args[1] not in booted:
+            print(f"adb: device '{args[1]}' not found", file=sys.stderr)
+            return 1
+        print('1')
+        return 0
+
+    print(f'fake adb does not support {args}', file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
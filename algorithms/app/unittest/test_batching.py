@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import shutil
+import inspect
+import tempfile
+import unittest
+from threading import Thread
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from PIL import Image
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+for name in ['STATUS_CONTROLLER', 'DROIDBOT', 'GIFDROID', 'OWLEYE']:
+    os.environ.setdefault(name, 'http://localhost:1/')
+
+from resources.resource import *
+from models.screenshot import Screenshot
+from tasks.owleye import Owleye
+from tasks.enums.status_enum import StatusEnum
+
+
+class FakeOwleyeHandler(BaseHTTPRequestHandler):
+    """Copies every image of the request to the output directory like the owleye service"""
+    requests = []
+    model_version = 'model'
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        images = sorted(os.listdir(data['image_dir']))
+        FakeOwleyeHandler.requests.append(images)
+        for i, image in enumerate(images):
+            # with triage only some images are localized but every image gets a score
+            if i % 2 == 0 or not data.get('triage', True):
+                shutil.copy(os.path.join(data['image_dir'], image), data['output_dir'])
+            with open(os.path.join(data['output_dir'], os.path.splitext(image)[0] + '.json'), 'w') as f:
+                json.dump({'score': 0.9 if i % 2 == 0 else 0.1, 'localized': i % 2 == 0}, f)
+        self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self):
+        body = json.dumps({'model_version': FakeOwleyeHandler.model_version}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Test_Batching(unittest.TestCase):
+    def setUp(self):
+        FakeOwleyeHandler.requests = []
+        FakeOwleyeHandler.model_version = 'model'
+        self.server = HTTPServer(('localhost', 0), FakeOwleyeHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        Owleye._url = f'http://localhost:{self.server.server_port}/execute'
+        Owleye._model_url = f'http://localhost:{self.server.server_port}/model'
+        self.triage = Owleye._triage
+        Owleye._triage = True
+
+        self.directory = tempfile.mkdtemp()
+        os.environ['INFERENCE_CACHE'] = os.path.join(self.directory, 'cache')
+        self.groups = {
+            ResourceType.SCREENSHOT: ResourceGroup(ResourceType.SCREENSHOT),
+            ResourceType.DISPLAY_ISSUE: ResourceGroup(ResourceType.DISPLAY_ISSUE),
+        }
+        self.issues = []
+        self.groups[ResourceType.DISPLAY_ISSUE].subscribe(lambda rw: self.issues.append(rw.get_metadata()))
+
+    def tearDown(self):
+        Owleye._triage = self.triage
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def _screenshot(self, i):
+        path = os.path.join(self.directory, f'screen_{i}.jpg')
+        Image.new('RGB', (8, 8), (i * 20, 0, 0)).save(path)
+        screenshot = Screenshot('MainActivity', path)
+        screenshot.structure_id = f'structure_{i}'
+        return screenshot
+
+    def test_screenshots_are_sent_in_batches(self):
+        owleye = Owleye(os.path.join(self.directory, 'owleye'), self.groups, 'job')
+        owleye._batch_size = 4
+        owleye._batch_wait = 1.0
+        os.makedirs(owleye.output_dir, exist_ok=True)
+
+        for i in range(10):
+            owleye.queue.append(self._screenshot(i))
+
+        owleye.status = StatusEnum.running
+        owleye._process_images()
+
+        self.assertEqual([len(images) for images in FakeOwleyeHandler.requests], [4, 4, 2])
+        # every screenshot is published, the clean ones triage skipped have no heatmap
+        self.assertEqual([issue['structure_id'] for issue in self.issues], [f'structure_{i}' for i in range(10)])
+        self.assertEqual([issue['score'] for issue in self.issues], [0.9, 0.1] * 5)
+        self.assertEqual([issue['image'] is None for issue in self.issues], [False, True] * 5)
+        self.assertEqual(owleye.status, StatusEnum.successful)
+
+    def test_results_are_reused_by_other_jobs(self):
+        screenshots = [self._screenshot(i) for i in range(3)]
+        for job in ['first', 'second']:
+            owleye = Owleye(os.path.join(self.directory, job), self.groups, job)
+            os.makedirs(owleye.output_dir, exist_ok=True)
+            owleye.queue.extend(screenshots)
+            owleye.status = StatusEnum.running
+            owleye._process_images()
+
+        # the second job ran no inference but published the same issues from its own output directory
+        self.assertEqual(len(FakeOwleyeHandler.requests), 1)
+        self.assertEqual([issue['structure_id'] for issue in self.issues], ['structure_0', 'structure_1', 'structure_2'] * 2)
+        self.assertEqual([issue['score'] for issue in self.issues], [0.9, 0.1, 0.9] * 2)
+        self.assertIsNone(self.issues[-2]['image'])
+        self.assertTrue(self.issues[-1]['image'].startswith(os.path.join(self.directory, 'second')))
+
+    def test_results_of_another_model_are_not_reused(self):
+        screenshots = [self._screenshot(i) for i in range(3)]
+        for job, model_version in [('first', 'model'), ('second', 'retrained')]:
+            FakeOwleyeHandler.model_version = model_version
+            owleye = Owleye(os.path.join(self.directory, job), self.groups, job)
+            os.makedirs(owleye.output_dir, exist_ok=True)
+            owleye.queue.extend(screenshots)
+            owleye.status = StatusEnum.running
+            owleye._process_images()
+
+        self.assertEqual(len(FakeOwleyeHandler.requests), 2)
+
+    def test_triaged_results_are_not_reused_without_triage(self):
+        screenshots = [self._screenshot(i) for i in range(3)]
+        for job, triage in [('triaged', True), ('localized', False)]:
+            owleye = Owleye(os.path.join(self.directory, job), self.groups, job)
+            owleye._triage = triage
+            os.makedirs(owleye.output_dir, exist_ok=True)
+            owleye.queue.extend(screenshots)
+            owleye.status = StatusEnum.running
+            owleye._process_images()
+
+        self.assertEqual(len(FakeOwleyeHandler.requests), 2)
+        self.assertEqual([issue['structure_id'] for issue in self.issues], ['structure_0', 'structure_1', 'structure_2'] * 2)
+        self.assertEqual([issue['image'] is None for issue in self.issues], [False, True, False] + [False] * 3)
+
+    def test_batch_waits_for_more_screenshots(self):
+        owleye = Owleye(os.path.join(self.directory, 'owleye'), self.groups, 'job')
+        queue = [1]
+        Thread(target=lambda: queue.extend([2, 3])).start()
+
+        self.assertEqual(owleye._take_batch(queue, 3, 5.0, lambda: True), [1, 2, 3])
+        self.assertEqual(owleye._take_batch([1], 3, 5.0, lambda: False), [1])      # nothing more is coming
+        self.assertEqual(owleye._take_batch([1, 2, 3, 4], 3, 5.0, lambda: True), [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import inspect
+import tempfile
+import unittest
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+os.environ.setdefault('STATUS_CONTROLLER', 'http://localhost:5005/status/update/')
+os.environ.setdefault('DROIDBOT', 'http://localhost:3008/new_job')
+
+from resources.resource import *
+from tasks.droidbot import Droidbot
+from tasks.enums.status_enum import StatusEnum
+
+
+class Test_Droidbot_Utg(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_dir = self.directory.name
+
+        self.resource_dict = {}
+        self.resource_dict[ResourceType.APK_FILE] = ResourceGroup(ResourceType.APK_FILE)
+        self.resource_dict[ResourceType.EMULATOR] = ResourceGroup(ResourceType.EMULATOR, usage=ResourceUsage.SEQUENTIAL)
+        self.resource_dict[ResourceType.UTG] = ResourceGroup(ResourceType.UTG)
+
+        self.published = []
+        self.resource_dict[ResourceType.UTG].subscribe(lambda rw: self.published.append(rw.get_metadata()))
+
+        self.droidbot = Droidbot(self.output_dir, self.resource_dict, None)
+        self.droidbot.status = StatusEnum.running
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write_utg(self, num_nodes):
+        utg = {
+            'num_nodes': num_nodes,
+            'nodes': [{'id': f'n{i}', 'image': f'states/screen_{i}.jpg'} for i in range(num_nodes)],
+            'edges': [{'id': f'n{i}-->n{i + 1}', 'from': f'n{i}', 'to': f'n{i + 1}', 'events': []} for i in range(num_nodes - 1)],
+        }
+        path = os.path.join(self.output_dir, 'utg.js')
+        with open(path, 'w') as f:
+            f.write('var utg = \n' + json.dumps(utg))
+        os.utime(path, ns=(num_nodes, num_nodes))
+
+    def test_only_changes_are_published(self):
+        self._write_utg(2)
+        self.droidbot._publish_utg()
+        self.droidbot._publish_utg()   # unchanged file is not published again
+
+        self._write_utg(3)
+        self.droidbot._publish_utg()
+
+        self.assertEqual(len(self.published), 2)
+        self.assertEqual([node['id'] for node in self.published[1]['nodes']], ['n2'])
+        self.assertEqual([edge['id'] for edge in self.published[1]['edges']], ['n1-->n2'])
+        self.assertEqual(self.published[1]['num_nodes'], 3)
+        self.assertEqual(self.published[1]['nodes'][0]['image'], os.path.join(self.output_dir, 'states/screen_2.jpg'))
+
+    def test_completion_is_published_when_nothing_changed(self):
+        self._write_utg(2)
+        self.droidbot._publish_utg()
+
+        self.droidbot.status = StatusEnum.successful
+        self.droidbot._publish_utg()
+
+        self.assertEqual(self.published[-1], {'nodes': [], 'edges': []})
+        self.assertFalse(self.resource_dict[ResourceType.UTG].is_active())
+
+
+if __name__ == "__main__":
+    unittest.main()
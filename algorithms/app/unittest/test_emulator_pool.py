@@ -0,0 +1,83 @@
+import os
+import sys
+import inspect
+import unittest
+from threading import Thread
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from models.emulator import Emulator
+from resources.emulator_pool import EmulatorPool, Adb
+
+
+class Test_EmulatorPool(unittest.TestCase):
+    def setUp(self):
+        os.environ['FAKE_ADB_DEVICES'] = 'localhost:5555,localhost:5557,localhost:5559'
+        self.emulators = [
+            Emulator('emulator-5554', 'localhost:5555', (1920, 1080)),
+            Emulator('emulator-5556', 'localhost:5557', (1920, 1080), set(['Droidbot'])),
+            Emulator('emulator-5558', 'localhost:5559', (1920, 1080), set(['Droidbot', 'Xbot'])),
+        ]
+        adb = Adb([sys.executable, os.path.join(currentdir, 'fake_adb.py')])
+        self.pool = EmulatorPool(self.emulators, adb, lease_duration=60, check_interval=60)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_tasks_fan_out_over_free_emulators(self):
+        first = self.pool.lease('Droidbot', timeout=1)
+        second = self.pool.lease('Droidbot', timeout=1)
+        third = self.pool.lease('Droidbot', timeout=1)
+
+        # most specific emulators are leased first
+        self.assertEqual([lease.emulator.name for lease in [first, second, third]], ['emulator-5556', 'emulator-5558', 'emulator-5554'])
+        self.assertIsNone(self.pool.lease('Xbot', timeout=0.1))
+
+        second.release()
+        with self.pool.lease('Xbot', timeout=1) as emulator:
+            self.assertEqual(emulator.name, 'emulator-5558')
+            self.assertEqual(self.pool.get_status()['emulator-5558'], {'healthy': True, 'leased_by': 'Xbot'})
+        self.assertIsNone(self.pool.get_status()['emulator-5558']['leased_by'])
+
+    def test_unhealthy_emulators_are_skipped_until_they_recover(self):
+        os.environ['FAKE_ADB_DEVICES'] = 'localhost:5555'
+        with self.pool.lease('Droidbot', timeout=1) as emulator:
+            self.assertEqual(emulator.name, 'emulator-5554')
+            self.assertFalse(self.pool.get_status()['emulator-5556']['healthy'])
+            self.assertFalse(self.pool.get_status()['emulator-5558']['healthy'])
+
+            os.environ['FAKE_ADB_DEVICES'] = 'localhost:5555,localhost:5557'
+            self.pool.check_health()
+            self.assertTrue(self.pool.get_status()['emulator-5556']['healthy'])
+            self.assertFalse(self.pool.get_status()['emulator-5558']['healthy'])
+            self.assertEqual(self.pool.lease('Droidbot', timeout=1).emulator.name, 'emulator-5556')
+
+    def test_leases_of_dead_threads_are_reclaimed(self):
+        leases = []
+        thread = Thread(target=lambda: leases.append(self.pool.lease('Xbot', timeout=1)))
+        thread.start()
+        thread.join()
+
+        self.pool.reclaim_expired()
+        self.assertEqual(self.pool.get_status()['emulator-5558']['leased_by'], 'Xbot')   # not expired yet
+
+        leases[0].expires_at = 0
+        self.assertEqual(self.pool.reclaim_expired(), leases)
+        self.assertFalse(leases[0].renew())
+        self.assertIsNotNone(self.pool.lease('Xbot', timeout=1))
+
+    def test_emulators_are_leased_when_adb_is_not_available(self):
+        pool = EmulatorPool(self.emulators, Adb(['adb-which-does-not-exist']), lease_duration=60, check_interval=60)
+        try:
+            self.assertIsNotNone(pool.lease('Xbot', timeout=1))
+            pool.check_health()
+            self.assertEqual({status['healthy'] for status in pool.get_status().values()}, {None})
+            self.assertIsNotNone(pool.lease('Droidbot', timeout=1))
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import inspect
+import tempfile
+import unittest
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+os.environ.setdefault('STATUS_CONTROLLER', 'http://localhost:5005/status/update/')
+os.environ.setdefault('DROIDBOT', 'http://localhost:3008/new_job')
+os.environ.setdefault('GIFDROID', 'http://localhost:3005/execute')
+os.environ.setdefault('OWLEYE', 'http://localhost:3004/execute')
+
+from resources.resource import *
+from resources.event_log import ResourceEventLog
+from models.screenshot import Screenshot
+from apk_analysis import ApkAnalysis
+
+
+class Test_Event_Log(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_dir = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _screenshot(self, i):
+        return Screenshot.from_dict({'ui_screen': f'activity{i}', 'image_path': f'screen_{i}.jpg', 'layout_path': None,
+                                     'screenshot_id': f'a{i}', 'structure_id': f's{i}', 'state_id': f't{i}', 'metadata': {}})
+
+    def _issue(self, i):
+        return {'screenshot_id': f'a{i}', 'structure_id': f's{i}', 'image': os.path.join(self.output_dir, f'issue_{i}.jpg')}
+
+    def test_published_resources_are_read_back(self):
+        group = ResourceGroup(ResourceType.SCREENSHOT)
+        log = ResourceEventLog(self.output_dir, truncate=True)
+        group.set_event_log(log)
+
+        group.publish(ResourceWrapper('', 'Droidbot', self._screenshot(0)), False)
+        group.publish(ResourceWrapper('', 'Droidbot', self._screenshot(1)), True)
+        group.replay(ResourceWrapper('', 'Droidbot', self._screenshot(2)), True)    # replayed resources are not recorded again
+        log.close()
+
+        with open(log.path, 'a') as f:
+            f.write('{"type": "SCREENSHOT", "orig')      # crashed while writing
+
+        events = ResourceEventLog.read(self.output_dir)
+        self.assertEqual([event.completed for event in events], [False, True])
+        self.assertEqual(events[1].type, ResourceType.SCREENSHOT)
+        self.assertEqual(events[1].resource.get_origin(), 'Droidbot')
+        self.assertEqual(events[1].resource.get_metadata(), self._screenshot(1))
+
+    def test_resume_skips_completed_tasks_and_restores_results(self):
+        log = ResourceEventLog(self.output_dir, truncate=True)
+        log.append(ResourceType.APK_FILE, ResourceWrapper('app.apk', 'upload'), True)
+        for i in range(2):
+            log.append(ResourceType.SCREENSHOT, ResourceWrapper('', 'Droidbot', self._screenshot(i)), i == 1)
+            log.append(ResourceType.DISPLAY_ISSUE, ResourceWrapper('', 'Owleye', self._issue(i)), i == 1)
+        log.close()
+
+        analysis = ApkAnalysis(self.output_dir, 'app.apk', ['Owleye'])
+        self.assertEqual(analysis.resume_processing(), ['Owleye'])
+        self.assertTrue(analysis.resources[ResourceType.DISPLAY_ISSUE].join(5))
+
+        self.assertEqual(analysis.results['Owleye'], [{'screenshot_id': f'a{i}', 'structure_id': f's{i}', 'image': f'issue_{i}.jpg'} for i in range(2)])
+        with open(os.path.join(self.output_dir, 'results.js')) as f:
+            self.assertEqual(json.loads(f.read().removeprefix('var results = \n')), analysis.results)
+
+        # the apk published on resume is recorded after the replayed events
+        analysis.event_log.close()
+        self.assertEqual(len(ResourceEventLog.read(self.output_dir)), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
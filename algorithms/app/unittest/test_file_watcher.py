@@ -0,0 +1,85 @@
+import os
+import sys
+import inspect
+import tempfile
+import unittest
+from time import sleep
+from unittest import mock
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+os.environ.setdefault('STATUS_CONTROLLER', 'http://localhost:5005/status/update')
+
+from tasks.enums.status_enum import StatusEnum
+from tasks.concurrency.file_watcher import FileWatcher
+from tasks.concurrency.inotify import Inotify
+
+
+class FakeTask():
+    def __init__(self):
+        self.status = StatusEnum.running
+
+    @classmethod
+    def get_name(cls):
+        return "Droidbot"
+
+    def get_status(self):
+        return self.status
+
+
+class Test_FileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.task = FakeTask()
+        self.detected = []
+        patcher = mock.patch.object(FileWatcher, '_log_new_files')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, name):
+        with open(os.path.join(self.directory.name, name), 'w') as f:
+            f.write('{}')
+
+    def _watch(self, mode):
+        self._write('state_0.json')
+        watcher = FileWatcher("test", 'json', self.directory.name, self.task, self.detected.extend, mode=mode)
+        watcher._poll_interval = 0.5
+        watcher.start()
+        sleep(0.5)
+        self._write('state_1.json')
+        self._write('screen_1.jpg')
+        sleep(1.5)
+        self.task.status = StatusEnum.successful
+        watcher.join()
+        return watcher
+
+    @unittest.skipUnless(Inotify.is_supported(), "inotify not available")
+    def test_inotify_detects_each_file_once(self):
+        watcher = self._watch('inotify')
+        self.assertEqual(watcher.mode, 'inotify')
+        self.assertEqual(sorted(self.detected), ['state_0.json', 'state_1.json'])
+
+    def test_poll_detects_each_file_once(self):
+        self._watch('poll')
+        self.assertEqual(sorted(self.detected), ['state_0.json', 'state_1.json'])
+
+    @unittest.skipUnless(Inotify.is_supported(), "inotify not available")
+    def test_inotify_final_pass_is_batched(self):
+        for i in range(5):
+            self._write(f'state_{i}.json')
+        self.task.status = StatusEnum.successful
+        batches = []
+        watcher = FileWatcher("test", 'json', self.directory.name, self.task, batches.append, mode='inotify')
+        watcher._max_batch_size = 2
+        watcher.start()
+        watcher.join()
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
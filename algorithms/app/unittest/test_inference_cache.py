@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import inspect
+import tempfile
+import unittest
+from PIL import Image
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from models.inference_cache import InferenceCache
+
+
+class Test_InferenceCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = InferenceCache(os.path.join(self.directory.name, 'cache'), max_bytes=350)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _file(self, name, size):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        return path
+
+    def test_results_are_restored(self):
+        self.cache.put('key', {'heatmap.jpg': self._file('a.jpg', 10)})
+        destination = os.path.join(self.directory.name, 'restored.jpg')
+
+        self.assertEqual(self.cache.restore('key', {'heatmap.jpg': destination, 'score.json': destination}), ['heatmap.jpg'])
+        self.assertEqual(os.path.getsize(destination), 10)
+        self.assertIsNone(self.cache.restore('other', {'heatmap.jpg': destination}))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for key in ['a', 'b', 'c']:
+            self.cache.put(key, {'result': self._file(key, 100)})
+        self.assertEqual(set(InferenceCache(self.cache.path, 350).get('a')), {'result'})    # a is used last
+
+        self.cache.put('d', {'result': self._file('d', 100)})
+        self.assertEqual([key for key in 'abcd' if self.cache.get(key) is not None], ['a', 'c', 'd'])
+        self.assertFalse(os.path.exists(os.path.join(self.cache.path, 'b')))
+
+    def test_keys_depend_on_content_not_files(self):
+        for name, format in [('screen.png', 'PNG'), ('screen.bmp', 'BMP')]:
+            Image.new('RGB', (4, 4), (255, 0, 0)).save(os.path.join(self.directory.name, name), format)
+        self.assertEqual(
+            InferenceCache.pixel_digest(os.path.join(self.directory.name, 'screen.png')),
+            InferenceCache.pixel_digest(os.path.join(self.directory.name, 'screen.bmp'))
+        )
+
+        layouts = []
+        for i, tag in enumerate(['first', 'second']):
+            layouts.append(os.path.join(self.directory.name, f'{tag}.json'))
+            with open(layouts[-1], 'w') as f:
+                json.dump({'tag': tag, 'views': [{'bounds': [[0, 0], [10, 10]], 'clickable': True, 'temp_id': i}]}, f)
+        self.assertEqual(InferenceCache.layout_digest(layouts[0]), InferenceCache.layout_digest(layouts[1]))
+        self.assertNotEqual(InferenceCache.get_key('Owleye', '1', 'digest'), InferenceCache.get_key('Owleye', '2', 'digest'))
+
+
+if __name__ == "__main__":
+    unittest.main()
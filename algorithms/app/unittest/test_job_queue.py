@@ -0,0 +1,80 @@
+import os
+import sys
+import inspect
+import tempfile
+import unittest
+from threading import Event
+from time import sleep
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from tasks.concurrency.job_queue import JobQueue, JobRunner, parse_limits
+
+
+class Test_JobQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'jobs.sqlite')
+        self.queue = JobQueue(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_jobs_are_admitted_by_priority_within_limits(self):
+        self.assertEqual(self.queue.enqueue('a', {'uuid': 'a'}, ['emulator', 'inference']), 1)
+        self.assertEqual(self.queue.enqueue('b', {'uuid': 'b'}, ['emulator']), 2)
+        self.assertEqual(self.queue.enqueue('c', {'uuid': 'c'}, ['io'], priority=1), 1)
+        self.assertEqual(self.queue.enqueue('c', {'uuid': 'c'}, ['io'], priority=1), 1)     # not queued twice
+
+        limits = parse_limits('emulator=1, io=1')
+        self.assertEqual(self.queue.claim(limits)['uuid'], 'c')
+        self.assertEqual(self.queue.claim(limits)['uuid'], 'a')
+        self.assertIsNone(self.queue.claim(limits))         # b waits for an emulator
+        self.assertEqual(self.queue.get_position('b'), 1)
+        self.assertEqual(self.queue.get_position('a'), 0)
+
+        self.queue.finish('a')
+        self.assertEqual(self.queue.get_state('a'), 'done')
+        self.assertEqual(self.queue.claim(limits)['uuid'], 'b')
+
+    def test_running_jobs_are_resumed_after_restart(self):
+        self.queue.enqueue('a', {'uuid': 'a'}, ['emulator'])
+        self.assertFalse(self.queue.claim({})['resume'])
+
+        queue = JobQueue(self.path)
+        self.assertEqual(queue.recover(), 1)
+        self.assertEqual(queue.claim({}), {'uuid': 'a', 'job_info': {'uuid': 'a'}, 'resume': True})
+
+    def test_runner_runs_jobs_on_bounded_workers(self):
+        started = []
+        release = Event()
+        done = Event()
+
+        def run_job(job_info, resume):
+            started.append(job_info['uuid'])
+            release.wait(5)
+            if job_info['uuid'] == 'c':
+                done.set()
+
+        runner = JobRunner(self.queue, run_job, {'emulator': 1}, workers=2)
+        runner._poll_interval = 0.05
+        runner.submit('a', {'uuid': 'a'}, ['emulator'])
+        runner.submit('b', {'uuid': 'b'}, ['emulator'])
+        runner.submit('c', {'uuid': 'c'}, ['io'])
+
+        release.set()
+        self.assertTrue(done.wait(5))
+        for _ in range(100):
+            if self.queue.get_state('b') == 'done':
+                break
+            sleep(0.05)
+
+        self.assertEqual(sorted(started), ['a', 'b', 'c'])
+        self.assertLess(started.index('a'), started.index('b'))
+        self.assertEqual(self.queue.get_state('b'), 'done')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import inspect
+import tempfile
+import unittest
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from models.screenshot import LayoutHash
+from models.layout_hash_cache import LayoutHashCache
+
+
+class Test_LayoutHash(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.directory.name, 'states'))
+        self.layout_path = os.path.join(self.directory.name, 'states', 'state.json')
+        views = [
+            {'class': 'android.widget.Button', 'resource_id': 'ok', 'text': 'OK', 'enabled': True, 'visible': True},
+            {'class': 'android.widget.TextView', 'resource_id': None, 'text': 'x' * 60, 'visible': True},
+            {'class': 'android.view.View', 'resource_id': 'android:id/statusBarBackground', 'visible': True},
+        ]
+        with open(self.layout_path, 'w') as f:
+            json.dump({'views': views}, f)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_status_bar_only_changes_state_id(self):
+        ids = LayoutHash.get_ids(self.layout_path, 'MainActivity')
+        layout_hash = LayoutHash(self.layout_path, 'MainActivity')
+
+        self.assertEqual(ids['screenshot_id'], layout_hash._hash({
+            '[class]android.widget.Button[resource_id]ok[text]OK[enabled,,]',
+            '[class]android.widget.TextView[resource_id]None[text]None[,,]',
+        }))
+        self.assertNotEqual(ids['screenshot_id'], ids['state_id'])
+
+    def test_ids_are_cached_by_content_and_activity(self):
+        ids = LayoutHash.get_ids(self.layout_path, 'MainActivity')
+        cache = LayoutHashCache.for_layout(self.layout_path)
+
+        with open(self.layout_path, 'rb') as f:
+            content = f.read()
+
+        self.assertEqual(cache.get(LayoutHashCache.get_key(content, 'MainActivity')), ids)
+        self.assertIsNone(cache.get(LayoutHashCache.get_key(content, 'OtherActivity')))
+        self.assertNotEqual(LayoutHash.get_ids(self.layout_path, 'OtherActivity'), ids)
+
+        # the watched layout directory only holds layouts
+        self.assertEqual(os.path.dirname(cache.path), self.directory.name)
+        self.assertEqual(os.listdir(os.path.dirname(self.layout_path)), ['state.json'])
+
+
+if __name__ == "__main__":
+    unittest.main()
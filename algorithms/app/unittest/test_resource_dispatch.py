@@ -0,0 +1,90 @@
+import os
+import sys
+import inspect
+import unittest
+from threading import Event
+from time import sleep
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from resources.resource import *
+
+
+class Test_Resource_Dispatch(unittest.TestCase):
+    def setUp(self):
+        self.release = Event()
+
+    def tearDown(self):
+        self.release.set()
+
+    def _slow_subscriber(self, resource):
+        self.release.wait(5)
+
+    def test_publisher_does_not_wait_for_subscribers(self):
+        group = ResourceGroup(ResourceType.SCREENSHOT, usage=ResourceUsage.ASYNCHRONOUS)
+        received = []
+        group.subscribe(self._slow_subscriber)
+        group.subscribe(lambda rw: received.append(rw.get_path()))
+
+        for i in range(10):
+            group.publish(ResourceWrapper(f'screen_{i}.jpg', 'Droidbot'), i == 9)
+
+        self.assertTrue(group.is_active())      # slow subscriber still has resources queued
+        self.assertFalse(group.flush(0.1))
+
+        self.release.set()
+        self.assertTrue(group.join(5))
+        self.assertEqual(received, [f'screen_{i}.jpg' for i in range(10)])
+        self.assertFalse(group.is_active())
+        self.assertEqual(set(group.get_queue_depths().values()), {0})
+
+    def test_subscriber_sees_group_as_published(self):
+        group = ResourceGroup(ResourceType.UTG, usage=ResourceUsage.ASYNCHRONOUS)
+        active = []
+        group.subscribe(lambda rw: (sleep(0.01), active.append(group.is_active())))
+
+        for i in range(3):
+            group.publish(ResourceWrapper(f'utg_{i}', 'Droidbot'), i == 2)
+
+        self.assertTrue(group.join(5))
+        self.assertEqual(active, [True, True, False])
+
+    def test_drop_oldest_when_queue_is_full(self):
+        group = ResourceGroup(ResourceType.SCREENSHOT, usage=ResourceUsage.ASYNCHRONOUS, max_queue_size=2, policy='drop_oldest')
+        received = []
+        started = Event()
+        group.subscribe(lambda rw: (started.set(), self.release.wait(5), received.append(rw.get_path())))
+
+        group.publish(ResourceWrapper('screen_0.jpg', 'Droidbot'), False)
+        started.wait(5)     # screen_0 is being handled, the others are queued
+        for i in range(1, 5):
+            group.publish(ResourceWrapper(f'screen_{i}.jpg', 'Droidbot'), i == 4)
+
+        self.assertEqual(list(group.get_queue_depths().values()), [2])
+
+        self.release.set()
+        self.assertTrue(group.flush(5))
+        self.assertEqual(received, ['screen_0.jpg', 'screen_3.jpg', 'screen_4.jpg'])
+
+    def test_subscribers_publishing_to_full_groups_do_not_block_the_pool(self):
+        target = ResourceGroup(ResourceType.SCREENSHOT, usage=ResourceUsage.ASYNCHRONOUS, max_queue_size=1, policy='block')
+        received = []
+        target.subscribe(lambda rw: received.append(rw.get_path()))
+
+        source = ResourceGroup(ResourceType.UTG, usage=ResourceUsage.ASYNCHRONOUS, max_queue_size=50, policy='block')
+        for _ in range(int(os.environ.get('RESOURCE_DISPATCH_WORKERS', 8)) * 2):
+            # every subscriber fills the target queue, a blocking put would hold its pool worker
+            source.subscribe(lambda rw: [target.publish(ResourceWrapper(f'{rw.get_path()}_{i}.jpg', 'Droidbot'), False) for i in range(5)])
+
+        for i in range(3):
+            source.publish(ResourceWrapper(f'utg_{i}', 'Droidbot'), i == 2)
+
+        self.assertTrue(source.join(5))
+        self.assertTrue(target.flush(5))
+        self.assertEqual(len(received), 3 * len(source.get_queue_depths()) * 5)     # nothing is dropped under block
+
+
+if __name__ == "__main__":
+    unittest.main()
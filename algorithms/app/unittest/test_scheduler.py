@@ -0,0 +1,77 @@
+import os
+import sys
+import inspect
+import tempfile
+import unittest
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from resources.resource_types import ResourceType
+from tasks.scheduler import TaskPlanner, TaskDurations
+
+
+def _task(name, inputs, outputs):
+    return type(name, (), {
+        'get_input_types': classmethod(lambda cls: inputs),
+        'get_output_types': classmethod(lambda cls: outputs),
+    })
+
+
+TASKS = {
+    'Droidbot': _task('Droidbot', [ResourceType.APK_FILE], [ResourceType.UTG, ResourceType.SCREENSHOT]),
+    'Xbot': _task('Xbot', [ResourceType.APK_FILE], [ResourceType.SCREENSHOT, ResourceType.ACCESSIBILITY_ISSUE]),
+    'Owleye': _task('Owleye', [ResourceType.SCREENSHOT], [ResourceType.DISPLAY_ISSUE]),
+    'Tappable': _task('Tappability', [ResourceType.SCREENSHOT], [ResourceType.TAPPABILITY_PREDICTION]),
+    'Gifdroid': _task('Gifdroid', [ResourceType.UTG, ResourceType.GIF], [ResourceType.EXECUTION_TRACE]),
+}
+
+
+class Test_TaskPlanner(unittest.TestCase):
+    def setUp(self):
+        self.durations = TaskDurations()
+        for name, seconds in [('Droidbot', 3000), ('Xbot', 1000), ('Owleye', 500), ('Tappability', 200), ('Gifdroid', 100)]:
+            self.durations.record(name, seconds)
+        self.planner = TaskPlanner(TASKS, self.durations)
+
+    def test_only_needed_producers_are_planned(self):
+        # droidbot produces the screenshots by default, even though xbot is faster
+        self.assertEqual(self.planner.plan(['owleye']).order, ['Droidbot', 'Owleye'])
+        self.durations.record('Droidbot', 0)
+        self.assertEqual(self.planner.plan(['owleye']).order, ['Droidbot', 'Owleye'])
+
+        # requested producers are used, and a producer needed anyway also produces the other inputs
+        self.assertEqual(sorted(self.planner.plan(['Owleye', 'Droidbot']).order), ['Droidbot', 'Owleye'])
+        self.assertEqual(sorted(self.planner.plan(['Gifdroid', 'Tappability']).order), ['Droidbot', 'Gifdroid', 'Tappable'])
+
+        # provided resources need no producer
+        self.assertEqual(self.planner.plan(['Owleye'], [ResourceType.SCREENSHOT]).order, ['Owleye'])
+
+    def test_first_registered_producer_without_default(self):
+        tasks = dict(TASKS, Sketch=_task('Sketch', [], [ResourceType.GIF]), Recorder=_task('Recorder', [], [ResourceType.GIF]))
+        self.assertEqual(TaskPlanner(tasks, self.durations).plan(['Gifdroid']).order, ['Droidbot', 'Sketch', 'Gifdroid'])
+
+    def test_critical_path_is_launched_first(self):
+        plan = self.planner.plan(['Tappable', 'Xbot', 'Owleye', 'Droidbot'])
+
+        self.assertEqual(plan.order, ['Droidbot', 'Xbot', 'Owleye', 'Tappable'])
+        self.assertEqual(plan.critical_path, ['Droidbot', 'Owleye'])
+        self.assertEqual(plan.expected_duration, 3500)
+        self.assertEqual(plan.dependencies['Owleye'], {'Droidbot', 'Xbot'})
+
+    def test_durations_are_averaged_and_saved(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'durations.json')
+            durations = TaskDurations(path, save_delay=60)
+            durations.record('Owleye', 100)
+            durations.record('Owleye', 200)
+            self.assertFalse(os.path.exists(path))     # saved once by the timer, not by each record
+            durations.flush()
+
+            self.assertAlmostEqual(TaskDurations(path).get('Owleye'), 130)
+            self.assertEqual(TaskDurations(path).get('Xbot'), TaskDurations._default_duration)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import inspect
+import unittest
+from threading import Thread
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from tasks.concurrency.status_shipper import StatusShipper
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        RecordingHandler.received.append((self.path, json.loads(body)))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class Test_StatusShipper(unittest.TestCase):
+    def setUp(self):
+        RecordingHandler.received = []
+        self.server = HTTPServer(('localhost', 0), RecordingHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://localhost:{self.server.server_port}/status/update/'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_logs_are_coalesced_around_status_changes(self):
+        shipper = StatusShipper(self.url)
+        shipper.update_status("job", "droidbot", "RUNNING", "Droidbot is running.")
+        for i in range(100):
+            shipper.log("job", "droidbot", f'state_{i}.json')
+        shipper.log("job", "gifdroid", "gif")
+        shipper.update_status("job", None, "SUCCESSFUL")
+
+        self.assertTrue(shipper.flush())
+
+        self.assertEqual(len(RecordingHandler.received), 1)
+        path, body = RecordingHandler.received[0]
+        self.assertEqual(path, '/status/update/batch')
+
+        events = body["events"]
+        self.assertEqual([(event["algorithm"], event.get("status")) for event in events], [("droidbot", "RUNNING"), ("droidbot", None), ("gifdroid", None), (None, "SUCCESSFUL")])
+        self.assertEqual(events[0]["logs"], ["Droidbot is running."])
+        self.assertEqual(len(events[1]["logs"]), 100)
+        self.assertNotIn("logs", events[3])
+
+    def test_drop_policies_never_drop_status(self):
+        for policy in ['drop_newest', 'drop_oldest']:
+            shipper = StatusShipper(self.url, max_queue_size=1, policy=policy)
+            shipper._flush_interval = 1
+            shipper.log("job", "xbot", "first")
+            shipper.log("job", "xbot", "second")
+            self.assertTrue(shipper.update_status("job", "xbot", "RUNNING", "third"))
+            self.assertEqual(shipper.get_dropped(), 1)
+            self.assertTrue(shipper.flush())
+
+
+if __name__ == "__main__":
+    unittest.main()
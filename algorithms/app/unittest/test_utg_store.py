@@ -0,0 +1,72 @@
+import os
+import sys
+import inspect
+import tempfile
+import unittest
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from models.screenshot import Screenshot
+from models.utg_store import UtgStore
+
+
+class Test_UtgStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_dir = self.directory.name
+        self.store = UtgStore(self.output_dir)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _node(self, i):
+        return {'id': f'n{i}', 'image': os.path.join(self.output_dir, f'screen_{i}.jpg')}
+
+    def _edge(self, i, j):
+        return {'id': f'n{i}-->n{j}', 'from': f'n{i}', 'to': f'n{j}', 'events': [{'view_images': [os.path.join(self.output_dir, 'view.jpg')]}]}
+
+    def _screenshot(self, i):
+        return Screenshot(f'activity{i}', os.path.join(self.output_dir, f'screen_{i}.jpg'))
+
+    def test_only_new_nodes_and_edges_are_merged(self):
+        self.store.add_screenshot(self._screenshot(0))
+        self.store.add_screenshot(self._screenshot(1))
+
+        delta = self.store.update({'nodes': [self._node(0), self._node(1)], 'edges': [self._edge(0, 1)], 'num_nodes': 2})
+        self.assertEqual([node['id'] for node in delta['nodes']], ['n0', 'n1'])
+        self.assertEqual(delta['nodes'][0]['image'], 'screen_0.jpg')
+        self.assertEqual(delta['edges'][0]['events'][0]['view_images'], ['view.jpg'])
+
+        delta = self.store.update({'nodes': [self._node(0), self._node(1)], 'edges': [self._edge(0, 1)], 'num_nodes': 2})
+        self.assertFalse(UtgStore.has_changes(delta))
+
+    def test_nodes_wait_for_their_screenshot(self):
+        self.store.add_screenshot(self._screenshot(0))
+
+        delta = self.store.update({'nodes': [self._node(0), self._node(1)], 'edges': [self._edge(0, 1)]})
+        self.assertEqual([node['id'] for node in delta['nodes']], ['n0'])
+        self.assertEqual(delta['edges'], [])
+
+        delta = self.store.add_screenshot(self._screenshot(1))
+        self.assertEqual([node['id'] for node in delta['nodes']], ['n1'])
+        self.assertEqual([edge['id'] for edge in delta['edges']], ['n0-->n1'])
+        self.assertEqual(delta['nodes'][0]['activity_name'], 'activity1')
+
+    def test_log_and_compaction_restore_the_utg(self):
+        self.store._compact_every = 2
+        for i in range(5):
+            self.store.add_screenshot(self._screenshot(i))
+            self.store.update({'nodes': [self._node(i)], 'edges': [self._edge(i - 1, i)] if i else []})
+
+        self.assertEqual(UtgStore.load(self.output_dir), self.store.utg)
+
+        self.store.compact()
+        with open(os.path.join(self.output_dir, 'utg.js.log')) as f:
+            self.assertEqual(f.read(), '')
+        self.assertEqual(UtgStore.load(self.output_dir), self.store.utg)
+
+
+if __name__ == "__main__":
+    unittest.main()
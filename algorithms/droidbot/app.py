@@ -34,12 +34,13 @@ def send_uid_and_signal_run() -> t.Tuple[t.Dict, int]:
 
     apk_path = request.get_json()["apk_path"]
     output_dir = request.get_json()["output_dir"]
+    emulator = request.get_json().get("emulator")
     # uuid = request.get_json()["uuid"]
 
     # Execute droidbot ############################################################
     print(f"Droidbot container: Recieved request for {apk_path}. output_dir: {output_dir}")
     for attempt in range(3):
-        _service_execute_droidbot(apk_path=apk_path, output_dir=output_dir)
+        _service_execute_droidbot(apk_path=apk_path, output_dir=output_dir, emulator=emulator)
 
         # attempt to run droidbot 3 times
         if os.path.exists(os.path.join(output_dir, 'states')) and \
@@ -4,18 +4,21 @@ from time import sleep
 
 EMULATOR = os.environ.get( "EMULATOR" )
 
-def _service_execute_droidbot(apk_path: str, output_dir: str):
+def _service_execute_droidbot(apk_path: str, output_dir: str, emulator: str = None):
     """
     This function execute droidbot algorithm responsible for getting the utg.js file.
 
     Parameters:
-        uuid - The unique id for the current task.
+        apk_path - The apk to explore.
+        output_dir - The droidbot output directory.
+        emulator - The emulator leased for the job, defaults to the EMULATOR environment variable.
     """
+    emulator = emulator or EMULATOR
 
     ############################################################################
     #                      Run program with downloaded apk                     #
     ############################################################################
-    subprocess.run(['adb', 'connect', EMULATOR])
+    subprocess.run(['adb', 'connect', emulator])
     # subprocess.run(['adb', 'disconnect', EMULATOR])
     # sleep(2)
     # subprocess.run(['adb', 'kill-server'])
@@ -31,6 +34,7 @@ def _service_execute_droidbot(apk_path: str, output_dir: str):
                     "-count", config[ "NUM_OF_EVENT" ], 
                     "-a", apk_path, 
                     "-o", output_dir,
+                    "-d", emulator,
                     # "-grant_perm",
                     "-is_emulator",
                     "-accessibility_auto",
@@ -7,10 +7,15 @@ ImageFile.LOAD_TRUNCATED_IMAGES = True
 from network import Net
 import torch.nn as nn
 import getdata
+import json
 import os
 import sys
 
-model_dir = '/home/OwlEye-main/model/model.pth'
+model_dir = os.environ.get('OWLEYE_MODEL', '/home/OwlEye-main/model/model.pth')
+batch_size = int(os.environ.get('OWLEYE_GRADCAM_BATCH', 8))     # images per forward/backward pass
+triage = os.environ.get('OWLEYE_TRIAGE', 'false').lower() in ['1', 'true']      # only localize images classified as buggy
+threshold = float(os.environ.get('OWLEYE_THRESHOLD', 0.5))      # min bug score for an image to be localized
+BUG_CLASS = 0       # label of the buggy screenshots in getdata.Dataset
 
 class FeatureExtractor():
 
@@ -60,6 +65,11 @@ def preprocess_image(image_file):
     input = Variable(imgs_data, requires_grad = True)
     return input
 
+def preprocess_images(image_files):
+    """Decode each image once into a B x 3 x 768 x 448 batch, also used as the background of the heatmaps"""
+    imgs_data = [getdata.dataTransform(Image.open(image_file).convert('RGB')) for image_file in image_files]
+    return torch.stack(imgs_data).requires_grad_(True)
+
 def localization_result(img, mask, image_num, output_dir):
     heatmap = cv2.applyColorMap(np.uint8(255 * mask), cv2.COLORMAP_JET)
     heatmap = np.float32(heatmap) / 255
@@ -67,6 +77,21 @@ def localization_result(img, mask, image_num, output_dir):
     cam = cam / np.max(cam)
     cv2.imwrite(os.path.join(output_dir, "{0}.jpg".format(image_num)), np.uint8(255 * cam))
 
+def localization_results(imgs, masks, image_nums, output_dir):
+    """Blend a batch of B x H x W masks over B x H x W x 3 BGR images and write the heatmaps"""
+    (b, h, w) = masks.shape
+    # one colormap call for the whole batch, stacked vertically
+    heatmaps = cv2.applyColorMap(np.uint8(255 * masks).reshape(b * h, w), cv2.COLORMAP_JET).reshape(b, h, w, 3)
+    cams = np.float32(heatmaps) / 255 + imgs
+    cams = cams / np.max(cams, axis=(1, 2, 3), keepdims=True)
+    cams = np.uint8(255 * cams)
+
+    paths = []
+    for cam, image_num in zip(cams, image_nums):
+        paths.append(os.path.join(output_dir, "{0}.jpg".format(image_num)))
+        cv2.imwrite(paths[-1], cam)
+    return paths
+
 class GradCam:
     def __init__(self, model, target_layer_names):
         self.model = model
@@ -78,36 +103,103 @@ class GradCam:
     def forward(self, input):
         return self.model(input)
 
-    def __call__(self, input, index=None):
-        features, output = self.extractor(input.cpu())
-
-        if index == None:
-            index = np.argmax(output.cpu().data.numpy())
-
-        one_hot = np.zeros((1, output.size()[-1]), dtype=np.float32)
-        one_hot[0][index] = 1
-        one_hot = torch.from_numpy(one_hot).requires_grad_(True)
-        one_hot = torch.sum(one_hot.cpu() * output)
+    def __call__(self, input, index=None, return_scores=False):
+        """
+        Grad-CAM of a batch, one forward and one backward pass for all images.
 
-        self.model.zero_grad()
-        one_hot.backward(retain_graph=True)
-
-        grads_val = self.extractor.get_gradients()[-1].cpu().data.numpy()
+        Returns: B x 768 x 448 masks in [0, 1], or a single mask for a single image when index is an int. With
+        return_scores also the probability of each image having a display issue, from the same forward pass
+        """
+        features, output = self.extractor(input.cpu())
 
-        target = features[-1]
-        target = target.cpu().data.numpy()[0, :]
+        scores = None
+        if return_scores:
+            # only the classifier runs on the features of the Grad-CAM forward, not the whole network again
+            with torch.no_grad():
+                logits = self.model.module.classifier(output)
+            scores = torch.softmax(logits, dim=1)[:, BUG_CLASS].numpy()
 
-        weights = np.mean(grads_val, axis=(2, 3))[0, :]
-        cam = np.zeros(target.shape[1:], dtype=np.float32)
+        single = index is not None and np.isscalar(index)
+        if index is None:
+            index = output.argmax(dim=1)
+        index = torch.as_tensor(index, dtype=torch.long).reshape(-1).expand(output.size(0))
 
-        for i, w in enumerate(weights):
-            cam += w * target[i, :, :]
+        # images are independent in eval mode so the sum of their scores gives each image its own gradients
+        score = output.gather(1, index.unsqueeze(1)).sum()
 
-        cam = np.maximum(cam, 0)
-        cam = cv2.resize(cam, (448, 768))
-        cam = cam - np.min(cam)
-        cam = cam / np.max(cam)
-        return cam
+        self.model.zero_grad()
+        score.backward(retain_graph=True)
+
+        grads_val = self.extractor.get_gradients()[-1].detach()
+        target = features[-1].detach()
+
+        weights = grads_val.mean(dim=(2, 3))
+        cam = torch.einsum('bc,bchw->bhw', weights, target).clamp(min=0)
+
+        cam = torch.nn.functional.interpolate(cam.unsqueeze(1), size=(768, 448), mode='bilinear', align_corners=False).squeeze(1)
+        cam = cam - cam.amin(dim=(1, 2), keepdim=True)
+        cam = cam / cam.amax(dim=(1, 2), keepdim=True).clamp(min=1e-12)
+        cam = cam.numpy()
+        if single:
+            cam = cam[0]
+            scores = None if scores is None else scores[0]
+        return (cam, scores) if return_scores else cam
+
+def load_model(path=model_dir):
+    """Load the trained network once, it can then localize any number of images"""
+    model = Net()
+    model.cpu()
+    model = nn.DataParallel(model)
+    model.load_state_dict(torch.load(path, map_location=torch.device('cpu')))
+    return GradCam(model=model, target_layer_names=["40"])
+
+def classify(grad_cam, input):
+    """Forward pass without gradients, returns the probability of each image having a display issue"""
+    with torch.no_grad():
+        output = grad_cam.forward(input.detach())
+    return torch.softmax(output, dim=1)[:, BUG_CLASS].numpy()
+
+def localize_batch(grad_cam, image_paths, output_dir, triage=triage, threshold=threshold):
+    """
+    Classify a batch of images and write the heatmaps of the images to output_dir, with triage only the images
+    scoring at least threshold are localized. The score of each image is written to <image>.json. Without triage
+    the scores come from the Grad-CAM forward pass, there is no separate classification pass.
+
+    Returns: for each image a dict of the image path, the heatmap path or None and the score
+    """
+    input = preprocess_images(image_paths)
+    image_nums = [os.path.splitext(os.path.basename(image_path))[0] for image_path in image_paths]
+    if triage:
+        scores = classify(grad_cam, input)
+        keep = [i for i, score in enumerate(scores) if score >= threshold]
+    else:
+        scores = []     # set by the Grad-CAM forward pass
+        keep = list(range(len(image_paths)))
+
+    heatmaps = [None] * len(image_paths)
+    if keep:
+        if triage:
+            input = input.detach()[keep].requires_grad_(True)
+            masks = grad_cam(input)
+        else:
+            masks, scores = grad_cam(input, return_scores=True)
+
+        # background is the decoded input as BGR, images are not decoded again
+        imgs = input.detach().permute(0, 2, 3, 1).numpy()[..., ::-1]
+        paths = localization_results(imgs, masks, [image_nums[i] for i in keep], output_dir)
+        for i, path in zip(keep, paths):
+            heatmaps[i] = path
+
+    results = []
+    for image_path, image_num, heatmap, score in zip(image_paths, image_nums, heatmaps, scores):
+        with open(os.path.join(output_dir, "{0}.json".format(image_num)), 'w') as f:
+            json.dump({"score": float(score), "localized": heatmap is not None}, f)
+        results.append({"image": image_path, "heatmap": heatmap, "score": float(score)})
+    return results
+
+def localize(grad_cam, image_path, output_dir, triage=triage, threshold=threshold):
+    """Classify and localize one image, returns the heatmap path or None if triage skipped it"""
+    return localize_batch(grad_cam, [image_path], output_dir, triage, threshold)[0]["heatmap"]
 
 if __name__ == '__main__':
     
@@ -119,22 +211,7 @@ if __name__ == '__main__':
     if len(files) == 0:
         raise Exception("Images Directory Empty")
 
-    for file in files:
-        print(file)
-        (filename, extension) = os.path.splitext(file)
-        image_num = filename
-        image_path = os.path.join(image_dir, file)
-
-        model = Net()
-        model.cpu()
-        model = nn.DataParallel(model)
-        model.load_state_dict(torch.load(model_dir, map_location=torch.device('cpu')))
-
-        grad_cam = GradCam(model=model, target_layer_names=["40"])
-        img = cv2.imread(image_path, 1)
-        img = np.float32(cv2.resize(img, (448, 768))) /255
-
-        input = preprocess_image(image_path)
-        target_index = None
-        mask = grad_cam(input, target_index)
-        localization_result(img, mask, image_num, output_dir)
+    grad_cam = load_model()
+    for i in range(0, len(files), batch_size):
+        print(files[i:i + batch_size])
+        localize_batch(grad_cam, [os.path.join(image_dir, file) for file in files[i:i + batch_size]], output_dir)
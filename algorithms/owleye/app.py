@@ -2,34 +2,170 @@
 api to run algorithm from HTTP
 '''
 from flask import Flask, request, jsonify
+from queue import Queue
 import typing as t
-import subprocess
+import traceback
+import hashlib
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'OwlEye-main'))
+# inference_cache.py is copied in by the docker build, it is found in the analysis app when run from the repo
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'models'))
+import localization
+from inference_cache import InferenceCache
 
 
 app = Flask(__name__)
 
+# Models loaded once at startup, each request borrows one so requests run in parallel on different models
+WORKERS = int(os.environ.get('OWLEYE_WORKERS', 1))
+models: Queue = Queue()
+
+# Results of every job by image content and model, None if caching is unavailable
+cache: InferenceCache = None
+model_version: str = None       # digest of the model file
+
+
+def load_models() -> None:
+    global cache, model_version
+    with open(localization.model_dir, 'rb') as f:
+        model_version = hashlib.sha256(f.read()).hexdigest()
+    cache = InferenceCache.instance(os.environ.get('OWLEYE_CACHE', '/home/data/.owleye_cache'))
+
+    for _ in range(WORKERS):
+        models.put(localization.load_model())
+    print(f'Loaded {WORKERS} Owleye models')
+
+
+def get_cache_key(image_path: str, triage: bool, threshold: float) -> t.Optional[str]:
+    if cache is None:
+        return None
+    try:
+        return InferenceCache.get_key('Owleye', model_version, triage, threshold if triage else None, InferenceCache.pixel_digest(image_path))
+    except OSError as e:
+        print(f'Can not cache {image_path}: {e}')
+        return None
+
+
+def get_output_files(image_path: str, output_dir: str) -> t.Dict[str, str]:
+    """Names in the cache of the heatmap and score files of an image"""
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    return {'heatmap.jpg': os.path.join(output_dir, name + '.jpg'), 'score.json': os.path.join(output_dir, name + '.json')}
+
+
+def restore_cached(image_path: str, output_dir: str, key: str) -> t.Optional[t.Dict]:
+    """Copy the cached results of an image to output_dir, returns the result or None if it is not cached"""
+    files = get_output_files(image_path, output_dir)
+    restored = cache.restore(key, files) if key else None
+    if restored is None or 'score.json' not in restored:
+        return None
+
+    with open(files['score.json']) as f:
+        score = json.load(f)['score']
+    return {"image": image_path, "heatmap": files['heatmap.jpg'] if 'heatmap.jpg' in restored else None, "score": score}
+
+
+def cache_results(results: t.List[t.Dict], output_dir: str, keys: t.Dict[str, str]) -> None:
+    for result in results:
+        if keys.get(result["image"]) is None:
+            continue
+        files = get_output_files(result["image"], output_dir)
+        if result["heatmap"] is None:
+            del files['heatmap.jpg']
+        cache.put(keys[result["image"]], files)
+
+
+def predict(image_paths: t.List[str], output_dir: str, triage: bool = None, threshold: float = None) -> t.Tuple[t.List[t.Dict], t.List[str]]:
+    """
+    Classify the images and localize their display issues with a warm model.
+
+    Returns: for each image its heatmap path (None if triage skipped it) and score, and paths of the images which failed
+    """
+    triage = localization.triage if triage is None else triage
+    threshold = localization.threshold if threshold is None else threshold
+
+    os.makedirs(output_dir, exist_ok=True)
+    results, failed, uncached = [], [], []
+
+    # images seen before, by any job, are not run through the model again
+    keys = {image_path: get_cache_key(image_path, triage, threshold) for image_path in image_paths}
+    for image_path in image_paths:
+        result = restore_cached(image_path, output_dir, keys[image_path])
+        if result is None:
+            uncached.append(image_path)
+        else:
+            results.append(result)
+    if not uncached:
+        return results, failed
+
+    grad_cam = models.get()
+    try:
+        for i in range(0, len(uncached), localization.batch_size):
+            batch = uncached[i:i + localization.batch_size]
+            try:
+                batch_results = localization.localize_batch(grad_cam, batch, output_dir, triage, threshold)
+                cache_results(batch_results, output_dir, keys)
+                results += batch_results
+                continue
+            except Exception:
+                print(f'Owleye failed for batch {batch}, retrying images one at a time')
+
+            for image_path in batch:
+                try:
+                    batch_results = localization.localize_batch(grad_cam, [image_path], output_dir, triage, threshold)
+                    cache_results(batch_results, output_dir, keys)
+                    results += batch_results
+                except Exception:
+                    print(f'Owleye failed for {image_path}:\n{traceback.format_exc()}')
+                    failed.append(image_path)
+    finally:
+        models.put(grad_cam)
+    return results, failed
+
+
 # home route
 @app.route('/')
 def home():
     return "Owleye app is live."
 
+@app.route("/model")
+def model() -> t.Tuple[t.Dict, int]:
+    """Digest of the model file, clients caching results key them by it"""
+    return {"model_version": model_version}, 200
+
 @app.route("/execute", methods=["POST"])
 def execute() -> t.Tuple[t.Dict, int]:
     if request.method == "POST":
         image_dir = request.get_json()["image_dir"]
         output_dir = request.get_json()["output_dir"]
+        triage = request.get_json().get("triage")
+        threshold = request.get_json().get("threshold")
 
         print(f'{image_dir}, {output_dir}')
 
-        # print(f'{ image_dir }, { output_dir }')
+        files = sorted(os.listdir(image_dir))
+        if len(files) == 0:
+            return {"result": "FAILED", "error": "Images Directory Empty"}, 400
 
-        # print('STARTING OWLEYE %s %s' % (image_dir, output_dir))
-
-        subprocess.run(["python3", "/home/OwlEye-main/localization.py", image_dir, output_dir])
+        predict([os.path.join(image_dir, file) for file in files], output_dir, triage, threshold)
 
         return {"result": "SUCCESS"}, 200
 
     return {"result": "FAILED"}, 400
 
+@app.route("/predict", methods=["POST"])
+def predict_images() -> t.Tuple[t.Dict, int]:
+    """Localize a batch of images given as {"images": [paths], "output_dir": path, "triage": bool, "threshold": float}"""
+    data = request.get_json()
+    if not data or "images" not in data or "output_dir" not in data:
+        return {"result": "FAILED", "error": "images and output_dir are required"}, 400
+
+    results, failed = predict(data["images"], data["output_dir"], data.get("triage"), data.get("threshold"))
+    return jsonify({"result": "SUCCESS", "results": results, "failed": failed}), 200
+
 if __name__=='__main__':
-    app.run(debug=True, host="0.0.0.0", port=3004)
+    load_models()
+    # the reloader would load the models again in a second process
+    app.run(debug=True, use_reloader=False, threaded=True, host="0.0.0.0", port=3004)
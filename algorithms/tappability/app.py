@@ -2,16 +2,141 @@
 api to run algorithm from HTTP
 '''
 from flask import Flask, request, jsonify
-import subprocess
+from concurrent.futures import Future, wait
+from threading import Thread
+from queue import PriorityQueue
+from itertools import count
+import traceback
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline'))
+# inference_cache.py is copied in by the docker build, it is found in the analysis app when run from the repo
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'models'))
+import pipeline
+import lazy_heatmap
+from inference_cache import InferenceCache
+import saliency.core as saliency
 
 
 app = Flask(__name__)
 
+# Heatmaps are created after the predictions are returned, in the background or when they are requested
+DEFER_HEATMAPS = os.environ.get('TAPPABILITY_DEFER_HEATMAPS', 'false').lower() in ['1', 'true']
+BACKGROUND_HEATMAPS = os.environ.get('TAPPABILITY_BACKGROUND_HEATMAPS', 'true').lower() in ['1', 'true']
+
+# Work is taken by priority, screenshots first then requested heatmaps then background heatmaps
+PREDICTION, REQUESTED_HEATMAP, BACKGROUND_HEATMAP = 0, 1, 2
+
+
+class InferenceServer:
+    """
+    Keeps the tappability model and XRAI object of each worker thread loaded for the lifetime of the process.
+    Requests queue their (image, layout) pairs and deferred heatmaps and the workers run the pipeline on them.
+    """
+
+    def __init__(self, workers):
+        self._queue = PriorityQueue()
+        self._order = count()       # first in first out within a priority
+
+        # results of every job by screenshot and layout content and model, None if caching is unavailable
+        self.cache = InferenceCache.instance(os.environ.get('TAPPABILITY_CACHE', '/home/data/.tappability_cache'))
+        with open(pipeline.MODEL_PATH, 'rb') as f:
+            self.model_version = hashlib.sha256(f.read()).hexdigest()
+
+        for _ in range(workers):
+            # load before serving so a missing model fails at startup
+            Thread(target=self._work, args=(pipeline.load_model(), saliency.XRAI()), daemon=True).start()
+        print(f'Loaded {workers} tappability models')
+
+    def submit(self, img_path, json_path, output_dir, threshold, defer_heatmaps=False):
+        """Queue a screenshot, the result is written to output_dir/<image name>"""
+        return self._put(PREDICTION, self._predict, img_path, json_path, output_dir, threshold, defer_heatmaps)
+
+    def submit_heatmap(self, output_path, element_id, priority=REQUESTED_HEATMAP):
+        """Queue the deferred heatmap of an element, output_path is the result directory of its screenshot"""
+        return self._put(priority, self._create_heatmap, output_path, element_id)
+
+    def _put(self, priority, function, *args):
+        future = Future()
+        self._queue.put((priority, next(self._order), future, function, args))
+        return future
+
+    def _get_cache_key(self, img_path, json_path, threshold, defer_heatmaps):
+        if self.cache is None:
+            return None
+        try:
+            return InferenceCache.get_key('Tappability', self.model_version, threshold, defer_heatmaps,
+                InferenceCache.pixel_digest(img_path), InferenceCache.layout_digest(json_path))
+        except OSError as e:
+            print(f'Can not cache {img_path}: {e}')
+            return None
+
+    def _restore_cached(self, key, output_path):
+        """Copy the cached results of a screenshot to output_path, returns the pending heatmaps or None if not cached"""
+        files = self.cache.get(key) if key else None
+        if files is None or self.cache.restore(key, {name: os.path.join(output_path, name) for name in files}) is None:
+            return None
+        return lazy_heatmap.relocate(output_path)
+
+    def _predict(self, img_path, json_path, output_dir, threshold, defer_heatmaps, model, xrai):
+        output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(img_path))[0])
+        os.makedirs(output_path, exist_ok=True)
+
+        # screenshots seen before, by any job, are not run through the model again
+        key = self._get_cache_key(img_path, json_path, threshold, defer_heatmaps)
+        pending = self._restore_cached(key, output_path)
+        if pending is None:
+            pending = pipeline.pipeline(img_path, json_path, output_path, threshold, model, xrai, defer_heatmaps)
+            if key is not None:
+                files = {name: os.path.join(output_path, name) for name in os.listdir(output_path)}
+                self.cache.put(key, {name: path for name, path in files.items() if os.path.isfile(path)})
+        if BACKGROUND_HEATMAPS:
+            for element_id in pending or []:
+                self.submit_heatmap(output_path, element_id, BACKGROUND_HEATMAP)
+        return output_path
+
+    def _create_heatmap(self, output_path, element_id, model, xrai):
+        # heatmaps are cached with the predictions, by model digest so heatmaps of another model are not reused
+        return lazy_heatmap.create_heatmap(output_path, element_id, model, xrai, self.cache, self.model_version)
+
+    def _work(self, model, xrai):
+        while True:
+            _, _, future, function, args = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args, model=model, xrai=xrai))
+            except Exception as e:
+                print(f'Tappability failed for {args}:\n{traceback.format_exc()}')
+                future.set_exception(e)
+
+
+server: InferenceServer = None
+
+
+def run(items, output_dir, threshold, defer_heatmaps=DEFER_HEATMAPS):
+    """
+    Run the pipeline for a list of (image, layout) pairs on the resident workers.
+
+    Returns: output directory of each pair, None for the pairs which failed
+    """
+    futures = [server.submit(img_path, json_path, output_dir, threshold, defer_heatmaps) for img_path, json_path in items]
+    wait(futures)
+    return [None if future.exception() else future.result() for future in futures]
+
+
 # home route
 @app.route('/')
 def home():
     return "Tappable app is live."
 
+# digest of the model file, clients caching results key them by it
+@app.route("/model")
+def model():
+    return jsonify({"model_version": server.model_version}), 200
+
 # run algorithm
 @app.route("/execute", methods=["POST"])
 def execute():
@@ -23,22 +148,54 @@ def execute():
         json_dir = request.get_json()["json_dir"]
         output_dir = request.get_json()["output_dir"]
         threshold = request.get_json()["threshold"]
-        
+
         print('STARTING TAPSHOE %s %s %s %s' % (image_dir, json_dir, output_dir, threshold))
-        
-        subprocess.run([
-            "python3.8", 
-            "/home/pipeline/pipeline.py", 
-            "-i", image_dir, 
-            "-j", json_dir,
-            "-o", output_dir,
-            "-t", threshold
-            ])
-        
+
+        items = []
+        for image in os.listdir(image_dir):
+            json_path = os.path.join(json_dir, os.path.splitext(image)[0] + '.json')
+            if image.endswith('.jpg') and os.path.exists(json_path):
+                items.append((os.path.join(image_dir, image), json_path))
+        run(items, output_dir, int(threshold), bool(request.get_json().get("defer_heatmaps", DEFER_HEATMAPS)))
+
         return jsonify( {"result": "SUCCESS"} ), 200
-        
+
     except Exception as e:
         return str(e)
-    
+
+# run algorithm for a list of screenshots
+@app.route("/predict", methods=["POST"])
+def predict():
+    """
+    Run a batch given as {"items": [{"image": path, "layout": path}], "output_dir": path, "threshold": int,
+    "defer_heatmaps": bool}
+    """
+    data = request.get_json()
+    if not data or "items" not in data or "output_dir" not in data:
+        return jsonify({"result": "FAILED", "error": "items and output_dir are required"}), 400
+
+    items = [(item["image"], item["layout"]) for item in data["items"]]
+    outputs = run(items, data["output_dir"], int(data.get("threshold", 50)), bool(data.get("defer_heatmaps", DEFER_HEATMAPS)))
+    return jsonify({"result": "SUCCESS", "outputs": outputs}), 200
+
+# create a deferred heatmap now
+@app.route("/heatmap", methods=["POST"])
+def heatmap():
+    """
+    Get the heatmap of an element given as {"output_dir": result directory of the screenshot, "id": element id},
+    it is created ahead of the background heatmaps if it does not exist yet
+    """
+    data = request.get_json()
+    if not data or "output_dir" not in data or "id" not in data:
+        return jsonify({"result": "FAILED", "error": "output_dir and id are required"}), 400
+
+    try:
+        path = server.submit_heatmap(data["output_dir"], data["id"]).result()
+    except (KeyError, OSError) as e:
+        return jsonify({"result": "FAILED", "error": str(e)}), 404
+    return jsonify({"result": "SUCCESS", "heatmap": path}), 200
+
 if __name__=='__main__':
-    app.run(debug=True, host="0.0.0.0", port=3007)
\ No newline at end of file
+    server = InferenceServer(int(os.environ.get('TAPPABILITY_WORKERS', 1)))
+    # the reloader would load the models again in a second process
+    app.run(debug=True, use_reloader=False, threaded=True, host="0.0.0.0", port=3007)
@@ -1,9 +1,11 @@
-import numpy as np
 import torch
 from torch.utils.data import Dataset
-from skimage import io, transform
 from torchvision import transforms
-import math
+from preprocessing import ScreenInput, apply_mask
+import os
+
+# memory for the element batches of a screenshot, each element is 4 x 960 x 540 float32
+BATCH_MEMORY = int(os.environ.get('TAPPABILITY_BATCH_MB', 256)) * 1024 * 1024
 
 # Image tranformation
 class applyMask(object):
@@ -14,22 +16,9 @@ class applyMask(object):
 
     def __call__(self, sample):
         
-        image = sample['image']
-        
-        binary_mask = np.zeros(shape=(image.shape[0], image.shape[1]))
-        x_min = math.floor((sample['x_min']/sample['width'])*image.shape[1])
-        x_max = math.floor((sample['x_max']/sample['width'])*image.shape[1])
-        y_min = math.floor((sample['y_min']/sample['height'])*image.shape[0])
-        y_max = math.floor((sample['y_max']/sample['height'])*image.shape[0])
-        
-        for y in range(y_min, y_max):
-            for x in range(x_min, x_max):
-                    binary_mask[y,x] = 1 #sets binary mask value to 1 if within tappable bounds
-
-        concat = np.dstack((image, binary_mask)) #matrix multiplication of image and binary mask
-
         bounds = [sample['x_min'], sample['y_min'], sample['x_max'], sample['y_max']]
-    
+        concat = apply_mask(sample['image'], bounds, sample['width'], sample['height'])
+
         return {'image': concat, 'bounds':bounds}
 
 
@@ -56,6 +45,25 @@ class Tappable(Dataset):
         self.transform = dataTransform
         self.dataset = bounds
         self.img_path = img_path
+        self._screen = None
+
+    def load_image(self):
+        """Decode and resize the screenshot once for all of its elements"""
+        if self._screen is None:
+            self._screen = ScreenInput(self.img_path)
+        return self._screen
+
+    def batches(self, memory=BATCH_MEMORY):
+        """
+        Yields every element of the screenshot as a N x 4 x 960 x 540 float tensor with the bounds of its
+        N elements, N is limited so a batch fits in memory
+        """
+        screen = self.load_image()
+        size = max(1, memory // (screen.channels * screen.image.shape[0] * screen.image.shape[1] * 4))
+        for start in range(0, len(self), size):
+            bounds = self.dataset[start:start + size]
+            # the buffer of the batch is reused for the next one
+            yield torch.from_numpy(screen.elements(bounds)), bounds
 
     def __len__(self):
         return len(self.dataset)
@@ -64,10 +72,8 @@ class Tappable(Dataset):
         if torch.is_tensor(idx):
             idx = idx.tolist()
         
-        image = io.imread(self.img_path)
-        width = image.shape[1]
-        height = image.shape[0]
-        image = transform.resize(image, (960, 540))
+        screen = self.load_image()
+        image, width, height = screen.image, screen.width, screen.height
 
         x_min = self.dataset[idx][0]
         y_min = self.dataset[idx][1]
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+from threading import Lock
+
+from heatmap import Heatmap
+from inference_cache import InferenceCache
+
+INPUT_IMAGE = 'input.jpg'       # copy of the screenshot kept in the output directory to create heatmaps later
+DESCRIPTION = 'description.json'
+
+# description files are updated by several workers
+description_lock = Lock()
+
+
+def save_input(img_path, output_path):
+    """Keep the screenshot next to its results, the input directory is cleared by the next request"""
+    shutil.copyfile(img_path, os.path.join(output_path, INPUT_IMAGE))
+
+
+def get_cache_key(model_version, img_path, bounds, prediction):
+    """Key of a heatmap in the inference cache, None if the screenshot can not be read"""
+    try:
+        return InferenceCache.get_key('TappabilityHeatmap', model_version, InferenceCache.pixel_digest(img_path),
+            '_'.join(str(int(b)) for b in bounds), prediction)
+    except OSError as e:
+        print('Can not cache heatmap of %s: %s' % (img_path, e))
+        return None
+
+
+def create_heatmap(output_path, element_id, model, xrai=None, cache=None, model_version=None):
+    """
+    Create the heatmap of an element whose heatmap was deferred by pipeline() and record it in description.json.
+    Heatmaps already created by the same model for the same screenshot, bounds and prediction, in any job, are
+    reused from the inference cache when one is given.
+
+    Returns: path of the heatmap
+    """
+    with description_lock:
+        with open(os.path.join(output_path, DESCRIPTION)) as f:
+            element = json.load(f)[str(element_id)]
+    if element.get('heatmap') and os.path.exists(element['heatmap']):
+        return element['heatmap']
+
+    img_path = os.path.join(output_path, INPUT_IMAGE)
+    prediction = element.get('prediction', 1)
+    heatmap_path = os.path.join(output_path, 'heatmap_' + str(element_id) + '.jpg')
+    key = get_cache_key(model_version, img_path, element['bounds'], prediction) if cache is not None else None
+
+    if key is None or not cache.restore(key, {'heatmap.jpg': heatmap_path}):
+        heatmap = Heatmap(img_path, model, output_path, xrai=xrai)
+        heatmap_path = heatmap.createHeatmap(element['bounds'], prediction, element_id)
+        if key is not None:
+            cache.put(key, {'heatmap.jpg': heatmap_path})
+
+    with description_lock:
+        with open(os.path.join(output_path, DESCRIPTION)) as f:
+            description = json.load(f)
+        description[str(element_id)].update({'heatmap': heatmap_path, 'heatmap_pending': False})
+        with open(os.path.join(output_path, DESCRIPTION), 'w') as f:
+            json.dump(description, f)
+    return heatmap_path
+
+
+def relocate(output_path):
+    """
+    Point the heatmaps of a description copied from another output directory, e.g. from a cache, to output_path.
+
+    Returns: ids of the elements whose heatmap is still pending
+    """
+    with description_lock:
+        with open(os.path.join(output_path, DESCRIPTION)) as f:
+            description = json.load(f)
+        for element in description.values():
+            if element.get('heatmap'):
+                element['heatmap'] = os.path.join(output_path, os.path.basename(element['heatmap']))
+        with open(os.path.join(output_path, DESCRIPTION), 'w') as f:
+            json.dump(description, f)
+    return [int(element_id) for element_id, element in description.items() if element.get('heatmap_pending')]
@@ -1,8 +1,8 @@
 import os
 
 from heatmap import Heatmap
+import lazy_heatmap
 from dataset import Tappable
-from torch.utils.data import DataLoader
 from model import ResNet, Block
 import torch
 from torchvision.utils import draw_bounding_boxes
@@ -13,9 +13,22 @@ import json
 import sys
 import getopt
 
-MODEL_PATH = os.path.join(os.getcwd(), "/home/pipeline/trained_models/resnet_v3.pt")
+MODEL_PATH = os.environ.get('TAPPABILITY_MODEL', os.path.join(os.getcwd(), "/home/pipeline/trained_models/resnet_v3.pt"))
 
-def pipeline(img_path, json_path, output_path, threshold):
+def load_model():
+    """Create model from saved state, a process only needs to do it once"""
+    model = ResNet(18, Block, 4, 2)
+    model.load_state_dict(torch.load(MODEL_PATH, map_location=torch.device('cpu')))
+    model.eval()
+    return model
+
+def pipeline(img_path, json_path, output_path, threshold, model=None, xrai=None, defer_heatmaps=False):
+    """
+    Rate the tappability of the clickable elements of a screenshot. With defer_heatmaps the heatmaps of the
+    elements rated not tappable are left to lazy_heatmap.create_heatmap and marked as pending.
+
+    Returns: ids of the elements whose heatmap is pending
+    """
     bounds = []
     colours = []
 
@@ -28,48 +41,47 @@ def pipeline(img_path, json_path, output_path, threshold):
             bounds_item = [int(bounds_out[0][0]), int(bounds_out[0][1]), int(bounds_out[1][0]), int(bounds_out[1][1])]
             bounds.append(bounds_item)
 
-    #Create dataset and dataloader 
+    #Create dataset
     dataset = Tappable(img_path = img_path, bounds = bounds)
-    dataloader = DataLoader(dataset, batch_size=1, shuffle=False)
 
-    #Create model from saved state
-    model = ResNet(18, Block, 4, 2)
-    model.load_state_dict(torch.load(MODEL_PATH, map_location=torch.device('cpu')))
-    model.eval()
+    if model is None:
+        model = load_model()
 
     json_out = {}
+    pending = []
     bounding_boxes_all = []
     counter = 0
     labels = ["tappable", "not tappable"]
 
     #Create heatmap
-    heatmap = Heatmap(img_path, model, output_path)
+    heatmap = Heatmap(img_path, model, output_path, xrai=xrai)
 
-    #Run model on dataset 
-    for batch_idx, item in enumerate(dataloader):
-        outputs = model(item['image'].type(torch.FloatTensor))
+    #Run model on batches of elements, the screenshot is decoded and resized once
+    for images, batch_bounds in dataset.batches():
+        with torch.no_grad():
+            outputs = model(images)
         _, indices = torch.sort(outputs, descending=True)
-        percentage = torch.nn.functional.softmax(outputs, dim=1)[0] * 100
-        _, index = torch.max(outputs, 1) 
-        print([(labels[idx], percentage[idx].item()) for idx in indices[0][:2]])
-        bounding_boxes = []
-        bounding_boxes_all.append(item['bounds'])
-        for i in range(len(item['bounds'])):
-            if isinstance(item['bounds'][i], torch.Tensor):
-                bounding_boxes.append(item['bounds'][i].cpu().item())
+        percentages = torch.nn.functional.softmax(outputs, dim=1) * 100
+        _, index = torch.max(outputs, 1)
+
+        for i, bounding_boxes in enumerate(batch_bounds):
+            percentage = percentages[i]
+            print([(labels[idx], percentage[idx].item()) for idx in indices[i][:2]])
+            bounding_boxes_all.append(bounding_boxes)
+
+            if index[i] == 1 and percentage[index[i]].item()>=threshold:
+                colours.append("red")
+                heatmap_path = None if defer_heatmaps else heatmap.createHeatmap(bounding_boxes, index[i], counter)
             else:
-                bounding_boxes.append(item['bounds'][i])
-
-        if index[0] == 1 and percentage[index[0]].item()>=threshold:
-            colours.append("red")
-            heatmap_path = heatmap.createHeatmap(item['bounds'], index[0], counter)
-        else:
-            colours.append("black")
-            heatmap_path = None
-            
-        details_out = {'bounds': bounding_boxes, 'percentage': percentage[index[0]].item(), 'heatmap': heatmap_path}
-        json_out[str(counter)] = details_out
-        counter += 1
+                colours.append("black")
+                heatmap_path = None
+
+            details_out = {'bounds': bounding_boxes, 'percentage': percentage[index[i]].item(), 'heatmap': heatmap_path}
+            if defer_heatmaps and colours[-1] == "red":
+                details_out.update({'heatmap_pending': True, 'prediction': index[i].item()})
+                pending.append(counter)
+            json_out[str(counter)] = details_out
+            counter += 1
 
     #Store bounding boxes for those rated untappable
     if bounding_boxes_all:
@@ -83,8 +95,14 @@ def pipeline(img_path, json_path, output_path, threshold):
     with open(os.path.join(output_path, 'description.json'), 'w+') as file:
         json.dump(json_out, file)
 
+    if pending:
+        lazy_heatmap.save_input(img_path, output_path)
+    return pending
+
 
-def run_pipeline(img_dir, json_dir, output_dir, threshold):
+def run_pipeline(img_dir, json_dir, output_dir, threshold, model=None, xrai=None):
+    if model is None:
+        model = load_model()
     for image in os.listdir(img_dir):
         if image[-4:] != '.jpg':
             continue
@@ -95,7 +113,7 @@ def run_pipeline(img_dir, json_dir, output_dir, threshold):
             output_path = os.path.join(output_dir, img_name)
             if not os.path.exists(output_path):
                 os.makedirs(output_path)
-            pipeline(img_path , json_path, output_path, threshold)
+            pipeline(img_path , json_path, output_path, threshold, model, xrai)
 
 if __name__=='__main__':
     args = sys.argv[1:]
@@ -0,0 +1,85 @@
+import numpy as np
+from skimage import io, transform
+import math
+
+RESIZE_WIDTH = 540
+RESIZE_HEIGHT = 960
+
+
+def element_rect(bounds, width, height, shape):
+    """
+    Rectangle of an element in the resized image.
+
+    bounds - x_min, y_min, x_max, y_max of the element in the original image
+    width, height - size of the original image
+    shape - shape of the resized image
+
+    Returns: y_min, y_max, x_min, x_max
+    """
+    x_min = math.floor((bounds[0]/width)*shape[1])
+    x_max = math.floor((bounds[2]/width)*shape[1])
+    y_min = math.floor((bounds[1]/height)*shape[0])
+    y_max = math.floor((bounds[3]/height)*shape[0])
+    return max(y_min, 0), max(y_max, 0), max(x_min, 0), max(x_max, 0)
+
+
+def apply_mask(image, bounds, width, height, out=None):
+    """
+    Image with the binary mask of an element as an extra channel, 1 inside the element bounds.
+
+    image - H x W x C resized image
+    out - H x W x C+1 float32 buffer to fill, allocated if None
+
+    Returns: H x W x C+1 float32 array
+    """
+    if out is None:
+        out = np.empty(image.shape[:2] + (image.shape[2] + 1,), dtype=np.float32)
+    y_min, y_max, x_min, x_max = element_rect(bounds, width, height, image.shape)
+    out[..., :-1] = image
+    out[..., -1] = 0
+    out[y_min:y_max, x_min:x_max, -1] = 1
+    return out
+
+
+class ScreenInput:
+    """
+    Screenshot decoded, resized and normalised once, builds the masked inputs of its elements for the classifier
+    and for XRAI in preallocated buffers.
+    """
+
+    def __init__(self, img_path):
+        image = np.atleast_3d(io.imread(img_path))
+        self.height = image.shape[0]
+        self.width = image.shape[1]
+        # resize also scales the pixels to [0, 1]
+        self.image = transform.resize(image, (RESIZE_HEIGHT, RESIZE_WIDTH)).astype(np.float32)
+        self.channels = self.image.shape[2] + 1
+        self._element = None
+        self._batch = None
+
+    def element(self, bounds):
+        """
+        Input of one element for XRAI, valid until the next call.
+
+        Returns: H x W x C+1 float32 array
+        """
+        if self._element is None:
+            self._element = np.empty((RESIZE_HEIGHT, RESIZE_WIDTH, self.channels), dtype=np.float32)
+        return apply_mask(self.image, bounds, self.width, self.height, self._element)
+
+    def elements(self, bounds_list):
+        """
+        Classifier input of a batch of elements, valid until the next call.
+
+        Returns: N x C+1 x H x W float32 array
+        """
+        n = len(bounds_list)
+        if self._batch is None or self._batch.shape[0] < n:
+            self._batch = np.empty((n, self.channels, RESIZE_HEIGHT, RESIZE_WIDTH), dtype=np.float32)
+        batch = self._batch[:n]
+        batch[:, :-1] = self.image.transpose((2, 0, 1))
+        batch[:, -1] = 0
+        for i, bounds in enumerate(bounds_list):
+            y_min, y_max, x_min, x_max = element_rect(bounds, self.width, self.height, self.image.shape)
+            batch[i, -1, y_min:y_max, x_min:x_max] = 1
+        return batch
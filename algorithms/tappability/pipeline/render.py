@@ -0,0 +1,57 @@
+import numpy as np
+import PIL.Image
+import os
+
+# matplotlib 'Reds' colormap, colours at evenly spaced values from 0 to 1
+REDS = np.array([
+    [1.00000, 0.96078, 0.94118],
+    [0.99608, 0.87843, 0.82353],
+    [0.98824, 0.73333, 0.63137],
+    [0.98824, 0.57255, 0.44706],
+    [0.98431, 0.41569, 0.29020],
+    [0.93725, 0.23137, 0.17255],
+    [0.79608, 0.09412, 0.11373],
+    [0.64706, 0.05882, 0.08235],
+    [0.40392, 0.00000, 0.05098],
+], dtype=np.float32)
+
+# colormap as a lookup table of 256 colours
+_positions = np.linspace(0, 1, len(REDS))
+REDS_LUT = np.stack([np.interp(np.linspace(0, 1, 256), _positions, REDS[:, c]) for c in range(3)], axis=1).astype(np.float32)
+
+COLORBAR_WIDTH = 20
+PREVIEW_WIDTH = int(os.environ.get('TAPPABILITY_HEATMAP_PREVIEW', 0))   # width of the preview images, 0 for none
+
+
+def render_heatmap(base, values, path, alpha=0.6, colorbar=True, preview_width=PREVIEW_WIDTH):
+    """
+    Blend a colormapped heatmap over an image and save it, with a colour scale on the right like a colorbar.
+
+    base - H x W x C image in [0, 1], only its colour channels are used
+    values - H x W attributions, scaled to the colormap from their min to their max
+    path - file to save the jpeg to, a preview of preview_width pixels is saved next to it as <name>_preview.jpg
+
+    Returns: path of the preview or None
+    """
+    values = np.asarray(values, dtype=np.float32)
+    low, high = float(values.min()), float(values.max())
+    scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+    colours = REDS_LUT[np.uint8(scaled * 255)]
+
+    image = np.asarray(base, dtype=np.float32)[..., :3]
+    blended = (1 - alpha) * image + alpha * colours
+
+    if colorbar:
+        scale = REDS_LUT[np.linspace(255, 0, blended.shape[0]).astype(np.uint8)]
+        bar = np.broadcast_to(scale[:, None, :], (blended.shape[0], COLORBAR_WIDTH, 3))
+        blended = np.concatenate([blended, np.ones((blended.shape[0], COLORBAR_WIDTH // 2, 3), np.float32), bar], axis=1)
+
+    rendered = PIL.Image.fromarray(np.uint8(np.clip(blended, 0, 1) * 255))
+    rendered.save(path)
+
+    if not preview_width:
+        return None
+    preview_path = os.path.splitext(path)[0] + '_preview.jpg'
+    height = max(1, round(rendered.height * preview_width / rendered.width))
+    rendered.resize((preview_width, height), PIL.Image.BILINEAR).save(preview_path)
+    return preview_path
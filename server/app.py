@@ -2,6 +2,7 @@ from flask_cors import CORS
 # from tasks import celery
 from flask import Flask
 from routes import *
+from models.DBManager import DBManager
 import os
 
 print("test")
@@ -15,6 +16,11 @@ def create_app(script_info=None):
     app_settings = os.getenv("APP_SETTINGS")
     app.config.from_object(app_settings)
 
+    ###############################################################################
+    #                          Create the mongodb indexes                         #
+    ###############################################################################
+    DBManager.instance().ensure_indexes()
+
     # # register blueprints
     # from reports.app import reports_blueprint
 
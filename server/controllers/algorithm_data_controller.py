@@ -3,6 +3,7 @@ import os
 from utility.uuid_generator import unique_id_generator
 from typing import TypeVar, Generic, List, Dict, Tuple
 from controllers.controller import Controller
+from controllers.result_controller import ResultController
 from enums.status_enum import StatusEnum
 from models.DBManager import DBManager
 
@@ -30,6 +31,7 @@ class AlgorithmDataController(Generic[T], Controller):
         self.collection_name = collection_name
         self._db = DBManager.instance()
         self.collection = self._db.get_collection('apk')
+        self.result_controller = ResultController('results', 'apk')
 
         self.lookup = {
             "owleye": "activities",
@@ -71,45 +73,57 @@ class AlgorithmDataController(Generic[T], Controller):
 
 
     def _insert_utg_result(self, uuid: str, data: Dict) -> Dict[str, T]:
-        results_schema = self._db.get_document(uuid, self.collection)[self.results_key]
+        """
+        Replace the utg of the job matching uuid. Only the utg field is written.
 
-        results_schema['utg'] = data;
+        Parameters:
+            uuid - uuid for the job which is the cluster of algorithms tasked to run
+            data - the new utg
 
-        self._db.update_document(uuid, self.collection, self.results_key, results_schema)
+        Returns: The new utg.
+        """
+        update_result = self.collection.update_one({"uuid": uuid}, {"$set": {f'{self.results_key}.utg': data}})
+        self._check_job_exists(uuid, update_result.matched_count)
 
-        return results_schema;
+        return data
 
 
     def _insert_algorithm_result(self, uuid: str, algorithm: str, data: dict) -> dict:
         """
-        This function inserts the links to the algorithm results into the document matching uuid
+        This function adds the algorithm result for the job matching uuid
+
+        Ui state results are stored in the results collection and only added once for each screenshot_id and
+        algorithm so retried requests do not create duplicates. Gifdroid results are set on the job document.
 
         Parameters:
             uuid - uuid for the job which is the cluster of algorithms tasked to run
             algorithm - the algorithm the result links for
-            links_to_res - the single link to result. NOTE that element in list is dynamically typed so it can be a string
+            data - the result. For gifdroid a dictionary of result name to result.
 
-        Returns: Dictionary for the updated document and a bool if the method is successful.
+        Returns: The data that was inserted.
 
         """
         algorithm = algorithm.lower()
-        alg_results = self._db.get_document(uuid, self.collection)[self.results_key]
 
-        ui_state_results = ['xbot', 'owleye', 'tappable']
-        if algorithm in ui_state_results:
-            alg_results['ui-states'][algorithm].append(data)
+        if algorithm in self.result_controller.ui_state_algorithms:
+            # One document per result in the results collection, see ResultController. The results collection
+            # does not know the jobs, so results of an unknown uuid are rejected here as they were for the job document.
+            self._check_job_exists(uuid, self.collection.count_documents({"uuid": uuid}, limit=1))
+            self.result_controller.post(uuid, algorithm, data)
 
-        new_gifdroid = alg_results['gifdroid']
-        if algorithm ==  'gifdroid':
-            for name, data in data.items():
-                new_gifdroid[name] = data
-            alg_results['gifdroid'] = new_gifdroid
+        if algorithm == 'gifdroid':
+            new_gifdroid = {f'{self.results_key}.gifdroid.{name}': value for name, value in data.items()}
+            if new_gifdroid:
+                update_result = self.collection.update_one({"uuid": uuid}, {"$set": new_gifdroid})
+                self._check_job_exists(uuid, update_result.matched_count)
 
+        return data
 
-        self._db.update_document(uuid, self.collection, self.results_key, alg_results)
 
-        print(alg_results['ui-states'])
-        return alg_results
+    @staticmethod
+    def _check_job_exists(uuid: str, matched_count: int) -> None:
+        if matched_count == 0:
+            raise KeyError("The uuid does not exist in the database")
 
 
     def _get_utg(self, uuid: str) -> Dict[str, T]:
@@ -124,7 +138,7 @@ class AlgorithmDataController(Generic[T], Controller):
 
         """
 
-        document = self.get(uuid)
+        document = self._db.get_document(uuid, self.collection, [f'{self.results_key}.utg'])
         result = document[self.results_key]['utg']
 
         return result
@@ -144,8 +158,11 @@ class AlgorithmDataController(Generic[T], Controller):
               Currently it returns the entire document and not just the results for the algorithm
         """
 
+        if type == 'ui-states':
+            return self.result_controller.get_ui_states(uuid)
+
         schema_result_key = 'results'
-        document = self.get(uuid)
+        document = self._db.get_document(uuid, self.collection, [f'{schema_result_key}.{type}'])
         result = document[schema_result_key][type]
 
         return result
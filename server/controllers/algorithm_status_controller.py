@@ -4,7 +4,9 @@ from controllers.job_status_controller import JobStatusController
 from typing import TypeVar, Generic, Dict
 from enums.status_enum import StatusEnum
 from models.DBManager import DBManager
+from utility.status_feed import StatusFeed
 from datetime import datetime as dt
+from pymongo import UpdateOne
 import typing as t
 
 
@@ -36,13 +38,20 @@ class AlgorithmStatusController(Generic[T], Controller):
         """
         Get the status of a specific algorithm
         """
-        all_algorithm_status = self._db.get_document(uuid, self.collection)
+        all_algorithm_status = self._db.get_document(uuid, self.collection, [f'{self.status_key}.{algorithm}'])
         specific_algorithm_status = all_algorithm_status[self.status_key][algorithm]
         print(specific_algorithm_status)
 
         return specific_algorithm_status
 
 
+    def get_all(self, uuid: str) -> t.Dict[str, t.Dict[str, T]]:
+        """
+        Get the status of every algorithm of the job.
+        """
+        return self._get_all_algorithm_status(uuid)
+
+
     def post(self, uuid: str, algorithm: str, **kwargs) -> t.Dict[str, T]:
         """
         Update the status of a specific algorithm.
@@ -51,11 +60,197 @@ class AlgorithmStatusController(Generic[T], Controller):
         all_algorithm_status = self._get_all_algorithm_status(uuid)
         self._inject_updated_status_info_into_document(all_algorithm_status, algorithm, **kwargs)
         self._db.update_document(uuid, self.collection, self.status_key, all_algorithm_status)
+        StatusFeed.instance().publish(uuid, {self.status_key: {algorithm: all_algorithm_status[algorithm]}})
         self._reflect_algorithm_update_to_job(uuid, algorithm, **kwargs)
 
         return all_algorithm_status[algorithm]
 
 
+    def post_batch(self, events: t.List[t.Dict[str, T]]) -> t.Dict[str, int]:
+        """
+        Apply many status and log updates in one **mongodb** round trip.
+
+        Every event is turned into an atomic update ($push/$slice for logs, $set for status, $inc for progress) so
+        concurrent updates no longer overwrite each other. Updates are applied in the order they were received.
+
+        Parameters:
+            events - (List) Events in the format {"uuid": str, "algorithm": str | None, "status": str, "logs": str | List[str], "progress": int}.
+                     An event without algorithm updates the job status.
+
+        Returns: (Dict) Number of events received, applied and skipped because they are malformed or their uuid does not exist.
+        """
+        valid_events = [event for event in events if self._is_valid_event(event)]
+        if len(valid_events) != len(events):
+            print(f'Skipping {len(events) - len(valid_events)} malformed status events')
+
+        algorithms_to_run = self._get_algorithms_to_run({event['uuid'] for event in valid_events})
+        operations = []
+        updated_algorithms = {}
+
+        for event in valid_events:
+            uuid = event['uuid']
+            if uuid not in algorithms_to_run:
+                continue
+
+            if event.get('algorithm') is None:
+                update = self._job_event_to_update(event)
+            else:
+                update = self._algorithm_event_to_update(event, algorithms_to_run[uuid])
+
+            if update:
+                operations.append(UpdateOne({"uuid": uuid}, update))
+                updated_algorithms.setdefault(uuid, set()).add(event.get('algorithm'))
+
+        if operations:
+            self.collection.bulk_write(operations, ordered=True)
+            self._publish_batch(updated_algorithms)
+
+        return {"received": len(events), "applied": len(operations), "skipped": len(events) - len(operations)}
+
+
+    def _publish_batch(self, updated_algorithms: t.Dict[str, t.Set[str]]) -> None:
+        """
+        Publish the updated statuses to the open status streams, read back in one query as $inc and $slice were applied by mongodb.
+
+        Parameters:
+            updated_algorithms - (Dict) The algorithms updated for each job uuid, None for the job itself.
+        """
+        feed = StatusFeed.instance()
+        uuids = [uuid for uuid in updated_algorithms if feed.has_subscribers(uuid)]
+        if not uuids:
+            return
+
+        job_key = self.job_status_controller._job_status_key
+        projection = {"uuid": 1, job_key: 1}
+        for uuid in uuids:
+            for algorithm in updated_algorithms[uuid] - {None}:
+                projection[f'{self.status_key}.{algorithm}'] = 1
+
+        for document in self.collection.find({"uuid": {"$in": uuids}}, projection):
+            all_algorithm_status = document.get(self.status_key, {})
+            delta = {job_key: document[job_key], self.status_key: {}}
+
+            for algorithm in updated_algorithms[document['uuid']]:
+                if algorithm in all_algorithm_status:
+                    delta[self.status_key][algorithm] = all_algorithm_status[algorithm]
+
+            feed.publish(document['uuid'], delta)
+
+
+    def _get_algorithms_to_run(self, uuids: t.Set[str]) -> t.Dict[str, t.List[str]]:
+        """
+        Read the algorithms to run for every job in one query, needed to calculate the job progress.
+        """
+        algorithms_to_run_key = f'{self.job_status_controller._job_status_key}.algorithms_to_run'
+        cursor = self.collection.find({"uuid": {"$in": list(uuids)}}, {"uuid": 1, algorithms_to_run_key: 1})
+
+        return {document['uuid']: list(document['overall-status']['algorithms_to_run']) for document in cursor}
+
+
+    def _algorithm_event_to_update(self, event: t.Dict[str, T], algorithms_to_run: t.List[str]) -> t.Dict[str, t.Dict]:
+        """
+        Convert one algorithm event into a mongodb update document. Mirrors **post** and **_reflect_algorithm_update_to_job**.
+
+        Parameters:
+            event - (Dict) The event to convert.
+            algorithms_to_run - (List) The algorithms of the job. Updated in place when the algorithm is new.
+        """
+        algorithm = event['algorithm']
+        job_key = self.job_status_controller._job_status_key
+        algorithm_key = f'{self.status_key}.{algorithm}'
+        # Every algorithm shares the same status fields
+        all_formats = self._db.get_format("")[self.status_key]
+        viable_parameters = all_formats.get(algorithm, all_formats['droidbot'])
+        max_logs = 10
+
+        update = {"$set": {}, "$push": {}, "$inc": {}, "$addToSet": {}}
+
+        logs = self._event_logs(event)
+        if logs:
+            update["$push"][f'{algorithm_key}.logs'] = {"$each": logs, "$slice": -max_logs}
+            update["$push"][f'{job_key}.logs'] = {"$each": logs, "$slice": -max_logs}
+
+        for each_parameter in viable_parameters:
+            if each_parameter == 'logs' or event.get(each_parameter) is None:
+                continue
+
+            if each_parameter == 'progress':
+                update["$inc"][f'{algorithm_key}.progress'] = event['progress']
+            else:
+                update["$set"][f'{algorithm_key}.{each_parameter}'] = event[each_parameter]
+
+        status = event.get('status')
+        if status == StatusEnum.running.value:
+            update["$set"][f'{algorithm_key}.start_time'] = str( dt.now() )
+        elif status == StatusEnum.successful.value:
+            update["$set"][f'{algorithm_key}.end_time'] = str( dt.now() )
+
+        if algorithm not in algorithms_to_run:
+            algorithms_to_run.append(algorithm)
+            update["$addToSet"][f'{job_key}.algorithms_to_run'] = algorithm
+
+        if status in [StatusEnum.running.value, StatusEnum.successful.value]:
+            update["$inc"][f'{job_key}.progress'] = (0.5/len(algorithms_to_run))*100
+
+        return {operator: fields for operator, fields in update.items() if fields}
+
+
+    def _job_event_to_update(self, event: t.Dict[str, T]) -> t.Dict[str, t.Dict]:
+        """
+        Convert one job event into a mongodb update document. Mirrors **JobStatusController.post**.
+        """
+        job_key = self.job_status_controller._job_status_key
+        max_logs = 10
+
+        update = {"$set": {}, "$push": {}, "$inc": {}}
+
+        for each_parameter in self._db.get_format("")[job_key]:
+            if each_parameter == 'logs' or event.get(each_parameter) is None:
+                continue
+
+            if each_parameter == 'progress':
+                update["$inc"][f'{job_key}.progress'] = event['progress']
+            else:
+                update["$set"][f'{job_key}.{each_parameter}'] = event[each_parameter]
+
+        logs = self._event_logs(event)
+        if logs:
+            update["$push"][f'{job_key}.logs'] = {"$each": logs, "$slice": -max_logs}
+
+        return {operator: fields for operator, fields in update.items() if fields}
+
+
+    @staticmethod
+    def _is_valid_event(event: T) -> bool:
+        """
+        Check an event has a uuid and fields of the types **post_batch** expects, so one bad event does not fail the batch.
+        """
+        if not isinstance(event, dict) or not isinstance(event.get('uuid'), str):
+            return False
+
+        algorithm = event.get('algorithm')
+        if algorithm is not None and (not isinstance(algorithm, str) or not algorithm or '.' in algorithm or algorithm.startswith('$')):
+            return False
+
+        logs = event.get('logs')
+        if logs is not None and not isinstance(logs, str) and not (isinstance(logs, list) and all(isinstance(log, str) for log in logs)):
+            return False
+
+        progress = event.get('progress')
+        if progress is not None and (isinstance(progress, bool) or not isinstance(progress, (int, float))):
+            return False
+
+        return event.get('status') is None or isinstance(event['status'], str)
+
+
+    @staticmethod
+    def _event_logs(event: t.Dict[str, T]) -> t.List[str]:
+        logs = event.get('logs')
+        if logs is None:
+            return []
+        return list(logs) if isinstance(logs, list) else [logs]
+
+
     def _reflect_algorithm_update_to_job(self, uuid: str, algorithm: str, **kwargs) -> None:
         """
         This is necessary Because when an algorithm updates, the job progress and logs changes as well for the frontend to see.
@@ -112,7 +307,7 @@ class AlgorithmStatusController(Generic[T], Controller):
 
         Returns: The status dictionary/json containing all data on the status of the algorithm.
         """
-        return self._db.get_document(uuid, self.collection)[self.status_key]
+        return self._db.get_document(uuid, self.collection, [self.status_key])[self.status_key]
 
 
 
@@ -149,10 +344,11 @@ class AlgorithmStatusController(Generic[T], Controller):
             val - (str) new attribute value
         """
 
-        document = self._db.get_document(uuid, self.collection)
+        document = self._db.get_document(uuid, self.collection, [self.status_key])
         document[self.status_key][algorithm][attribute_key] = attribute_val
 
         self._db.update_document(uuid, self.collection, self.status_key, document[self.status_key])
+        StatusFeed.instance().publish(uuid, {self.status_key: {algorithm: document[self.status_key][algorithm]}})
 
         return document
 
@@ -176,7 +372,7 @@ class AlgorithmStatusController(Generic[T], Controller):
         """
         Ignore please but don't delete yet
         """
-        d = self._db.get_document(uuid, self.collection)
+        d = self._db.get_document(uuid, self.collection, [self.status_key])
 
         for _, item in d[self.status_key].items():
             item['apk']= apk_name
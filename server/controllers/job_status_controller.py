@@ -3,6 +3,7 @@ import typing as t
 from models.DBManager import DBManager
 from pymongo.database import Collection
 from controllers.controller import Controller
+from utility.status_feed import StatusFeed
 from datetime import datetime
 
 from enums.status_enum import StatusEnum
@@ -26,10 +27,8 @@ class JobStatusController(t.Generic[T], Controller):
 
     def get(self, uuid: str) -> str:
 
-        d = self._db.get_document(uuid, self.collection)
-
         # Get status ##################################################################
-        document = self._db.get_document(uuid, self.collection)
+        document = self._db.get_document(uuid, self.collection, [self._job_status_key, 'apk'])
         status = document['overall-status']
         status['apk'] = document['apk']
 
@@ -55,18 +54,20 @@ class JobStatusController(t.Generic[T], Controller):
                     job_status[each_parameter] = updated_attribute
 
         self._db.update_document(uuid, self.collection, self._job_status_key, job_status)
+        StatusFeed.instance().publish(uuid, {self._job_status_key: job_status})
 
         return job_status
 
     def _get_job_status(self, uuid: str):
-        job_status = self._db.get_document(uuid, self.collection)[self._job_status_key]
+        job_status = self._db.get_document(uuid, self.collection, [self._job_status_key])[self._job_status_key]
 
         return job_status
 
 
     def check_algorithm_is_dependency(self, uuid: str, algorithm: str) -> bool:
         algorithm_to_run_key = 'algorithms_to_run'
-        return not algorithm in self._db.get_document(uuid, self.collection)[self._job_status_key][algorithm_to_run_key]
+        document = self._db.get_document(uuid, self.collection, [f'{self._job_status_key}.{algorithm_to_run_key}'])
+        return not algorithm in document[self._job_status_key][algorithm_to_run_key]
 
 
     def get_total_number_of_algorithms_in_job(self, uuid: str) -> int:
@@ -80,6 +81,7 @@ class JobStatusController(t.Generic[T], Controller):
         if self.check_algorithm_is_dependency(uuid, algorithm):
             job_status['algorithms_to_run'].append(algorithm)
             self._db.update_document(uuid, self.collection, self._job_status_key, job_status)
+            StatusFeed.instance().publish(uuid, {self._job_status_key: job_status})
 
     def _store_logs(self, document: t.Dict[str, t.List], new_log: str) -> bool:
         """
@@ -0,0 +1,145 @@
+from controllers.controller import Controller
+from models.DBManager import DBManager
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+import pymongo
+import typing as t
+
+
+T = t.TypeVar('T')
+
+
+class ResultController(t.Generic[T], Controller):
+    """
+    This controller is responsible for the ui state results (xbot, owleye and tappable) of every job.
+
+    Each finding is stored as its own document in the **results** collection instead of inside the job document, so
+    large crawls do not grow the job document and results can be read page by page. The indexes are created by
+    **DBManager.ensure_indexes**.
+    """
+
+    ui_state_algorithms = ['xbot', 'owleye', 'tappable']
+    default_page_size = 50
+    max_page_size = 500
+
+    def __init__(self, collection_name: str = 'results', job_collection_name: str = 'apk') -> None:
+        """
+        Parameters:
+            collection_name - (str) The collection storing one document per result.
+            job_collection_name - (str) The collection storing the job documents, used for results stored before the results collection existed.
+        """
+        self.cn = collection_name
+        self._db = DBManager.instance()
+        self.collection = self._db.get_collection(collection_name)
+        self.job_collection = self._db.get_collection(job_collection_name)
+
+
+    def get(self, uuid: str, algorithm: str = None, limit: int = None, after: str = None, fields: t.List[str] = None, structure_id: str = None) -> t.Dict[str, T]:
+        """
+        Get one page of results of a job.
+
+        Parameters:
+            uuid - (str) The job uuid.
+            algorithm - (str) Only get results of this algorithm. All algorithms if None.
+            limit - (int) Max number of results in the page.
+            after - (str) The **next** value of the previous page. First page if None.
+            fields - (List[str]) Only return these fields of each result.
+            structure_id - (str) Only get results of this screen structure.
+
+        Returns: (Dict) {"results": [...], "next": str | None}. Pass **next** as **after** to get the following page.
+                 The mongodb _id is not returned, fields of the result named id are kept as they were posted.
+        """
+        limit = min(int(limit or self.default_page_size), self.max_page_size)
+
+        query = {"uuid": uuid}
+        if algorithm is not None:
+            query["algorithm"] = algorithm.lower()
+        if structure_id is not None:
+            query["structure_id"] = structure_id
+        if after is not None:
+            query["_id"] = {"$gt": self._to_object_id(after)}
+
+        projection = None
+        if fields:
+            projection = {field: 1 for field in fields}
+
+        cursor = self.collection.find(query, projection).sort("_id", pymongo.ASCENDING).limit(limit + 1)
+        documents = list(cursor)
+
+        next_page = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_page = str(documents[-1]["_id"])
+
+        results = []
+        for document in documents:
+            document.pop("_id")
+            results.append(document)
+
+        return {"results": results, "next": next_page}
+
+
+    def post(self, uuid: str, algorithm: str, data: t.Dict[str, T]) -> t.Dict[str, T]:
+        """
+        Add one result of an algorithm. A result is only added once for each screenshot_id and algorithm, the
+        unique index on them makes concurrent posts of the same result store it once.
+
+        Parameters:
+            uuid - (str) The job uuid.
+            algorithm - (str) The algorithm the result is from.
+            data - (Dict) The result e.g. {"screenshot_id": str, "state_id": str, "structure_id": str, "image": str}
+
+        Returns: The data that was inserted.
+        """
+        document = dict(data)
+        document.pop("_id", None)
+        document["uuid"] = uuid
+        document["algorithm"] = algorithm.lower()
+
+        if document.get("screenshot_id") is None:
+            # A null screenshot_id would be covered by the unique index
+            document.pop("screenshot_id", None)
+            self.collection.insert_one(document)
+        else:
+            key = {"uuid": uuid, "algorithm": document["algorithm"], "screenshot_id": document["screenshot_id"]}
+            try:
+                self.collection.update_one(key, {"$setOnInsert": document}, upsert=True)
+            except DuplicateKeyError:
+                pass    # a concurrent post already stored the result
+
+        return data
+
+
+    def get_ui_states(self, uuid: str) -> t.Dict[str, t.List[T]]:
+        """
+        Get every ui state result of a job grouped by algorithm, the format the front-end expects for /results/get/<uuid>/ui-states.
+
+        Results stored in the job document by older jobs are included as well.
+        """
+        ui_states = self._get_legacy_ui_states(uuid)
+
+        cursor = self.collection.find({"uuid": uuid}, {"uuid": 0, "_id": 0}).sort("_id", pymongo.ASCENDING)
+        for document in cursor:
+            algorithm = document.pop("algorithm")
+            ui_states.setdefault(algorithm, []).append(document)
+
+        return ui_states
+
+
+    def _get_legacy_ui_states(self, uuid: str) -> t.Dict[str, t.List[T]]:
+        document = self._db.find_one(uuid, self.job_collection, ['results.ui-states'])
+
+        if document is None:
+            raise KeyError("The uuid does not exist in the database")
+
+        legacy = document.get('results', {}).get('ui-states', {})
+        return {algorithm: list(legacy.get(algorithm, [])) for algorithm in self.ui_state_algorithms}
+
+
+    @staticmethod
+    def _to_object_id(value: str) -> ObjectId:
+        try:
+            return ObjectId(value)
+        except (InvalidId, TypeError):
+            raise ValueError(f'{value} is not a valid page cursor')
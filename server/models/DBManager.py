@@ -1,5 +1,8 @@
 import pymongo
 from pymongo.database import Collection
+from threading import Thread
+from time import sleep
+import typing as t
 import datetime
 import os
 from enums.status_enum import *
@@ -11,6 +14,35 @@ class DBManager:
 
     _instance = None  # _ means it is private
 
+    ###############################################################################
+    #           Indexes created on startup for each collection name               #
+    ###############################################################################
+    # Each index is (keys, options) and is passed to Collection.create_index
+    _indexes = {
+        "apk": [
+            ([("uuid", pymongo.ASCENDING)], {"unique": True}),
+            ([("date", pymongo.DESCENDING)], {}),
+            ([("overall-status.status", pymongo.ASCENDING)], {}),
+        ],
+        "results": [
+            # Lookup results of a screen structure
+            ([("uuid", pymongo.ASCENDING), ("algorithm", pymongo.ASCENDING), ("structure_id", pymongo.ASCENDING)], {}),
+            # Idempotent inserts, one result per screenshot and algorithm. Results without screenshot_id are not deduplicated
+            ([("uuid", pymongo.ASCENDING), ("algorithm", pymongo.ASCENDING), ("screenshot_id", pymongo.ASCENDING)],
+             {"unique": True, "name": "uuid_algorithm_screenshot_id_unique", "partialFilterExpression": {"screenshot_id": {"$exists": True}}}),
+            # Pagination in insertion order
+            ([("uuid", pymongo.ASCENDING), ("algorithm", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)], {}),
+        ],
+    }
+
+    _ping_timeout_ms = 2000           # how long startup waits for mongodb before deferring the indexes
+    _index_retry_interval = 30        # seconds between attempts to create deferred indexes
+
+    # Indexes replaced by an index in **_indexes**, dropped on startup
+    _dropped_indexes = {
+        "results": ["uuid_1_algorithm_1_screenshot_id_1"],
+    }
+
     # https://www.mongodb.com/docs/manual/reference/bson-types/
 
     def __init__(self):
@@ -183,15 +215,92 @@ class DBManager:
         return cls._instance
 
 
-    def get_document(self, uuid: str, collection: Collection):
-        cursor = collection.find({"uuid": uuid})
-        result = list( cursor )
+    def get_document(self, uuid: str, collection: Collection, fields: t.List[str] = None):
+        """
+        Get the document matching the job uuid.
+
+        Parameters:
+            uuid - (str) The job uuid
+            collection - (Collection) The collection the document is in
+            fields - (List[str]) Only fetch these fields (dot notation is allowed). The whole document if None.
 
-        if len(result) == 0:
+        Returns: The document
+        """
+        result = self.find_one(uuid, collection, fields)
+
+        if result is None:
             raise KeyError("The uuid does not exist in the database")
 
-        # Assume uuid is unqiue so only one result
-        return result[0]
+        return result
+
+
+    def find_one(self, uuid: str, collection: Collection, fields: t.List[str] = None):
+        """
+        Find the document matching the job uuid, only transfering **fields** from mongodb when they are given.
+
+        Returns: The document or None if the uuid does not exist
+        """
+        projection = None
+        if fields is not None:
+            projection = {field: 1 for field in fields}
+
+        # uuid is unique so only one result
+        return collection.find_one({"uuid": uuid}, projection)
+
+
+    def ensure_indexes(self) -> None:
+        """
+        Create the indexes in **_indexes**. Creating an index which already exists does nothing.
+
+        If mongodb does not answer a ping within **_ping_timeout_ms** the indexes are created in the background once
+        it is reachable, so startup is not blocked by every create_index waiting for the server.
+        """
+        if self.ping():
+            self._create_indexes()
+            return
+
+        print('mongodb is not reachable, creating indexes in the background')
+        Thread(target=self._create_indexes_when_reachable, daemon=True).start()
+
+
+    def ping(self, timeout_ms: int = None) -> bool:
+        """
+        Check mongodb answers within **timeout_ms** milliseconds, instead of the default server selection timeout.
+        """
+        client = pymongo.MongoClient(self.url, serverSelectionTimeoutMS=timeout_ms or self._ping_timeout_ms)
+        try:
+            client.admin.command('ping')
+        except pymongo.errors.PyMongoError:
+            return False
+        finally:
+            client.close()
+        return True
+
+
+    def _create_indexes_when_reachable(self) -> None:
+        while not self.ping():
+            sleep(self._index_retry_interval)
+        self._create_indexes()
+        print('Created the deferred mongodb indexes')
+
+
+    def _create_indexes(self) -> None:
+        for collection_name, names in self._dropped_indexes.items():
+            collection = self.get_collection(collection_name)
+            for name in names:
+                try:
+                    collection.drop_index(name)
+                except pymongo.errors.OperationFailure:
+                    pass    # already dropped or never created
+
+        for collection_name, indexes in self._indexes.items():
+            collection = self.get_collection(collection_name)
+            for keys, options in indexes:
+                try:
+                    collection.create_index(keys, **options)
+                except Exception as e:
+                    # e.g. duplicate uuids inserted before the unique index existed
+                    print(f'Failed to create index {keys} on {collection_name}', e)
 
 
     @classmethod
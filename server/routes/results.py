@@ -12,6 +12,7 @@ results_blueprint = Blueprint('results', __name__, url_prefix='/results')
 # Initialise the controller
 algorithm_database_controller = AlgorithmDataController('apk')
 upload_controller = UploadController('apk')
+result_controller = algorithm_database_controller.result_controller
 
 
 # Defines two routes for the blueprint, one where the algorithm is specified and one where it is not
@@ -37,6 +38,50 @@ def get_utg(uuid, type=None):
     return "Failed", 500
 
 
+@results_blueprint.route('/list/<uuid>', defaults={'algorithm': None}, methods=['GET'])
+@results_blueprint.route('/list/<uuid>/<algorithm>', methods=['GET'])
+@cross_origin()
+def list_results(uuid, algorithm=None):
+    """
+    Get one page of ui state results of a given uuid
+
+    Path:
+        /results/list/<uuid>             -> algorithm = None
+        /results/list/<uuid>/<algorithm>
+    Vars:
+        uuid: The uuid of the results to get
+        algorithm: Only get results of this algorithm
+    Query:
+        limit: Max number of results in the page (default 50, max 500)
+        after: The "next" value from the previous page
+        fields: Comma separated fields to return e.g. screenshot_id,image
+        structure_id: Only get results for this screen structure
+    Returns:
+        {
+            "results": [ {"screenshot_id": str, ...} ],
+            "next": str | null
+        }
+    """
+
+    if request.method == "GET":
+        fields = request.args.get('fields')
+        try:
+            page = result_controller.get(
+                uuid,
+                algorithm,
+                limit=request.args.get('limit', type=int),
+                after=request.args.get('after'),
+                fields=fields.split(',') if fields else None,
+                structure_id=request.args.get('structure_id'),
+            )
+        except ValueError as e:
+            return {"Error": str(e)}, 400
+
+        return page, 200
+
+    return "Failed", 500
+
+
 # Defines two routes for the blueprint, one where the algorithm is specified and one where it is not
 @results_blueprint.route('/get/<uuid>', defaults={'algorithm': None},  methods=['GET'])
 @results_blueprint.route('/get/<uuid>/<type>',  methods=['GET'])
@@ -1,14 +1,20 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, request
 from flask_cors import cross_origin
+from queue import Empty
+import json
 
 from controllers.algorithm_status_controller import AlgorithmStatusController
 from controllers.job_status_controller import JobStatusController
+from utility.status_feed import StatusFeed
 
 status_blueprint = Blueprint('status', __name__, url_prefix='/status')
 
 status_controller = JobStatusController('apk')
 algorithm_status_controller = AlgorithmStatusController('apk')
 
+# Seconds between keep alive comments on idle status streams
+heartbeat_interval = 15
+
 @status_blueprint.route('/get/<uuid>', defaults={'algorithm': None}, methods=['GET'])
 @status_blueprint.route('/get/<uuid>/<algorithm>', methods=['GET'])
 @cross_origin()
@@ -30,6 +36,28 @@ def get_status(uuid, algorithm=None):
     return "Fail", 500
 
 
+@status_blueprint.route('/update/batch', methods=['POST'])
+@cross_origin()
+def update_status_batch():
+    """
+    Apply many status and log updates at once
+
+    Path: /status/update/batch
+    Body:
+        {
+            "events": [
+                {"uuid": str, "algorithm": str | null, "status": str, "logs": str | [str], "progress": int}
+            ]
+        }
+    """
+    if request.method == "POST":
+        events = (request.get_json(silent=True) or {}).get('events', [])
+        if not isinstance(events, list):
+            return "events must be a list", 400
+        return algorithm_status_controller.post_batch(events), 200
+    return "Fail", 500
+
+
 @status_blueprint.route('/update/<uuid>', defaults={'algorithm': None}, methods=['POST'])
 @status_blueprint.route('/update/<uuid>/<algorithm>', methods=['POST'])
 @cross_origin()
@@ -57,3 +85,58 @@ def update_status(uuid, algorithm=None):
         else:
             return algorithm_status_controller.post(uuid, algorithm, **new_status), 200
     return "Fail", 500
+
+
+@status_blueprint.route('/stream/<uuid>', methods=['GET'])
+@cross_origin()
+def stream_status(uuid):
+    """
+    Stream the status of a given uuid as server-sent events
+
+    The first "status" event is the full status. The following events only contain what changed, they are sent as
+    soon as the status is updated so the status does not have to be polled.
+
+    Path: /status/stream/<uuid>
+    Vars:
+        uuid: The uuid of the status to stream
+    Events:
+        data: {
+            "overall-status": {...},             -> job status, includes apk in the first event
+            "algorithm_status": {"xbot": {...}}  -> only the algorithms that changed
+        }
+    """
+    feed = StatusFeed.instance()
+
+    # Subscribe before reading the current status so no update is missed in between
+    queue = feed.subscribe(uuid)
+    try:
+        snapshot = {
+            "overall-status": status_controller.get(uuid),
+            "algorithm_status": algorithm_status_controller.get_all(uuid),
+        }
+    except KeyError:
+        feed.unsubscribe(uuid, queue)
+        return "The uuid does not exist", 404
+
+    def events():
+        event_id = 0
+        try:
+            yield _to_event(event_id, snapshot)
+            while True:
+                try:
+                    delta = queue.get(timeout=heartbeat_interval)
+                except Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+
+                event_id += 1
+                yield _to_event(event_id, delta)
+        finally:
+            feed.unsubscribe(uuid, queue)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(events(), mimetype='text/event-stream', headers=headers)
+
+
+def _to_event(event_id: int, data: dict) -> str:
+    return f'id: {event_id}\nevent: status\ndata: {json.dumps(data, default=str)}\n\n'
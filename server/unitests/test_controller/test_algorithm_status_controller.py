@@ -89,6 +89,42 @@ class TestDbManager(unittest.TestCase):
         self.assertEqual(expected, r)
 
 
+    def test_post_batch(self):
+        events = [
+            {"uuid": self.uuid, "algorithm": "xbot", "status": Status.running.value, "logs": "xbot is running."},
+            {"uuid": self.uuid, "algorithm": "xbot", "logs": [f'log {i}' for i in range(12)]},
+            {"uuid": self.uuid, "algorithm": None, "progress": 10},
+            {"uuid": unique_id_generator(), "algorithm": "xbot", "logs": "unknown job"},
+        ]
+
+        r = self.asc.post_batch(events)
+        self.assertEqual(r, {"received": 4, "applied": 3, "skipped": 1})
+
+        document = self.db.get_document(self.uuid, self.tc)
+        xbot = document['algorithm_status']['xbot']
+        job = document['overall-status']
+
+        self.assertEqual(xbot['status'], Status.running.value)
+        self.assertNotEqual(xbot['start_time'], '')
+        self.assertEqual(xbot['logs'], [f'log {i}' for i in range(2, 12)])
+        self.assertEqual(job['algorithms_to_run'], ['xbot'])
+        self.assertEqual(job['progress'], 60)
+
+
+    def test_post_batch_skips_malformed_events(self):
+        events = [
+            {"algorithm": "xbot", "logs": "no uuid"},
+            {"uuid": self.uuid, "algorithm": "xbot", "progress": "ten"},
+            {"uuid": self.uuid, "algorithm": "xbot", "logs": [1, 2]},
+            "not an event",
+            {"uuid": self.uuid, "algorithm": "xbot", "logs": "xbot is running."},
+        ]
+
+        r = self.asc.post_batch(events)
+        self.assertEqual(r, {"received": 5, "applied": 1, "skipped": 4})
+        self.assertEqual(self.db.get_document(self.uuid, self.tc)['algorithm_status']['xbot']['logs'], ['xbot is running.'])
+
+
 ###############################################################################
 #                              Untility functions                             #
 ###############################################################################
@@ -0,0 +1,94 @@
+import os
+import sys
+import uuid
+import inspect
+import unittest
+
+###############################################################################
+#                              relative importing                             #
+###############################################################################
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(os.path.dirname(currentdir))
+sys.path.insert(0, parentdir)
+
+# relative import ends ########################################################
+from controllers.result_controller import ResultController
+from models.DBManager import *
+
+class TestResultController(unittest.TestCase):
+    def setUp(self):
+        self.tcn = "test"
+        self.rcn = "test_results"
+        self.db = DBManager.instance()
+
+        self.tc = self.db.create_collection(self.tcn)
+
+        # Test document
+        self.uuid = unique_id_generator()
+        format = DBManager.get_format(self.uuid)
+        format['results']['ui-states']['xbot'].append({"image": "legacy.png"})
+
+        self.td = self.db.insert_document(format, self.tc)
+
+        self.rc = ResultController(self.rcn, self.tcn)
+
+
+    def test_result_is_added_once_per_screenshot(self):
+        self.rc.post(self.uuid, 'owleye', {"screenshot_id": "1", "image": "a.png"})
+        self.rc.post(self.uuid, 'owleye', {"screenshot_id": "1", "image": "a.png"})
+        self.rc.post(self.uuid, 'tappable', {"screenshot_id": "1", "image": "b.png"})
+
+        r = self.rc.get(self.uuid)['results']
+
+        self.assertEqual([(each['algorithm'], each['image']) for each in r], [('owleye', 'a.png'), ('tappable', 'b.png')])
+
+
+    def test_pages_follow_each_other(self):
+        for i in range(5):
+            self.rc.post(self.uuid, 'owleye', {"screenshot_id": str(i), "structure_id": "s", "image": f'{i}.png'})
+
+        first = self.rc.get(self.uuid, 'owleye', limit=3, fields=['image'])
+        second = self.rc.get(self.uuid, 'owleye', limit=3, after=first['next'])
+
+        self.assertEqual([each['image'] for each in first['results']], ['0.png', '1.png', '2.png'])
+        self.assertEqual([each['image'] for each in second['results']], ['3.png', '4.png'])
+        self.assertNotIn('screenshot_id', first['results'][0])
+        self.assertIsNone(second['next'])
+
+
+    def test_ui_states_include_legacy_results(self):
+        self.rc.post(self.uuid, 'owleye', {"screenshot_id": "1", "image": "a.png"})
+
+        r = self.rc.get_ui_states(self.uuid)
+
+        self.assertEqual(r['xbot'], [{"image": "legacy.png"}])
+        self.assertEqual(r['owleye'], [{"screenshot_id": "1", "image": "a.png"}])
+        self.assertEqual(r['tappable'], [])
+
+
+    def test_results_keep_their_own_id(self):
+        self.rc.post(self.uuid, 'owleye', {"screenshot_id": "1", "id": "own"})
+
+        self.assertEqual(self.rc.get(self.uuid)['results'][0]['id'], 'own')
+        self.assertEqual(self.rc.get_ui_states(self.uuid)['owleye'], [{"screenshot_id": "1", "id": "own"}])
+
+
+
+###############################################################################
+#                              Untility functions                             #
+###############################################################################
+
+def unique_id_generator() -> str:
+    res = str( uuid.uuid4() )
+    return res
+
+
+def main():
+    # Create a test suit
+    suit = unittest.TestLoader().loadTestsFromTestCase(TestResultController)
+    # Run the test suit
+    unittest.TextTestRunner(verbosity=2).run(suit)
+
+if __name__ == "__main__":
+    main()
@@ -89,6 +89,27 @@ class Test_Db_Manager(unittest.TestCase):
 
         self.assertEqual(val, res["algorithm_status"])
 
+
+    def test_get_d_with_fields(self):
+        """
+            Test that only the requested fields are fetched
+        """
+        res = self.db.get_document(self.uuid, self.tc, ['overall-status.status', 'apk'])
+
+        res.pop('_id')
+
+        format = DBManager.get_format(self.uuid)
+
+        self.assertEqual(res, {"overall-status": {"status": format['overall-status']['status']}, "apk": format['apk']})
+
+
+    def test_find_one_missing_uuid(self):
+        """
+            Test that find one returns None and get document raises if the uuid does not exist
+        """
+        self.assertIsNone(self.db.find_one(unique_id_generator(), self.tc))
+        self.assertRaises(KeyError, self.db.get_document, unique_id_generator(), self.tc)
+
 ###############################################################################
 #                              Untility functions                             #
 ###############################################################################
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import inspect
+import unittest
+from unittest import mock
+from flask import Flask
+
+###############################################################################
+#                              relative importing                             #
+###############################################################################
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(os.path.dirname(currentdir))
+sys.path.insert(0, parentdir)
+
+# relative import ends ########################################################
+from routes import status
+from utility.status_feed import StatusFeed
+
+class TestStatusStream(unittest.TestCase):
+    def setUp(self):
+        self.uuid = 'job'
+        self.overall = {"status": "RUNNING", "progress": 0}
+        self.algorithms = {"xbot": {"status": "RUNNING"}}
+
+        for name, value in [('status_controller', self.overall), ('algorithm_status_controller', self.algorithms)]:
+            controller = mock.MagicMock()
+            controller.get.return_value = value
+            controller.get_all.return_value = value
+            patcher = mock.patch.object(status, name, controller)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(status, 'heartbeat_interval', 0.1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app = Flask(__name__)
+        app.register_blueprint(status.status_blueprint)
+        self.client = app.test_client()
+
+
+    def _read_event(self, chunks):
+        event = next(chunks)
+        return event.decode() if isinstance(event, bytes) else event
+
+
+    def test_stream_sends_status_then_deltas_and_keep_alives(self):
+        response = self.client.get(f'/status/stream/{self.uuid}')
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+
+        first = self._read_event(chunks)
+        self.assertTrue(first.startswith('id: 0\nevent: status\n'))
+        self.assertEqual(json.loads(first.split('data: ')[1]), {"overall-status": self.overall, "algorithm_status": self.algorithms})
+
+        delta = {"algorithm_status": {"xbot": {"status": "SUCCESSFUL"}}}
+        StatusFeed.instance().publish(self.uuid, delta)
+        second = self._read_event(chunks)
+        self.assertTrue(second.startswith('id: 1\n'))
+        self.assertEqual(json.loads(second.split('data: ')[1]), delta)
+
+        self.assertEqual(self._read_event(chunks), ': keep-alive\n\n')
+
+        response.close()
+        self.assertFalse(StatusFeed.instance().has_subscribers(self.uuid))
+
+
+    def test_stream_of_unknown_job_is_not_found(self):
+        status.status_controller.get.side_effect = KeyError(self.uuid)
+
+        response = self.client.get(f'/status/stream/{self.uuid}')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(StatusFeed.instance().has_subscribers(self.uuid))
+
+
+def main():
+    # Create a test suit
+    suit = unittest.TestLoader().loadTestsFromTestCase(TestStatusStream)
+    # Run the test suit
+    unittest.TextTestRunner(verbosity=2).run(suit)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import inspect
+import unittest
+
+###############################################################################
+#                              relative importing                             #
+###############################################################################
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(os.path.dirname(currentdir))
+sys.path.insert(0, parentdir)
+
+# relative import ends ########################################################
+from utility.status_feed import StatusFeed
+
+class TestStatusFeed(unittest.TestCase):
+    def setUp(self):
+        self.feed = StatusFeed()
+        self.uuid = 'job'
+
+
+    def test_subscribers_receive_changes_of_their_job(self):
+        first = self.feed.subscribe(self.uuid)
+        second = self.feed.subscribe(self.uuid)
+        other = self.feed.subscribe('other job')
+
+        delta = {"algorithm_status": {"xbot": {"status": "RUNNING"}}}
+        self.feed.publish(self.uuid, delta)
+
+        self.assertEqual(first.get_nowait(), delta)
+        self.assertEqual(second.get_nowait(), delta)
+        self.assertTrue(other.empty())
+
+
+    def test_unsubscribed_queues_receive_nothing(self):
+        queue = self.feed.subscribe(self.uuid)
+        self.assertTrue(self.feed.has_subscribers(self.uuid))
+
+        self.feed.unsubscribe(self.uuid, queue)
+        self.feed.publish(self.uuid, {"overall-status": {}})
+
+        self.assertTrue(queue.empty())
+        self.assertFalse(self.feed.has_subscribers(self.uuid))
+
+
+    def test_slow_subscribers_lose_their_oldest_changes(self):
+        queue = self.feed.subscribe(self.uuid)
+
+        for i in range(StatusFeed._max_queue_size + 5):
+            self.feed.publish(self.uuid, {"progress": i})
+
+        self.assertEqual(queue.qsize(), StatusFeed._max_queue_size)
+        self.assertEqual(queue.get_nowait(), {"progress": 5})
+
+
+def main():
+    # Create a test suit
+    suit = unittest.TestLoader().loadTestsFromTestCase(TestStatusFeed)
+    # Run the test suit
+    unittest.TextTestRunner(verbosity=2).run(suit)
+
+if __name__ == "__main__":
+    main()
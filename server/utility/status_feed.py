@@ -0,0 +1,84 @@
+from queue import Queue, Full, Empty
+from threading import Lock
+import typing as t
+
+
+class StatusFeed:
+    """
+    In-process publish/subscribe of status changes for each job uuid.
+
+    The status controllers publish the part of the document they changed and every open status stream of that uuid
+    receives it, so streams never have to read **mongodb** themselves.
+
+    NOTE: subscribers only receive changes made in this process, the flask backend runs as a single process.
+    """
+
+    _instance = None
+    _max_queue_size = 100
+
+    def __init__(self) -> None:
+        self._subscribers: t.Dict[str, t.List[Queue]] = {}
+        self._lock = Lock()
+
+
+    @classmethod
+    def instance(cls) -> 'StatusFeed':
+        """
+        If there is already an instance, just return the single instance. Otherwise create a new instance.
+        """
+        if cls._instance is None:
+            cls._instance = cls()
+
+        return cls._instance
+
+
+    def subscribe(self, uuid: str) -> Queue:
+        """
+        Start receiving the status changes of a job.
+
+        Returns: (Queue) The queue the changes are put on.
+        """
+        queue = Queue(maxsize=self._max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(uuid, []).append(queue)
+
+        return queue
+
+
+    def unsubscribe(self, uuid: str, queue: Queue) -> None:
+        with self._lock:
+            queues = self._subscribers.get(uuid, [])
+            if queue in queues:
+                queues.remove(queue)
+            if not queues:
+                self._subscribers.pop(uuid, None)
+
+
+    def has_subscribers(self, uuid: str) -> bool:
+        """Used to avoid building changes nobody is listening to."""
+        return uuid in self._subscribers
+
+
+    def publish(self, uuid: str, delta: t.Dict) -> None:
+        """
+        Send a status change to every subscriber of the job.
+
+        A subscriber that falls behind loses its oldest change instead of blocking the publisher.
+
+        Parameters:
+            uuid - (str) The job uuid.
+            delta - (Dict) The changed part of the job document e.g. {"overall-status": {...}} or {"algorithm_status": {"xbot": {...}}}
+        """
+        with self._lock:
+            queues = list(self._subscribers.get(uuid, []))
+
+        for queue in queues:
+            while True:
+                try:
+                    queue.put_nowait(delta)
+                    break
+                except Full:
+                    try:
+                        queue.get_nowait()
+                    except Empty:
+                        pass